@@ -3,6 +3,10 @@ import { Upload, FileCheck, AlertCircle, Loader } from 'lucide-react';
 import axios from 'axios';
 import { useGlobalState } from '../context/GlobalStateContext';
 
+// Suivi du job en file d'attente : une interrogation par seconde, 10 minutes au plus
+const POLL_INTERVAL_MS = 1000;
+const MAX_POLLS = 600;
+
 const APKScannerPage = () => {
   const [file, setFile] = useState(null);
   const [loading, setLoading] = useState(false);
@@ -57,9 +61,27 @@ const APKScannerPage = () => {
 
     try {
       const response = await axios.post('http://localhost:8001/scan', formData);
-      setResult(response.data);
       if (response.data.job_id) {
         updateJobId('apkscanner', response.data.job_id);
+        let jobResponse = await axios.get(`http://localhost:8001/scan/${response.data.job_id}`);
+        // L'analyse est traitée en file d'attente : on attend la fin du job
+        let polls = 0;
+        while (['queued', 'running'].includes(jobResponse.data.status)) {
+          if (++polls > MAX_POLLS) {
+            setError(`Analyse toujours en cours après ${(MAX_POLLS * POLL_INTERVAL_MS) / 1000} s (job ${response.data.job_id}), réessayez plus tard`);
+            return;
+          }
+          await new Promise((resolve) => setTimeout(resolve, POLL_INTERVAL_MS));
+          jobResponse = await axios.get(`http://localhost:8001/scan/${response.data.job_id}`);
+        }
+        setResult({
+          ...response.data,
+          status: jobResponse.data.status,
+          package_name: jobResponse.data.package_name,
+          permissions: jobResponse.data.result?.permissions,
+        });
+      } else {
+        setResult(response.data);
       }
     } catch (err) {
       setError(err.response?.data?.error || 'Erreur lors du scan de l\'APK');
@@ -3,6 +3,10 @@ import { Upload, Search, AlertTriangle, Key } from 'lucide-react';
 import axios from 'axios';
 import { useGlobalState } from '../context/GlobalStateContext';
 
+// Suivi du job en file d'attente : une interrogation par seconde, 10 minutes au plus
+const POLL_INTERVAL_MS = 1000;
+const MAX_POLLS = 600;
+
 const SecretHunterPage = () => {
   const [file, setFile] = useState(null);
   const [loading, setLoading] = useState(false);
@@ -40,7 +44,17 @@ const SecretHunterPage = () => {
 
       if (response.data.job_id) {
         updateJobId('secrethunter', response.data.job_id);
-        const jobResponse = await axios.get(`http://localhost:8002/scan/${response.data.job_id}`);
+        let jobResponse = await axios.get(`http://localhost:8002/scan/${response.data.job_id}`);
+        // L'analyse est traitée en file d'attente : on attend la fin du job
+        let polls = 0;
+        while (['queued', 'running'].includes(jobResponse.data.status)) {
+          if (++polls > MAX_POLLS) {
+            setError(`Analyse toujours en cours après ${(MAX_POLLS * POLL_INTERVAL_MS) / 1000} s (job ${response.data.job_id}), réessayez plus tard`);
+            return;
+          }
+          await new Promise((resolve) => setTimeout(resolve, POLL_INTERVAL_MS));
+          jobResponse = await axios.get(`http://localhost:8002/scan/${response.data.job_id}`);
+        }
         setResult(jobResponse.data);
       } else {
         setResult(response.data);
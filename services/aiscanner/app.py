@@ -1,10 +1,20 @@
 from fastapi import FastAPI, File, UploadFile, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-import tensorflow as tf
-from androguard.core.apk import APK
-import numpy as np
+from typing import List
 import os
+import asyncio
 import shutil
+import tempfile
+from permission_model import (load_model, extract_vector, extract_vectors, cached_score, compute_scores, classify,
+                              prediction_cache_stats)
+from batcher import MicroBatcher
+from workpool import BoundedPool, Overloaded
+
+# Nombre maximal d'APK par requête /scan/batch
+MAX_BATCH_FILES = int(os.environ.get("MAX_BATCH_FILES", 50))
+# Fichiers temporaires des uploads (noms uniques, supprimés après analyse)
+UPLOAD_DIR = os.environ.get("UPLOAD_DIR", tempfile.gettempdir())
+UPLOAD_CHUNK_SIZE = 1024 * 1024
 
 app = FastAPI(title="MobileSec AI Scanner")
 
@@ -22,110 +32,109 @@ app.add_middleware(
 def health():
     return {"status": "ok"}
 
-# --- CONFIGURATION ---
-MODEL_PATH = "mobilesec_model_v3.h5"
-
-# Liste EXACTE des permissions utilisée lors de l'entraînement (copiez-collez la liste complète ici)
-ALL_PERMISSIONS = [
-    "android.permission.INTERNET", "android.permission.ACCESS_NETWORK_STATE",
-    "android.permission.ACCESS_WIFI_STATE", "android.permission.CHANGE_WIFI_STATE",
-    "android.permission.CHANGE_NETWORK_STATE", "android.permission.BLUETOOTH",
-    "android.permission.BLUETOOTH_ADMIN", "android.permission.BLUETOOTH_PRIVILEGED",
-    "android.permission.NFC", "android.permission.USE_SIP", "android.permission.VOIP",
-    "android.permission.READ_SMS", "android.permission.SEND_SMS",
-    "android.permission.RECEIVE_SMS", "android.permission.RECEIVE_MMS",
-    "android.permission.RECEIVE_WAP_PUSH", "android.permission.WRITE_SMS",
-    "android.permission.READ_PHONE_STATE", "android.permission.CALL_PHONE",
-    "android.permission.PROCESS_OUTGOING_CALLS", "android.permission.READ_CALL_LOG",
-    "android.permission.WRITE_CALL_LOG", "android.permission.ADD_VOICEMAIL",
-    "android.permission.USE_USSD", "android.permission.MODIFY_PHONE_STATE",
-    "android.permission.ACCESS_FINE_LOCATION", "android.permission.ACCESS_COARSE_LOCATION",
-    "android.permission.ACCESS_BACKGROUND_LOCATION", "android.permission.ACCESS_MOCK_LOCATION",
-    "android.permission.ACCESS_LOCATION_EXTRA_COMMANDS",
-    "android.permission.READ_EXTERNAL_STORAGE", "android.permission.WRITE_EXTERNAL_STORAGE",
-    "android.permission.MOUNT_UNMOUNT_FILESYSTEMS", "android.permission.MANAGE_DOCUMENTS",
-    "android.permission.CAMERA", "android.permission.RECORD_AUDIO",
-    "android.permission.CAPTURE_AUDIO_OUTPUT", "android.permission.CAPTURE_VIDEO_OUTPUT",
-    "android.permission.BODY_SENSORS", "android.permission.USE_FINGERPRINT",
-    "android.permission.VIBRATE", "android.permission.FLASHLIGHT",
-    "android.permission.RECEIVE_BOOT_COMPLETED", "android.permission.WAKE_LOCK",
-    "android.permission.SYSTEM_ALERT_WINDOW", "android.permission.KILL_BACKGROUND_PROCESSES",
-    "android.permission.RESTART_PACKAGES", "android.permission.GET_TASKS",
-    "android.permission.REORDER_TASKS", "android.permission.EXPAND_STATUS_BAR",
-    "android.permission.DISABLE_KEYGUARD", "android.permission.READ_SYNC_SETTINGS",
-    "android.permission.WRITE_SYNC_SETTINGS", "android.permission.READ_SYNC_STATS",
-    "android.permission.PERSISTENT_ACTIVITY",
-    "android.permission.INSTALL_PACKAGES", "android.permission.REQUEST_INSTALL_PACKAGES",
-    "android.permission.DELETE_PACKAGES", "android.permission.CLEAR_APP_CACHE",
-    "android.permission.DELETE_CACHE", "android.permission.INSTALL_SHORTCUT",
-    "android.permission.UNINSTALL_SHORTCUT",
-    "android.permission.GET_ACCOUNTS", "android.permission.AUTHENTICATE_ACCOUNTS",
-    "android.permission.MANAGE_ACCOUNTS", "android.permission.USE_CREDENTIALS",
-    "android.permission.ACCOUNT_MANAGER", "android.permission.BIND_DEVICE_ADMIN",
-    "android.permission.READ_CONTACTS", "android.permission.WRITE_CONTACTS",
-    "android.permission.READ_CALENDAR", "android.permission.WRITE_CALENDAR",
-    "android.permission.READ_PROFILE", "android.permission.WRITE_PROFILE",
-    "android.permission.READ_SOCIAL_STREAM", "android.permission.WRITE_SOCIAL_STREAM",
-    "android.permission.READ_USER_DICTIONARY", "android.permission.WRITE_USER_DICTIONARY",
-    "android.permission.WRITE_SETTINGS", "android.permission.WRITE_SECURE_SETTINGS",
-    "android.permission.SET_WALLPAPER", "android.permission.SET_TIME_ZONE",
-    "com.android.browser.permission.READ_HISTORY_BOOKMARKS",
-    "com.android.browser.permission.WRITE_HISTORY_BOOKMARKS",
-    "com.android.vending.BILLING", "com.android.vending.CHECK_LICENSE",
-    "com.google.android.c2dm.permission.RECEIVE",
-    "com.google.android.gms.permission.ACTIVITY_RECOGNITION"
-]
-
 # Chargement global du modèle au démarrage
-print("Loading AI Model...")
-model = tf.keras.models.load_model(MODEL_PATH)
-print("AI Model Loaded!")
+load_model()
+
+# Prédictions des requêtes concurrentes regroupées en lots (cf. batcher.py) ;
+# un profil de permissions déjà vu ne passe pas par le modèle
+batcher = MicroBatcher(compute_scores)
+# Parsing des APK hors de la boucle d'événements (cf. workpool.py)
+parse_pool = BoundedPool()
+
+def _copy_upload(src, fd):
+    with os.fdopen(fd, "wb") as out:
+        shutil.copyfileobj(src, out, UPLOAD_CHUNK_SIZE)
 
-def extract_vector(apk_path):
+async def _save_upload(file):
+    """Copie l'upload par blocs dans un fichier temporaire au nom unique (deux uploads de
+    même nom ne se marchent pas dessus), dans un thread : la boucle n'est pas bloquée."""
+    fd, path = tempfile.mkstemp(prefix="aiscanner-", suffix=".apk", dir=UPLOAD_DIR)
     try:
-        a = APK(apk_path)
-        perms = a.get_permissions()
-        vec = np.zeros((1, len(ALL_PERMISSIONS)))
-        detected_perms = []
-        for p in perms:
-            if p in ALL_PERMISSIONS:
-                vec[0, ALL_PERMISSIONS.index(p)] = 1
-                detected_perms.append(p)
-        return vec, detected_perms
-    except Exception as e:
-        print(f"Error parsing APK: {e}")
-        return None, []
+        await asyncio.to_thread(_copy_upload, file.file, fd)
+    except BaseException:
+        os.remove(path)
+        raise
+    return path
+
+def _remove(paths):
+    for path in paths:
+        if os.path.exists(path):
+            os.remove(path)
+
+def _overloaded():
+    return HTTPException(status_code=503, detail="Too many scans in progress, retry later", headers={"Retry-After": "1"})
+
+async def _score(vec):
+    score = cached_score(vec)
+    if score is None:
+        score = await batcher.submit(vec)
+    return score
+
+def _result(filename, score, detected_perms):
+    status, confidence = classify(score)
+    return {
+        "service": "aiscanner",
+        "file": filename,
+        "risk_score": score,
+        "confidence": confidence,
+        "status": status,
+        "permissions": detected_perms
+    }
 
 @app.post("/scan")
 async def scan_apk(file: UploadFile = File(...)):
-    filename = f"temp_{file.filename}"
-    with open(filename, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+    path = await _save_upload(file)
+    try:
+        vec, detected_perms = await parse_pool.run(extract_vector, path)
+    except Overloaded:
+        raise _overloaded()
+    finally:
+        _remove([path])
+    if vec is None:
+        raise HTTPException(status_code=400, detail="Invalid APK")
+
+    score = await _score(vec)
+    return _result(file.filename, score, detected_perms)
+
+@app.post("/scan/batch")
+async def scan_batch(files: List[UploadFile] = File(...)):
+    """Plusieurs APK en une requête : un résultat par fichier, dans l'ordre d'envoi
+    (un APK invalide n'interrompt pas les autres)."""
+    if len(files) > MAX_BATCH_FILES:
+        raise HTTPException(status_code=400, detail=f"at most {MAX_BATCH_FILES} files per batch")
 
+    paths = []
     try:
-        vec, detected_perms = extract_vector(filename)
-        if vec is None:
-            raise HTTPException(status_code=400, detail="Invalid APK")
-        
-        prediction = model.predict(vec)
-        score = float(prediction[0][0])
-        
-        status = "SECURE"
-        if score > 0.8: status = "MALWARE"
-        elif score > 0.3: status = "SUSPICIOUS"
-
-        # Calcul d'un score de confiance basique (distance par rapport au seuil d'incertitude 0.5)
-        # Plus on est proche de 0 ou 1, plus on est confiant.
-        confidence = abs(score - 0.5) * 2
-
-        return {
-            "service": "aiscanner",
-            "file": file.filename,
-            "risk_score": score,
-            "confidence": confidence,
-            "status": status,
-            "permissions": detected_perms
-        }
+        for file in files:
+            paths.append(await _save_upload(file))
+        # Un travail du pool par processus disponible : un lot ne monopolise pas la file
+        chunks = [paths[i::parse_pool.workers] for i in range(min(parse_pool.workers, len(paths)))]
+        # Tous les travaux se terminent avant la suppression des fichiers, même si l'un échoue
+        parsed = await asyncio.gather(*(parse_pool.run(extract_vectors, chunk) for chunk in chunks), return_exceptions=True)
+        for result in parsed:
+            if isinstance(result, BaseException):
+                raise result
+    except Overloaded:
+        raise _overloaded()
     finally:
-        if os.path.exists(filename):
-            os.remove(filename)
\ No newline at end of file
+        _remove(paths)
+    by_path = {path: result for chunk, results in zip(chunks, parsed) for path, result in zip(chunk, results)}
+    extracted = [by_path[path] for path in paths]
+
+    # Tous les vecteurs valides sont soumis ensemble : ils partagent les mêmes lots
+    valid = [i for i, (vec, _) in enumerate(extracted) if vec is not None]
+    scores = dict(zip(valid, await asyncio.gather(*(_score(extracted[i][0]) for i in valid))))
+
+    results = []
+    for i, (file, (_, detected_perms)) in enumerate(zip(files, extracted)):
+        if i in scores:
+            results.append(_result(file.filename, scores[i], detected_perms))
+        else:
+            results.append({"service": "aiscanner", "file": file.filename, "error": "Invalid APK"})
+    return {"results": results}
+
+@app.get("/stats")
+def stats():
+    """Regroupement des prédictions (requêtes, lots, taille moyenne des lots), pool de
+    parsing (travaux en cours, en attente, refusés) et cache des prédictions (succès, taux)."""
+    return {"batching": batcher.stats(), "parsing": parse_pool.stats(), "prediction_cache": prediction_cache_stats()}
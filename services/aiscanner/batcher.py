@@ -0,0 +1,90 @@
+import os, asyncio
+from collections import deque
+import numpy as np
+
+# Micro-batching des prédictions : les vecteurs soumis par des requêtes concurrentes sont
+# regroupés pendant une courte fenêtre (BATCH_WINDOW_MS) puis évalués en un seul appel
+# au modèle, dont le coût fixe est ainsi partagé. Une requête seule attend au plus la
+# fenêtre ; un lot plein (BATCH_MAX_SIZE) part immédiatement. Pendant qu'un lot est
+# évalué (hors de la boucle d'événements), les suivants continuent de se remplir.
+BATCH_WINDOW_MS = float(os.environ.get("BATCH_WINDOW_MS", 10))
+BATCH_MAX_SIZE = int(os.environ.get("BATCH_MAX_SIZE", 64))
+
+class MicroBatcher:
+    """Regroupe les appels à predict(matrice) -> scores, une ligne par vecteur soumis."""
+
+    def __init__(self, predict, max_size=BATCH_MAX_SIZE, window_ms=BATCH_WINDOW_MS):
+        self.predict = predict
+        self.max_size = max_size
+        self.window = window_ms / 1000
+        self._pending = deque()
+        self._loop = None
+        self._task = None
+        self._stats = {"requests": 0, "batches": 0, "largest_batch": 0}
+
+    def _start(self):
+        # Démarré à la première requête, dans la boucle d'événements du serveur
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._task is None or self._task.done():
+            self._loop = loop
+            self._wakeup = asyncio.Event()
+            self._full = asyncio.Event()
+            self._task = loop.create_task(self._run())
+
+    async def submit(self, vec):
+        """Score d'un vecteur (1 x N), calculé dans le prochain lot."""
+        self._start()
+        future = self._loop.create_future()
+        self._pending.append((vec, future))
+        self._wakeup.set()
+        if len(self._pending) >= self.max_size:
+            self._full.set()
+        return await future
+
+    def _take(self):
+        batch = []
+        while self._pending and len(batch) < self.max_size:
+            vec, future = self._pending.popleft()
+            # Requête abandonnée (client déconnecté) : rien à calculer
+            if not future.done():
+                batch.append((vec, future))
+        if not self._pending:
+            self._wakeup.clear()
+        if len(self._pending) < self.max_size:
+            self._full.clear()
+        return batch
+
+    async def _run(self):
+        while True:
+            await self._wakeup.wait()
+            if len(self._pending) < self.max_size:
+                try:
+                    await asyncio.wait_for(self._full.wait(), self.window)
+                except asyncio.TimeoutError:
+                    pass
+            batch = self._take()
+            if not batch:
+                continue
+            self._stats["requests"] += len(batch)
+            self._stats["batches"] += 1
+            self._stats["largest_batch"] = max(self._stats["largest_batch"], len(batch))
+            try:
+                matrix = np.vstack([vec for vec, _ in batch])
+                scores = await self._loop.run_in_executor(None, self.predict, matrix)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for (_, future), score in zip(batch, scores):
+                if not future.done():
+                    future.set_result(float(score))
+
+    def stats(self):
+        batches = self._stats["batches"]
+        return {
+            **self._stats,
+            "mean_batch": round(self._stats["requests"] / batches, 2) if batches else None,
+            "window_ms": self.window * 1000,
+            "max_size": self.max_size,
+        }
@@ -0,0 +1,90 @@
+"""
+Conversion du modèle Keras (.h5) en tableaux NumPy (.npz) lus par permission_model.py.
+
+Le modèle est un réseau dense séquentiel : seuls les poids (kernel, bias) et l'activation
+de chaque couche Dense sont exportés ; les couches Dropout n'ont aucun effet en inférence.
+Le service n'a ainsi plus besoin de TensorFlow : h5py ne sert qu'à cette conversion.
+
+Usage : python convert_model.py [mobilesec_model_v3.h5] [mobilesec_model_v3.npz]
+Si TensorFlow est installé, les scores sont comparés à ceux de Keras sur des vecteurs
+aléatoires ; sinon, à un calcul de référence en float64 à partir du .h5.
+"""
+import argparse, json, sys
+import numpy as np
+import h5py
+from permission_model import DenseModel, ACTIVATIONS
+
+# Écart maximal toléré entre les scores du .npz et ceux de la référence
+TOLERANCE = 1e-5
+CHECK_SAMPLES = 2000
+
+def read_h5(path):
+    """Couches Dense du modèle : [(kernel, bias, activation)], dans l'ordre."""
+    with h5py.File(path, "r") as f:
+        config = json.loads(f.attrs["model_config"])
+        if config["class_name"] != "Sequential":
+            raise ValueError(f"unsupported model: {config['class_name']}")
+        weights = f["model_weights"]
+        layers = []
+        for layer in config["config"]["layers"]:
+            kind, layer_config = layer["class_name"], layer["config"]
+            if kind in ("InputLayer", "Dropout"):
+                continue
+            if kind != "Dense":
+                raise ValueError(f"unsupported layer: {kind}")
+            activation = layer_config.get("activation") or "linear"
+            if activation not in ACTIVATIONS:
+                raise ValueError(f"unsupported activation: {activation}")
+            # Poids rangés sous <couche>/<modèle>/<couche>/kernel (Keras 3) ou kernel:0 (Keras 2)
+            found = {}
+            def collect(name, obj):
+                if isinstance(obj, h5py.Dataset):
+                    found[name.rsplit("/", 1)[-1].split(":")[0]] = obj[()]
+            weights[layer_config["name"]].visititems(collect)
+            kernel = found["kernel"]
+            bias = found["bias"] if layer_config.get("use_bias", True) else np.zeros(kernel.shape[1], dtype=kernel.dtype)
+            layers.append((kernel, bias, activation))
+    return layers
+
+def write_npz(layers, path):
+    arrays = {"activations": np.array([activation for _, _, activation in layers])}
+    for i, (kernel, bias, _) in enumerate(layers):
+        arrays[f"kernel_{i}"] = kernel.astype(np.float32)
+        arrays[f"bias_{i}"] = bias.astype(np.float32)
+    np.savez_compressed(path, **arrays)
+
+def reference_scores(h5_path, layers, matrix):
+    """Scores de référence : Keras si TensorFlow est installé, sinon calcul en float64."""
+    try:
+        import tensorflow as tf
+    except ImportError:
+        x = matrix.astype(np.float64)
+        for kernel, bias, activation in layers:
+            x = ACTIVATIONS[activation](x @ kernel.astype(np.float64) + bias)
+        return x[:, 0], "float64 forward pass"
+    model = tf.keras.models.load_model(h5_path)
+    return model.predict(matrix, batch_size=len(matrix), verbose=0)[:, 0], f"keras {tf.__version__}"
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("h5", nargs="?", default="mobilesec_model_v3.h5")
+    parser.add_argument("npz", nargs="?", default="mobilesec_model_v3.npz")
+    args = parser.parse_args()
+
+    layers = read_h5(args.h5)
+    write_npz(layers, args.npz)
+    print(f"{args.npz}: {len(layers)} dense layer(s), "
+          f"{' -> '.join([str(layers[0][0].shape[0])] + [str(k.shape[1]) for k, _, _ in layers])}")
+
+    # Vecteurs binaires aléatoires, de densités variées (de quelques permissions à beaucoup)
+    rng = np.random.default_rng(0)
+    size = layers[0][0].shape[0]
+    matrix = (rng.random((CHECK_SAMPLES, size)) < rng.random((CHECK_SAMPLES, 1)) * 0.5).astype(np.float32)
+    expected, reference = reference_scores(args.h5, layers, matrix)
+    error = float(np.max(np.abs(DenseModel.load(args.npz).predict(matrix) - expected)))
+    print(f"max |score - {reference}| over {CHECK_SAMPLES} vectors: {error:.2e}")
+    if error > TOLERANCE:
+        sys.exit(f"scores differ by more than {TOLERANCE}")
+
+if __name__ == "__main__":
+    main()
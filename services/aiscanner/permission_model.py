@@ -0,0 +1,270 @@
+from androguard.core.apk import APK
+from collections import OrderedDict
+import numpy as np
+import os
+import time
+import threading
+
+# --- CONFIGURATION ---
+# Poids du modèle exportés du .h5 Keras par convert_model.py : l'inférence se fait en NumPy,
+# sans TensorFlow (chargement en quelques millisecondes, quelques Mo par processus)
+MODEL_PATH = os.environ.get(
+    "MODEL_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "mobilesec_model_v3.npz")
+)
+# Le fichier du modèle est re-vérifié au plus toutes les MODEL_CHECK_INTERVAL secondes :
+# un modèle remplacé est rechargé sans redémarrage (et le cache des prédictions vidé)
+MODEL_CHECK_INTERVAL = float(os.environ.get("MODEL_CHECK_INTERVAL", 5.0))
+# Scores mémorisés par profil de permissions (LRU, par processus)
+PREDICTION_CACHE_SIZE = int(os.environ.get("PREDICTION_CACHE_SIZE", 65536))
+
+# Liste EXACTE des permissions utilisée lors de l'entraînement (copiez-collez la liste complète ici)
+ALL_PERMISSIONS = [
+    "android.permission.INTERNET", "android.permission.ACCESS_NETWORK_STATE",
+    "android.permission.ACCESS_WIFI_STATE", "android.permission.CHANGE_WIFI_STATE",
+    "android.permission.CHANGE_NETWORK_STATE", "android.permission.BLUETOOTH",
+    "android.permission.BLUETOOTH_ADMIN", "android.permission.BLUETOOTH_PRIVILEGED",
+    "android.permission.NFC", "android.permission.USE_SIP", "android.permission.VOIP",
+    "android.permission.READ_SMS", "android.permission.SEND_SMS",
+    "android.permission.RECEIVE_SMS", "android.permission.RECEIVE_MMS",
+    "android.permission.RECEIVE_WAP_PUSH", "android.permission.WRITE_SMS",
+    "android.permission.READ_PHONE_STATE", "android.permission.CALL_PHONE",
+    "android.permission.PROCESS_OUTGOING_CALLS", "android.permission.READ_CALL_LOG",
+    "android.permission.WRITE_CALL_LOG", "android.permission.ADD_VOICEMAIL",
+    "android.permission.USE_USSD", "android.permission.MODIFY_PHONE_STATE",
+    "android.permission.ACCESS_FINE_LOCATION", "android.permission.ACCESS_COARSE_LOCATION",
+    "android.permission.ACCESS_BACKGROUND_LOCATION", "android.permission.ACCESS_MOCK_LOCATION",
+    "android.permission.ACCESS_LOCATION_EXTRA_COMMANDS",
+    "android.permission.READ_EXTERNAL_STORAGE", "android.permission.WRITE_EXTERNAL_STORAGE",
+    "android.permission.MOUNT_UNMOUNT_FILESYSTEMS", "android.permission.MANAGE_DOCUMENTS",
+    "android.permission.CAMERA", "android.permission.RECORD_AUDIO",
+    "android.permission.CAPTURE_AUDIO_OUTPUT", "android.permission.CAPTURE_VIDEO_OUTPUT",
+    "android.permission.BODY_SENSORS", "android.permission.USE_FINGERPRINT",
+    "android.permission.VIBRATE", "android.permission.FLASHLIGHT",
+    "android.permission.RECEIVE_BOOT_COMPLETED", "android.permission.WAKE_LOCK",
+    "android.permission.SYSTEM_ALERT_WINDOW", "android.permission.KILL_BACKGROUND_PROCESSES",
+    "android.permission.RESTART_PACKAGES", "android.permission.GET_TASKS",
+    "android.permission.REORDER_TASKS", "android.permission.EXPAND_STATUS_BAR",
+    "android.permission.DISABLE_KEYGUARD", "android.permission.READ_SYNC_SETTINGS",
+    "android.permission.WRITE_SYNC_SETTINGS", "android.permission.READ_SYNC_STATS",
+    "android.permission.PERSISTENT_ACTIVITY",
+    "android.permission.INSTALL_PACKAGES", "android.permission.REQUEST_INSTALL_PACKAGES",
+    "android.permission.DELETE_PACKAGES", "android.permission.CLEAR_APP_CACHE",
+    "android.permission.DELETE_CACHE", "android.permission.INSTALL_SHORTCUT",
+    "android.permission.UNINSTALL_SHORTCUT",
+    "android.permission.GET_ACCOUNTS", "android.permission.AUTHENTICATE_ACCOUNTS",
+    "android.permission.MANAGE_ACCOUNTS", "android.permission.USE_CREDENTIALS",
+    "android.permission.ACCOUNT_MANAGER", "android.permission.BIND_DEVICE_ADMIN",
+    "android.permission.READ_CONTACTS", "android.permission.WRITE_CONTACTS",
+    "android.permission.READ_CALENDAR", "android.permission.WRITE_CALENDAR",
+    "android.permission.READ_PROFILE", "android.permission.WRITE_PROFILE",
+    "android.permission.READ_SOCIAL_STREAM", "android.permission.WRITE_SOCIAL_STREAM",
+    "android.permission.READ_USER_DICTIONARY", "android.permission.WRITE_USER_DICTIONARY",
+    "android.permission.WRITE_SETTINGS", "android.permission.WRITE_SECURE_SETTINGS",
+    "android.permission.SET_WALLPAPER", "android.permission.SET_TIME_ZONE",
+    "com.android.browser.permission.READ_HISTORY_BOOKMARKS",
+    "com.android.browser.permission.WRITE_HISTORY_BOOKMARKS",
+    "com.android.vending.BILLING", "com.android.vending.CHECK_LICENSE",
+    "com.google.android.c2dm.permission.RECEIVE",
+    "com.google.android.gms.permission.ACTIVITY_RECOGNITION"
+]
+
+def _sigmoid(x):
+    # Forme stable pour les grandes valeurs négatives (pas de dépassement dans exp)
+    z = np.exp(-np.abs(x))
+    return np.where(x >= 0, 1 / (1 + z), z / (1 + z))
+
+# Activations des couches Dense supportées (mêmes définitions que Keras)
+ACTIVATIONS = {
+    "linear": lambda x: x,
+    "relu": lambda x: np.maximum(x, 0),
+    "sigmoid": _sigmoid,
+    "tanh": np.tanh,
+}
+
+class DenseModel:
+    """Réseau dense séquentiel : x -> activation(x @ kernel + bias), couche par couche, en float32."""
+
+    def __init__(self, layers):
+        self.layers = layers
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            activations = [str(a) for a in data["activations"]]
+            return cls([(data[f"kernel_{i}"], data[f"bias_{i}"], ACTIVATIONS[a]) for i, a in enumerate(activations)])
+
+    def predict(self, matrix):
+        """Scores d'un lot de vecteurs (une ligne par APK) : première sortie du réseau."""
+        x = np.asarray(matrix, dtype=np.float32)
+        for kernel, bias, activation in self.layers:
+            x = activation(x @ kernel + bias)
+        return x[:, 0]
+
+# Position de chaque permission dans le vecteur
+PERMISSION_INDEX = {p: i for i, p in enumerate(ALL_PERMISSIONS)}
+
+def vector_key(row):
+    """Clé d'un vecteur de permissions : ses bits empaquetés (11 octets pour 88 permissions)."""
+    return np.packbits(np.asarray(row) != 0).tobytes()
+
+class PredictionCache:
+    """Scores par profil de permissions (LRU borné) : des milliers d'APK partagent le même
+    ensemble de permissions, donc le même score. Associé à un modèle chargé : un nouveau
+    modèle part d'un cache vide."""
+
+    def __init__(self, size=PREDICTION_CACHE_SIZE):
+        self.size = size
+        self._scores = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def get(self, key):
+        with self._lock:
+            score = self._scores.get(key)
+            if score is None:
+                self._stats["misses"] += 1
+            else:
+                self._scores.move_to_end(key)
+                self._stats["hits"] += 1
+            return score
+
+    def store(self, keys, scores):
+        with self._lock:
+            for key, score in zip(keys, scores):
+                self._scores[key] = float(score)
+                self._scores.move_to_end(key)
+            while len(self._scores) > self.size:
+                self._scores.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                **self._stats,
+                "entries": len(self._scores),
+                "max_entries": self.size,
+                "hit_rate": round(self._stats["hits"] / lookups, 4) if lookups else None,
+            }
+
+# Modèle chargé et son cache de prédictions, remplacés ensemble
+_loaded = None
+_stamp = None
+_checked_at = 0.0
+_load_lock = threading.Lock()
+
+def _model_stamp():
+    st = os.stat(MODEL_PATH)
+    return st.st_ino, st.st_mtime_ns, st.st_size
+
+def _current():
+    """(modèle, cache) ; le fichier du modèle n'est re-vérifié qu'après MODEL_CHECK_INTERVAL."""
+    global _loaded, _stamp, _checked_at
+    now = time.monotonic()
+    if _loaded is not None and now - _checked_at < MODEL_CHECK_INTERVAL:
+        return _loaded
+    with _load_lock:
+        stamp = _model_stamp()
+        if _loaded is None or stamp != _stamp:
+            print("Loading AI Model...")
+            _loaded = (DenseModel.load(MODEL_PATH), PredictionCache())
+            _stamp = stamp
+            print("AI Model Loaded!")
+        _checked_at = now
+        return _loaded
+
+def load_model():
+    """Charge le modèle une seule fois par processus (puis à chaque remplacement du fichier)."""
+    return _current()[0]
+
+def reload_model():
+    """Recharge immédiatement le modèle ; les prédictions en cache sont abandonnées."""
+    global _loaded, _stamp, _checked_at
+    with _load_lock:
+        print("Loading AI Model...")
+        _loaded = (DenseModel.load(MODEL_PATH), PredictionCache())
+        _stamp = _model_stamp()
+        _checked_at = time.monotonic()
+        print("AI Model Loaded!")
+    return _loaded[0]
+
+def prediction_cache_stats():
+    return _current()[1].stats()
+
+def permissions_to_vector(perms):
+    vec = np.zeros((1, len(ALL_PERMISSIONS)), dtype=np.float32)
+    detected_perms = []
+    for p in perms:
+        i = PERMISSION_INDEX.get(p)
+        if i is not None:
+            vec[0, i] = 1
+            detected_perms.append(p)
+    return vec, detected_perms
+
+def extract_vector(apk_path):
+    try:
+        a = APK(apk_path)
+        return permissions_to_vector(a.get_permissions())
+    except Exception as e:
+        print(f"Error parsing APK: {e}")
+        return None, []
+
+def extract_vectors(apk_paths):
+    """extract_vector pour plusieurs APK, dans un seul travail du pool."""
+    return [extract_vector(path) for path in apk_paths]
+
+def cached_score(vec):
+    """Score en cache pour un vecteur (1 x N), ou None."""
+    return _current()[1].get(vector_key(vec[0]))
+
+def compute_scores(matrix):
+    """Scores d'un lot de vecteurs (une ligne par APK), en un seul appel au modèle ;
+    ils sont mis en cache dans le cache du modèle qui les a calculés."""
+    model, cache = _current()
+    scores = model.predict(matrix)
+    cache.store([vector_key(row) for row in matrix], scores)
+    return scores
+
+def predict_scores(matrix):
+    """Scores d'un lot de vecteurs : les profils déjà vus viennent du cache, les autres
+    sont calculés ensemble."""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    cache = _current()[1]
+    scores = np.empty(len(matrix), dtype=np.float32)
+    missing = []
+    for i, row in enumerate(matrix):
+        score = cache.get(vector_key(row))
+        if score is None:
+            missing.append(i)
+        else:
+            scores[i] = score
+    if missing:
+        scores[missing] = compute_scores(matrix[missing])
+    return scores
+
+def classify(score):
+    """Retourne (status, confidence) pour un score du modèle."""
+    status = "SECURE"
+    if score > 0.8: status = "MALWARE"
+    elif score > 0.3: status = "SUSPICIOUS"
+
+    # Calcul d'un score de confiance basique (distance par rapport au seuil d'incertitude 0.5)
+    # Plus on est proche de 0 ou 1, plus on est confiant.
+    confidence = abs(score - 0.5) * 2
+    return status, confidence
+
+def score_vector(vec):
+    """Retourne (score, status, confidence) pour un vecteur de permissions."""
+    score = float(predict_scores(vec)[0])
+    return (score, *classify(score))
+
+def predict_permissions(perms):
+    """Prédiction à partir d'une liste de permissions déjà extraite (utilisée par l'orchestrateur)."""
+    vec, detected_perms = permissions_to_vector(perms)
+    score, status, confidence = score_vector(vec)
+    return {
+        "risk_score": score,
+        "confidence": confidence,
+        "status": status,
+        "permissions": detected_perms
+    }
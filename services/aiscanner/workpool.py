@@ -0,0 +1,66 @@
+import os, asyncio
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+# Travaux bloquants (parsing des APK) exécutés hors de la boucle d'événements, dans un
+# pool de processus borné : le parsing Androguard est du Python pur, des threads
+# s'exécuteraient l'un après l'autre sous le GIL.
+# Au plus PARSE_WORKERS travaux sont confiés au pool ; les suivants attendent leur tour
+# dans la boucle (sans la bloquer), jusqu'à PARSE_QUEUE_SIZE. Au-delà, la requête est
+# refusée immédiatement (503) plutôt que d'accumuler des uploads en mémoire.
+PARSE_WORKERS = int(os.environ.get("PARSE_WORKERS", 2))
+PARSE_QUEUE_SIZE = int(os.environ.get("PARSE_QUEUE_SIZE", PARSE_WORKERS * 8))
+
+class Overloaded(Exception):
+    """File d'attente pleine : le client doit réessayer plus tard."""
+
+class BoundedPool:
+    """Pool de processus créé à la première utilisation, avec file d'attente bornée."""
+
+    def __init__(self, workers=PARSE_WORKERS, queue_size=PARSE_QUEUE_SIZE):
+        self.workers = workers
+        self.queue_size = queue_size
+        self._pool = None
+        self._slots = None
+        self._waiting = 0
+        self._running = 0
+        self._stats = {"completed": 0, "failed": 0, "rejected": 0}
+
+    def _get_pool(self):
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        return self._pool
+
+    async def run(self, fn, *args):
+        """Exécute fn(*args) dans le pool ; fn doit être une fonction de module (sérialisable)."""
+        if self._waiting >= self.queue_size:
+            self._stats["rejected"] += 1
+            raise Overloaded(f"{self._waiting} jobs waiting")
+        if self._slots is None:
+            # Créé dans la boucle d'événements du serveur
+            self._slots = asyncio.Semaphore(self.workers)
+        self._waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self._waiting -= 1
+        self._running += 1
+        try:
+            result = await asyncio.get_running_loop().run_in_executor(self._get_pool(), fn, *args)
+            self._stats["completed"] += 1
+            return result
+        except BrokenProcessPool:
+            # Un processus du pool est mort (OOM...) : il sera recréé au prochain travail
+            self._pool = None
+            self._stats["failed"] += 1
+            raise
+        except Exception:
+            self._stats["failed"] += 1
+            raise
+        finally:
+            self._running -= 1
+            self._slots.release()
+
+    def stats(self):
+        return {**self._stats, "running": self._running, "waiting": self._waiting,
+                "workers": self.workers, "queue_size": self.queue_size}
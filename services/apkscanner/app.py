@@ -1,12 +1,12 @@
 from flask import Flask, request, jsonify, send_file
 from flask_cors import CORS
 import os, tempfile, uuid, traceback
-from androguard.core.apk import APK
-from xml.etree import ElementTree as ET
-from utils import init_db, save_scan_result, update_status, get_scan, get_all_scans
+from utils import (init_db, save_scan_result, get_scan, get_all_scans,
+                   save_upload, get_cached_result, enqueue_scan, PAGE_SIZE)
+from manifest_analyzer import ANALYZER_VERSION
 
 app = Flask(__name__)
-CORS(app)  # Enable CORS for all routes
+CORS(app, expose_headers=["X-Next-Cursor"])  # Enable CORS for all routes
 PORT = int(os.environ.get("PORT", 8001))
 STORAGE_DIR = os.environ.get("APK_STORAGE_DIR", "/app/uploads")
 os.makedirs(STORAGE_DIR, exist_ok=True)
@@ -14,95 +14,6 @@ os.makedirs(STORAGE_DIR, exist_ok=True)
 # Initialisation de la base de données au démarrage
 init_db()
 
-def analyze_apk(filepath):
-    """
-    Retourne un dict avec: package, permissions, exported components, flags.
-    Gère le parsing XML de manière robuste.
-    """
-    a = APK(filepath)
-    package = a.get_package()
-    permissions = sorted(list(a.get_permissions() or []))
-    
-    # --- 1. Extraction des composants via les méthodes natives Androguard ---
-    # (Utilisé pour la structure de base, mais on préfère le XML pour l'attribut 'exported')
-    # Note: on ne remplit pas 'comps' ici, on le fera via le parsing XML ci-dessous pour plus de précision.
-
-    # --- 2. Parsing XML Robuste pour 'exported' ---
-    manifest_xml = ""
-    try:
-        axml = a.get_android_manifest_axml()
-        if axml:
-            manifest_xml = axml.toxml()
-    except Exception:
-        print("Warning: Could not extract raw XML from AXML")
-
-    exported_components = []
-    
-    if manifest_xml:
-        try:
-            # Namespace Android standard
-            ANDROID_NS = '{http://schemas.android.com/apk/res/android}'
-            
-            root = ET.fromstring(manifest_xml)
-            component_tags = ["activity", "service", "receiver", "provider"]
-            
-            for tag in component_tags:
-                # Recherche récursive sécurisée
-                for elem in root.findall(f".//{tag}"):
-                    name = elem.get(f"{ANDROID_NS}name")
-                    exported_val = elem.get(f"{ANDROID_NS}exported")
-                    
-                    if name:
-                        is_exported = None
-                        if exported_val is not None:
-                            is_exported = (exported_val.lower() == "true")
-                        
-                        exported_components.append({
-                            "name": name,
-                            "type": tag,
-                            "exported": is_exported
-                        })
-        except Exception as e:
-            print(f"Error parsing manifest XML: {e}")
-            # En cas d'erreur XML, on continue avec ce qu'on a déjà
-
-    # --- 3. Flags de sécurité ---
-    flags = {
-        "debuggable": False,
-        "allowBackup": None,
-        "usesCleartextTraffic": None
-    }
-    
-    # Vérification du flag debuggable via l'application flags
-    try:
-        # Méthode alternative pour vérifier debuggable
-        app_info = a.get_AndroidManifest().find('.//application')
-        if app_info is not None:
-            ANDROID_NS = '{http://schemas.android.com/apk/res/android}'
-            debuggable_attr = app_info.get(f"{ANDROID_NS}debuggable")
-            if debuggable_attr:
-                flags["debuggable"] = (debuggable_attr.lower() == "true")
-    except Exception as e:
-        print(f"Warning: Could not check debuggable flag: {e}")
-    
-    try:
-        if manifest_xml:
-            # Recherche simple de chaînes dans le XML brut pour ces flags
-            # Méthode "best effort" alternative
-            if 'android:debuggable="true"' in manifest_xml:
-                flags["debuggable"] = True
-            flags["allowBackup"] = 'android:allowBackup="true"' in manifest_xml
-            flags["usesCleartextTraffic"] = 'android:usesCleartextTraffic="true"' in manifest_xml
-    except Exception:
-        pass
-
-    return {
-        "package": package,
-        "permissions": permissions,
-        "exported_components": exported_components,
-        "flags": flags
-    }
-
 @app.route("/health")
 def health():
     return jsonify({"status":"ok","service":"apkscanner"})
@@ -110,38 +21,31 @@ def health():
 @app.route("/scan", methods=["POST"])
 def scan():
     save_path = None
+    queued = False
     try:
         if 'file' not in request.files:
             return jsonify({"error":"no file provided"}), 400
         
         f = request.files['file']
-        # Sécurisation basique du nom de fichier ou génération d'UUID
+        # Le nom fourni par le client n'est conservé qu'en base : sur disque, un nom unique par job
         filename = f.filename or f"{uuid.uuid4().hex}.apk"
-        save_path = os.path.join(STORAGE_DIR, filename)
-        
-        f.save(save_path)
-
         job_id = "job-" + uuid.uuid4().hex
+        save_path = os.path.join(STORAGE_DIR, f"{job_id}.apk")
         
-        # 1. Enregistrement initial (statut: queued)
-        save_scan_result(job_id, filename, None, "queued", {})
-        
-        # 2. Passage en 'running'
-        update_status(job_id, "running")
+        sha256 = save_upload(f, save_path)
+
+        # 0. APK déjà analysé avec la même version : on renvoie le résultat stocké
+        cached = get_cached_result(sha256, ANALYZER_VERSION)
+        if cached is not None:
+            save_scan_result(job_id, filename, cached.get("package"), "done", cached)
+            return jsonify({"job_id": job_id, "status": "done", "cache_hit": True, "sha256": sha256}), 200
         
-        try:
-            # 3. Analyse Synchrone
-            result = analyze_apk(save_path)
-            save_scan_result(job_id, filename, result.get("package"), "done", result)
-            
-            return jsonify({"job_id": job_id, "status":"done"}), 202
+        # 1. Mise en file : l'analyse est faite par le pool de workers (cf. worker.py),
+        #    le fichier est supprimé par le worker une fois le job terminé
+        enqueue_scan(job_id, filename, save_path, sha256)
+        queued = True
 
-        except Exception as e:
-            error_msg = str(e)
-            trace = traceback.format_exc()
-            print(f"Analysis failed for {job_id}: {error_msg}")
-            save_scan_result(job_id, filename, None, "failed", {"error": error_msg, "trace": trace})
-            return jsonify({"job_id": job_id, "status":"failed", "error": error_msg}), 500
+        return jsonify({"job_id": job_id, "status": "queued", "cache_hit": False, "sha256": sha256}), 202
 
     except Exception as e:
         # Erreur globale (ex: disque plein, erreur I/O avant analyse)
@@ -149,8 +53,8 @@ def scan():
     
     finally:
         # --- NETTOYAGE AUTOMATIQUE ---
-        # Ce bloc s'exécute TOUJOURS, que l'analyse réussisse ou échoue.
-        if save_path and os.path.exists(save_path):
+        # Sauf si le job a été mis en file, le fichier n'est plus utile.
+        if not queued and save_path and os.path.exists(save_path):
             try:
                 os.remove(save_path)
                 print(f"Cleaned up file: {save_path}")
@@ -159,18 +63,40 @@ def scan():
 
 @app.route("/scan/<job_id>", methods=["GET"])
 def get_job(job_id):
-    s = get_scan(job_id)
+    """?view=summary : résumé stocké ; ?section=<clé> (répétable) : ces seules sections du résultat.
+    Les autres sections ne sont pas décompressées."""
+    try:
+        s = get_scan(job_id, sections=request.args.getlist("section"), summary=request.args.get("view") == "summary")
+    except KeyError as e:
+        return jsonify({"error": f"unknown section: {e.args[0]}"}), 400
     if not s:
         return jsonify({"error":"not found"}), 404
     return jsonify(s)
 
 @app.route("/scans", methods=["GET"])
 def list_scans():
+    """Listing paginé : ?limit=&cursor=&status=&package=&since=&until= ;
+    le curseur de la page suivante est renvoyé dans l'en-tête X-Next-Cursor."""
     try:
-        scans = get_all_scans()
-        return jsonify(scans)
+        scans, next_cursor = get_all_scans(
+            cursor=request.args.get("cursor"),
+            limit=request.args.get("limit", PAGE_SIZE),
+            status=request.args.get("status"),
+            package=request.args.get("package"),
+            since=request.args.get("since"),
+            until=request.args.get("until")
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
+    response = jsonify(scans)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return response
 
 if __name__ == "__main__":
+    # En développement, le pool de workers tourne à côté du serveur Flask
+    from worker import start_pool
+    start_pool()
     app.run(host="0.0.0.0", port=PORT)
\ No newline at end of file
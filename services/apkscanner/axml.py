@@ -0,0 +1,153 @@
+import struct
+
+# Lecture directe du AndroidManifest.xml binaire (format AXML), en un seul passage,
+# sans construire d'objet APK (ni ressources, ni signatures).
+RES_STRING_POOL_TYPE = 0x0001
+RES_XML_TYPE = 0x0003
+RES_XML_START_ELEMENT_TYPE = 0x0102
+RES_XML_END_ELEMENT_TYPE = 0x0103
+RES_XML_RESOURCE_MAP_TYPE = 0x0180
+UTF8_FLAG = 0x100
+NO_INDEX = 0xFFFFFFFF
+
+TYPE_REFERENCE = 0x01
+TYPE_ATTRIBUTE = 0x02
+TYPE_STRING = 0x03
+TYPE_INT_HEX = 0x11
+TYPE_INT_BOOLEAN = 0x12
+TYPE_FIRST_INT = 0x10
+TYPE_LAST_INT = 0x1F
+
+ANDROID_NS = "http://schemas.android.com/apk/res/android"
+
+# Attributs système identifiés par leur ID de ressource (android.R.attr) : c'est l'ID
+# qu'utilise Android, le nom dans la table des chaînes peut être vide ou falsifié.
+SYSTEM_ATTRS = {
+    0x01010003: "name",
+    0x01010006: "permission",
+    0x0101000e: "enabled",
+    0x0101000f: "debuggable",
+    0x01010010: "exported",
+    0x01010026: "mimeType",
+    0x01010027: "scheme",
+    0x01010028: "host",
+    0x01010029: "port",
+    0x0101002a: "path",
+    0x0101002b: "pathPrefix",
+    0x0101002c: "pathPattern",
+    0x01010280: "allowBackup",
+    0x010104ec: "usesCleartextTraffic",
+}
+
+class Element:
+    """Élément XML minimal : attributs indexés par nom local (android:name -> "name")."""
+
+    __slots__ = ("tag", "attrs", "children")
+
+    def __init__(self, tag):
+        self.tag = tag
+        self.attrs = {}
+        self.children = []
+
+    def get(self, name, default=None):
+        return self.attrs.get(name, default)
+
+    def iter(self, tag):
+        """Descendants (et soi-même) portant ce tag, dans l'ordre du document."""
+        if self.tag == tag:
+            yield self
+        for child in self.children:
+            yield from child.iter(tag)
+
+def _read_string_pool(buf, pos, header_size):
+    count, _, flags, strings_start = struct.unpack_from("<IIII", buf, pos + 8)
+    offsets = struct.unpack_from(f"<{count}I", buf, pos + header_size)
+    base = pos + strings_start
+    strings = []
+    for off in offsets:
+        p = base + off
+        if flags & UTF8_FLAG:
+            # Longueur en caractères UTF-16 (ignorée) puis en octets, chacune sur 1 ou 2 octets
+            p += 2 if buf[p] & 0x80 else 1
+            n = buf[p]
+            if n & 0x80:
+                n = ((n & 0x7F) << 8) | buf[p + 1]
+                p += 2
+            else:
+                p += 1
+            strings.append(buf[p:p + n].decode("utf-8", "replace"))
+        else:
+            n, = struct.unpack_from("<H", buf, p)
+            p += 2
+            if n & 0x8000:
+                n = ((n & 0x7FFF) << 16) | struct.unpack_from("<H", buf, p)[0]
+                p += 2
+            strings.append(buf[p:p + 2 * n].decode("utf-16-le", "replace"))
+    return strings
+
+def _format_value(strings, raw, data_type, data):
+    """Valeur d'attribut sous la forme texte que produit androguard (AXMLPrinter)."""
+    if data_type == TYPE_STRING:
+        return strings[data]
+    if data_type == TYPE_INT_BOOLEAN:
+        return "true" if data else "false"
+    if data_type in (TYPE_REFERENCE, TYPE_ATTRIBUTE):
+        # Ressources du framework (paquet 0x01) préfixées par "android:"
+        prefix = "android:" if data >> 24 == 1 else ""
+        return f"{'@' if data_type == TYPE_REFERENCE else '?'}{prefix}{data:08X}"
+    if data_type == TYPE_INT_HEX:
+        return f"0x{data:08X}"
+    if TYPE_FIRST_INT <= data_type <= TYPE_LAST_INT:
+        return str(data - (1 << 32) if data & 0x80000000 else data)
+    if raw != NO_INDEX:
+        return strings[raw]
+    return f"<0x{data:X}, type 0x{data_type:02X}>"
+
+def parse_axml(buf):
+    """Parse un document AXML et retourne son élément racine.
+
+    Lève une exception si le document est invalide : l'appelant se rabat alors sur androguard.
+    """
+    doc_type, header_size, _ = struct.unpack_from("<HHI", buf, 0)
+    if doc_type != RES_XML_TYPE:
+        raise ValueError("not a binary XML document")
+
+    strings, res_ids = [], ()
+    root, stack = None, []
+    pos = header_size
+    while pos + 8 <= len(buf):
+        chunk_type, chunk_header, chunk_size = struct.unpack_from("<HHI", buf, pos)
+        if chunk_size < 8:
+            raise ValueError(f"invalid chunk size at {pos}")
+
+        if chunk_type == RES_STRING_POOL_TYPE:
+            strings = _read_string_pool(buf, pos, chunk_header)
+        elif chunk_type == RES_XML_RESOURCE_MAP_TYPE:
+            res_ids = struct.unpack_from(f"<{(chunk_size - chunk_header) // 4}I", buf, pos + chunk_header)
+        elif chunk_type == RES_XML_START_ELEMENT_TYPE:
+            ext = pos + chunk_header
+            _, name, attr_start, attr_size, attr_count = struct.unpack_from("<IIHHH", buf, ext)
+            elem = Element(strings[name])
+            for i in range(attr_count):
+                ns, attr_name, raw, data_type, data = struct.unpack_from("<III3xBI", buf, ext + attr_start + i * attr_size)
+                system_name = SYSTEM_ATTRS.get(res_ids[attr_name]) if attr_name < len(res_ids) else None
+                value = _format_value(strings, raw, data_type, data)
+                if system_name or (ns != NO_INDEX and strings[ns] == ANDROID_NS):
+                    # Attribut android:* : prioritaire sur un éventuel homonyme sans namespace
+                    elem.attrs[system_name or strings[attr_name]] = value
+                else:
+                    elem.attrs.setdefault(strings[attr_name], value)
+            if stack:
+                stack[-1].children.append(elem)
+            elif root is None:
+                root = elem
+            stack.append(elem)
+        elif chunk_type == RES_XML_END_ELEMENT_TYPE:
+            if stack:
+                stack.pop()
+
+        pos += chunk_size
+
+    if root is None:
+        raise ValueError("empty binary XML document")
+    return root
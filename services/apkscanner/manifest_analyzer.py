@@ -0,0 +1,172 @@
+import zipfile
+from androguard.core.apk import APK
+from xml.etree import ElementTree as ET
+from lxml import etree
+from axml import parse_axml
+
+# Clé de version du cache de résultats : à incrémenter dès que la logique d'analyse change
+ANALYZER_VERSION = "apkscanner-2"
+
+COMPONENT_TAGS = ["activity", "service", "receiver", "provider"]
+INTENT_DATA_ATTRS = ["scheme", "host", "port", "path", "pathPrefix", "pathPattern", "mimeType"]
+
+def analyze_apk(filepath):
+    """
+    Retourne un dict avec: package, permissions, exported components, flags.
+    Seul AndroidManifest.xml est lu dans le ZIP ; androguard ne sert qu'en secours.
+    """
+    try:
+        with zipfile.ZipFile(filepath) as zf:
+            return analyze_manifest_axml(zf.read("AndroidManifest.xml"))
+    except Exception as e:
+        print(f"Warning: fast manifest parsing failed ({e}), falling back to androguard")
+    return analyze_manifest_legacy(APK(filepath))
+
+def analyze_manifest(a):
+    """Analyse un objet APK déjà parsé (partagé avec l'orchestrateur)."""
+    try:
+        return analyze_manifest_axml(a.get_file("AndroidManifest.xml"))
+    except Exception as e:
+        print(f"Warning: fast manifest parsing failed ({e}), falling back to androguard")
+    return analyze_manifest_legacy(a)
+
+def _intent_filters(elem, children, get):
+    """Actions, catégories et données des <intent-filter> d'un composant.
+
+    children(e) et get(e, nom_attribut) adaptent la fonction à l'arbre utilisé.
+    """
+    filters = []
+    for f in children(elem):
+        if f.tag != "intent-filter":
+            continue
+        items = children(f)
+        filters.append({
+            "actions": [get(c, "name") for c in items if c.tag == "action" and get(c, "name")],
+            "categories": [get(c, "name") for c in items if c.tag == "category" and get(c, "name")],
+            "data": [
+                {attr: get(c, attr) for attr in INTENT_DATA_ATTRS if get(c, attr) is not None}
+                for c in items if c.tag == "data"
+            ]
+        })
+    return filters
+
+def analyze_manifest_axml(data):
+    """Analyse le AndroidManifest.xml binaire en un seul passage (cf. axml.py)."""
+    root = parse_axml(data)
+    if root.tag != "manifest":
+        raise ValueError(f"unexpected root element <{root.tag}>")
+
+    permissions = {elem.get("name") for elem in root.iter("uses-permission")}
+    permissions.discard(None)
+
+    exported_components = []
+    for tag in COMPONENT_TAGS:
+        for elem in root.iter(tag):
+            name = elem.get("name")
+            if name:
+                exported_val = elem.get("exported")
+                exported_components.append({
+                    "name": name,
+                    "type": tag,
+                    "exported": (exported_val.lower() == "true") if exported_val is not None else None,
+                    "intent_filters": _intent_filters(elem, lambda e: e.children, lambda e, n: e.get(n))
+                })
+
+    app = next(root.iter("application"), None)
+    app_flag = lambda name: app is not None and (app.get(name) or "").lower() == "true"
+    flags = {
+        "debuggable": app_flag("debuggable"),
+        "allowBackup": app_flag("allowBackup"),
+        "usesCleartextTraffic": app_flag("usesCleartextTraffic")
+    }
+
+    return {
+        "package": root.get("package"),
+        "permissions": sorted(permissions),
+        "exported_components": exported_components,
+        "flags": flags
+    }
+
+def analyze_manifest_legacy(a):
+    """Ancienne analyse via androguard, conservée pour les manifestes que axml.py rejette."""
+    package = a.get_package()
+    permissions = sorted(list(a.get_permissions() or []))
+    
+    # --- 1. Extraction des composants via les méthodes natives Androguard ---
+    # (Utilisé pour la structure de base, mais on préfère le XML pour l'attribut 'exported')
+    # Note: on ne remplit pas 'comps' ici, on le fera via le parsing XML ci-dessous pour plus de précision.
+
+    # --- 2. Parsing XML Robuste pour 'exported' ---
+    manifest_xml = ""
+    try:
+        manifest = a.get_android_manifest_xml()
+        if manifest is not None:
+            manifest_xml = etree.tostring(manifest, encoding="unicode")
+    except Exception:
+        print("Warning: Could not extract raw XML from AXML")
+
+    exported_components = []
+    
+    if manifest_xml:
+        try:
+            # Namespace Android standard
+            ANDROID_NS = '{http://schemas.android.com/apk/res/android}'
+            
+            root = ET.fromstring(manifest_xml)
+            for tag in COMPONENT_TAGS:
+                # Recherche récursive sécurisée
+                for elem in root.findall(f".//{tag}"):
+                    name = elem.get(f"{ANDROID_NS}name")
+                    exported_val = elem.get(f"{ANDROID_NS}exported")
+                    
+                    if name:
+                        is_exported = None
+                        if exported_val is not None:
+                            is_exported = (exported_val.lower() == "true")
+                        
+                        exported_components.append({
+                            "name": name,
+                            "type": tag,
+                            "exported": is_exported,
+                            "intent_filters": _intent_filters(elem, list, lambda e, n: e.get(f"{ANDROID_NS}{n}"))
+                        })
+        except Exception as e:
+            print(f"Error parsing manifest XML: {e}")
+            # En cas d'erreur XML, on continue avec ce qu'on a déjà
+
+    # --- 3. Flags de sécurité ---
+    flags = {
+        "debuggable": False,
+        "allowBackup": None,
+        "usesCleartextTraffic": None
+    }
+    
+    # Vérification du flag debuggable via l'application flags
+    try:
+        # Méthode alternative pour vérifier debuggable
+        app_info = a.get_android_manifest_xml().find('.//application')
+        if app_info is not None:
+            ANDROID_NS = '{http://schemas.android.com/apk/res/android}'
+            debuggable_attr = app_info.get(f"{ANDROID_NS}debuggable")
+            if debuggable_attr:
+                flags["debuggable"] = (debuggable_attr.lower() == "true")
+    except Exception as e:
+        print(f"Warning: Could not check debuggable flag: {e}")
+    
+    try:
+        if manifest_xml:
+            # Recherche simple de chaînes dans le XML brut pour ces flags
+            # Méthode "best effort" alternative
+            if 'android:debuggable="true"' in manifest_xml:
+                flags["debuggable"] = True
+            flags["allowBackup"] = 'android:allowBackup="true"' in manifest_xml
+            flags["usesCleartextTraffic"] = 'android:usesCleartextTraffic="true"' in manifest_xml
+    except Exception:
+        pass
+
+    return {
+        "package": package,
+        "permissions": permissions,
+        "exported_components": exported_components,
+        "flags": flags
+    }
@@ -4,6 +4,17 @@ CREATE TABLE IF NOT EXISTS scans (
   package_name TEXT,
   status TEXT,
   created_at TEXT,
-  result_json TEXT
+  result_json TEXT,
+  upload_path TEXT,
+  sha256 TEXT,
+  progress INTEGER DEFAULT 0,
+  claim_token TEXT
 );
 
+CREATE TABLE IF NOT EXISTS result_cache (
+  sha256 TEXT,
+  version TEXT,
+  created_at TEXT,
+  result_json TEXT,
+  PRIMARY KEY (sha256, version)
+);
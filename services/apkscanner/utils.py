@@ -1,59 +1,168 @@
 import uuid
 import datetime
+import hashlib
 import json
 import os
-from sqlalchemy import create_engine, text
+from sqlalchemy import text
+from storage import (create_sqlite_engine, StatusWriter, ensure_list_indexes, keyset_page, PAGE_SIZE,
+                     COUNT_COLUMNS, count_findings, unpack_counts, backfill_counts,
+                     encode_result, decode_result)
 
 DB_PATH = os.environ.get("APK_DB_PATH", "/app/storage.db")
-ENGINE = create_engine(f"sqlite:///{DB_PATH}", connect_args={"check_same_thread": False})
+ENGINE = create_sqlite_engine(DB_PATH)
+# Progression écrite en différé ; l'état final est écrit immédiatement
+STATUS = StatusWriter(ENGINE, "scans")
+UPLOAD_CHUNK_SIZE = 1024 * 1024
 
 def init_db():
-    with ENGINE.connect() as conn:
+    with ENGINE.begin() as conn:
         sql = open("schema.sql", "r").read()
-        conn.execute(text(sql))
+        # SQLite n'exécute qu'une instruction par appel
+        for statement in sql.split(";"):
+            if statement.strip():
+                conn.execute(text(statement))
+        _ensure_columns(conn, "scans", QUEUE_COLUMNS)
+        ensure_list_indexes(conn, "scans", ("status", "package_name"))
+        _ensure_columns(conn, "scans", COUNT_COLUMNS)
+    backfill_counts(ENGINE, "scans", "result_json", manifest_findings)
+
+# Colonnes de la file d'attente, ajoutées aux bases créées avant leur introduction
+QUEUE_COLUMNS = {
+    "upload_path": "TEXT",
+    "sha256": "TEXT",
+    "progress": "INTEGER DEFAULT 0",
+    "claim_token": "TEXT",
+}
+
+# Sévérité des drapeaux du manifeste, alignée sur les recommandations de reportgen
+FLAG_SEVERITIES = {
+    "debuggable": "HIGH",
+    "allowBackup": "MEDIUM",
+    "usesCleartextTraffic": "MEDIUM",
+}
+
+def manifest_findings(result):
+    """Findings équivalents à un résultat du manifeste, pour les compteurs des listings."""
+    if not isinstance(result, dict) or "error" in result:
+        return []
+    flags = result.get("flags") or {}
+    findings = [{"type": flag, "severity": severity} for flag, severity in FLAG_SEVERITIES.items() if flags.get(flag)]
+    # Composants exportés : comptés par type, sans sévérité propre
+    findings += [{"type": "exported_component"} for _ in result.get("exported_components") or []]
+    return findings
+
+def _ensure_columns(conn, table, columns):
+    existing = {r[1] for r in conn.execute(text(f"PRAGMA table_info({table})"))}
+    for name, ddl in columns.items():
+        if name not in existing:
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {ddl}"))
+
+def save_upload(file_storage, save_path):
+    """Écrit l'upload sur disque par blocs et retourne son SHA-256 calculé au passage."""
+    digest = hashlib.sha256()
+    with open(save_path, "wb") as out:
+        while True:
+            chunk = file_storage.stream.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+            out.write(chunk)
+    return digest.hexdigest()
+
+def get_cached_result(sha256, version):
+    """Retourne le résultat déjà calculé pour un APK identique, ou None."""
+    with ENGINE.connect() as conn:
+        r = conn.execute(
+            text("SELECT result_json FROM result_cache WHERE sha256=:sha AND version=:version"),
+            {"sha": sha256, "version": version}
+        ).fetchone()
+        return decode_result(r[0]) if r else None
+
+def store_cached_result(sha256, version, result):
+    with ENGINE.begin() as conn:
+        conn.execute(
+            text("INSERT OR REPLACE INTO result_cache (sha256, version, created_at, result_json) VALUES (:sha,:version,:created_at,:res)"),
+            {"sha": sha256, "version": version, "created_at": datetime.datetime.utcnow().isoformat(), "res": encode_result(result)}
+        )
 
 def save_scan_result(scan_id, filename, package_name, status, result):
     with ENGINE.begin() as conn:
-        res_json = json.dumps(result, ensure_ascii=False)
+        res_blob = encode_result(result)
+        conn.execute(
+            text("INSERT OR REPLACE INTO scans (id, filename, package_name, status, created_at, result_json, critical_count, high_count, medium_count, low_count, type_counts) VALUES (:id,:filename,:pkg,:status,:created_at,:res,:critical_count,:high_count,:medium_count,:low_count,:type_counts)"),
+            {"id": scan_id, "filename": filename, "pkg": package_name, "status": status, "created_at": datetime.datetime.utcnow().isoformat(), "res": res_blob, **count_findings(manifest_findings(result))}
+        )
+
+def enqueue_scan(scan_id, filename, upload_path, sha256):
+    """Enregistre un job en attente ; il sera traité par le pool de workers."""
+    with ENGINE.begin() as conn:
         conn.execute(
-            text("INSERT OR REPLACE INTO scans (id, filename, package_name, status, created_at, result_json) VALUES (:id,:filename,:pkg,:status,:created_at,:res)"),
-            {"id": scan_id, "filename": filename, "pkg": package_name, "status": status, "created_at": datetime.datetime.utcnow().isoformat(), "res": res_json}
+            text("INSERT INTO scans (id, filename, status, created_at, upload_path, sha256, progress) VALUES (:id,:filename,'queued',:created_at,:path,:sha,0)"),
+            {"id": scan_id, "filename": filename, "created_at": datetime.datetime.utcnow().isoformat(), "path": upload_path, "sha": sha256}
         )
 
-def update_status(scan_id, status):
+def claim_next_job():
+    """Passe atomiquement le plus ancien job 'queued' en 'running' et le retourne."""
+    token = uuid.uuid4().hex
+    with ENGINE.begin() as conn:
+        # Une seule instruction UPDATE : atomique même avec plusieurs workers
+        claimed = conn.execute(
+            text("UPDATE scans SET status='running', claim_token=:token WHERE id = (SELECT id FROM scans WHERE status='queued' ORDER BY created_at LIMIT 1) AND status='queued'"),
+            {"token": token}
+        ).rowcount
+        if not claimed:
+            return None
+        r = conn.execute(
+            text("SELECT id, filename, upload_path, sha256 FROM scans WHERE claim_token=:token"),
+            {"token": token}
+        ).fetchone()
+        return {"id": r[0], "filename": r[1], "upload_path": r[2], "sha256": r[3]}
+
+def update_progress(scan_id, progress):
+    STATUS.update(scan_id, progress=int(progress))
+
+def complete_scan(scan_id, status, result, package_name=None):
+    """Enregistre le résultat final d'un job sans toucher à sa date de création."""
+    STATUS.finish(
+        scan_id, status=status, package_name=package_name,
+        result_json=encode_result(result), progress=100, upload_path=None,
+        **count_findings(manifest_findings(result))
+    )
+
+def requeue_stale_jobs():
+    """Remet en file les jobs interrompus par l'arrêt d'un worker."""
     with ENGINE.begin() as conn:
-        conn.execute(text("UPDATE scans SET status=:status WHERE id=:id"), {"status": status, "id": scan_id})
+        conn.execute(text("UPDATE scans SET status='queued', progress=0 WHERE status='running' AND upload_path IS NOT NULL"))
 
-def get_scan(scan_id):
+def get_scan(scan_id, sections=None, summary=False):
+    """Détail d'un scan. Seules les parties demandées du résultat sont décompressées :
+    summary=True renvoie le résumé stocké, sections=["flags", ...] ces seules clés
+    (KeyError si l'une d'elles est absente)."""
     with ENGINE.connect() as conn:
-        r = conn.execute(text("SELECT id, filename, package_name, status, created_at, result_json FROM scans WHERE id=:id"), {"id": scan_id}).fetchone()
+        r = conn.execute(text("SELECT id, filename, package_name, status, created_at, result_json, progress FROM scans WHERE id=:id"), {"id": scan_id}).fetchone()
         if not r:
             return None
-        import json
-        return {
+        scan = {
             "id": r[0],
             "filename": r[1],
             "package_name": r[2],
             "status": r[3],
             "created_at": r[4],
-            "result": json.loads(r[5]) if r[5] else None
+            "progress": 100 if r[3] in ("done", "failed") else (r[6] or 0)
         }
+    if summary:
+        scan["summary"] = decode_result(r[5], summary=True)
+    elif sections:
+        scan["result"] = {name: decode_result(r[5], section=name) for name in sections}
+    else:
+        scan["result"] = decode_result(r[5])
+    return scan
 
-def get_all_scans(limit=50):
-    with ENGINE.connect() as conn:
-        rows = conn.execute(
-            text("SELECT id, filename, package_name, status, created_at FROM scans ORDER BY created_at DESC LIMIT :limit"),
-            {"limit": limit}
-        ).fetchall()
-        
-        return [
-            {
-                "id": r[0],
-                "filename": r[1],
-                "package_name": r[2],
-                "status": r[3],
-                "created_at": r[4]
-            }
-            for r in rows
-        ]
-
+def get_all_scans(cursor=None, limit=PAGE_SIZE, status=None, package=None, since=None, until=None):
+    """Listing paginé (keyset) : retourne (scans, curseur de la page suivante ou None)."""
+    scans, next_cursor = keyset_page(
+        ENGINE, "scans", ["id", "filename", "package_name", "status", "created_at", *COUNT_COLUMNS],
+        filters={"status": status, "package_name": package},
+        since=since, until=until, cursor=cursor, limit=limit
+    )
+    return [unpack_counts(scan) for scan in scans], next_cursor
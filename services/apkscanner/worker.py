@@ -0,0 +1,36 @@
+import os, traceback
+from utils import (ENGINE, init_db, claim_next_job, complete_scan, update_progress,
+                   store_cached_result, requeue_stale_jobs)
+from manifest_analyzer import analyze_apk, ANALYZER_VERSION
+from jobqueue import WorkerPool, run_worker
+
+SCAN_WORKERS = int(os.environ.get("SCAN_WORKERS", 2))
+
+def process_job(job):
+    upload_path = job["upload_path"]
+    try:
+        update_progress(job["id"], 10)
+        result = analyze_apk(upload_path)
+        complete_scan(job["id"], "done", result, result.get("package"))
+        store_cached_result(job["sha256"], ANALYZER_VERSION, result)
+    except Exception as e:
+        print(f"Analysis failed for {job['id']}: {e}")
+        complete_scan(job["id"], "failed", {"error": str(e), "trace": traceback.format_exc()})
+    finally:
+        if upload_path and os.path.exists(upload_path):
+            try:
+                os.remove(upload_path)
+                print(f"Cleaned up file: {upload_path}")
+            except Exception as e:
+                print(f"Error deleting file {upload_path}: {e}")
+
+def _worker_main():
+    # Les connexions héritées du processus parent ne doivent pas être réutilisées
+    run_worker(claim_next_job, process_job, on_start=ENGINE.dispose)
+
+def start_pool(size=SCAN_WORKERS):
+    init_db()
+    requeue_stale_jobs()
+    # Appelé dans le master Gunicorn : aucune connexion ne doit être héritée par les forks
+    ENGINE.dispose()
+    return WorkerPool(size, _worker_main).start()
@@ -90,29 +90,16 @@ security_scan:
   image: curlimages/curl:latest
   script:
     - |
-      # Scan APK
+      # Scan orchestré : un seul upload, l'APK est parsé une fois pour tous les analyseurs
       SCAN_ID=$(curl -X POST -F "file=@app/build/outputs/apk/release/app-release.apk" \\
-        http://mobilesec-ms:8001/scan | jq -r '.job_id')
-      
-      # Scan secrets
-      SECRET_ID=$(curl -X POST -F "file=@app/build/outputs/apk/release/app-release.apk" \\
-        http://mobilesec-ms:8002/scan | jq -r '.job_id')
-      
-      # Scan crypto
-      CRYPTO_ID=$(curl -X POST -F "file=@app/build/outputs/apk/release/app-release.apk" \\
-        http://mobilesec-ms:8003/scan | jq -r '.job_id')
-      
-      # Wait for completion
-      sleep 60
+        http://mobilesec-ms:8008/scan | jq -r '.job_id')
       
       # Generate report
       curl -X POST http://mobilesec-ms:8005/generate \\
         -H "Content-Type: application/json" \\
         -d "{
           \\"job_ids\\": {
-            \\"apkscanner\\": \\"$SCAN_ID\\",
-            \\"secrethunter\\": \\"$SECRET_ID\\",
-            \\"cryptocheck\\": \\"$CRYPTO_ID\\"
+            \\"orchestrator\\": \\"$SCAN_ID\\"
           }
         }" > security-report.json
       
@@ -121,9 +108,7 @@ security_scan:
         -H "Content-Type: application/json" \\
         -d "{
           \\"job_ids\\": {
-            \\"apkscanner\\": \\"$SCAN_ID\\",
-            \\"secrethunter\\": \\"$SECRET_ID\\",
-            \\"cryptocheck\\": \\"$CRYPTO_ID\\"
+            \\"orchestrator\\": \\"$SCAN_ID\\"
           }
         }" > gl-sast-report.json
   artifacts:
@@ -222,11 +207,12 @@ def integration_guide():
             "cryptocheck": "http://localhost:8003",
             "networkinspector": "http://localhost:8004",
             "reportgen": "http://localhost:8005",
-            "fixsuggest": "http://localhost:8006"
+            "fixsuggest": "http://localhost:8006",
+            "orchestrator": "http://localhost:8008"
         },
         "workflow": [
             "1. Build votre APK dans votre pipeline",
-            "2. POST /scan sur chaque service d'analyse",
+            "2. POST /scan sur l'orchestrateur (ou sur chaque service d'analyse)",
             "3. Attendre la complétion (polling ou webhook)",
             "4. POST /generate sur ReportGen avec tous les job_ids",
             "5. Optionnel: POST /suggest sur FixSuggest",
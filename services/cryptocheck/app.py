@@ -1,156 +1,23 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response
 from flask_cors import CORS
-import os, uuid, re, traceback
-from androguard.core.apk import APK
-from androguard.core.dex import DEX
-from androguard.core.analysis.analysis import Analysis
-from utils import init_db, save_scan, get_scan_result, get_all_scans
+import os, json, uuid, hmac, traceback
+from utils import (init_db, save_scan, get_scan_result, get_all_scans,
+                   save_upload, get_cached_result, enqueue_scan, read_package_name, PAGE_SIZE,
+                   get_findings_blob, findings_page, iter_findings, decode_result)
+from crypto_analyzer import CRYPTO_PACK, analyzer_version, current_pack
+from rulepack import PackError
+from ruleprofile import get_profiler
 
 app = Flask(__name__)
-CORS(app)  # Enable CORS for all routes
+CORS(app, expose_headers=["X-Next-Cursor"])  # Enable CORS for all routes
 PORT = int(os.environ.get("PORT", 8003))
 STORAGE_DIR = "/app/uploads"
+# Jeton des routes /admin ; vide : routes désactivées
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN", "")
 os.makedirs(STORAGE_DIR, exist_ok=True)
 
 init_db()
 
-# Patterns de vulnérabilités cryptographiques
-CRYPTO_PATTERNS = {
-    "ECB_MODE": {
-        "pattern": r"AES/ECB",
-        "severity": "HIGH",
-        "cwe": "CWE-327",
-        "description": "Mode ECB détecté - non sécurisé, utiliser CBC/GCM",
-        "recommendation": "Utiliser AES/CBC/PKCS5Padding ou AES/GCM/NoPadding"
-    },
-    "WEAK_HASH_MD5": {
-        "pattern": r"MessageDigest\.getInstance\(['\"]MD5['\"]\)",
-        "severity": "HIGH",
-        "cwe": "CWE-328",
-        "description": "Algorithme MD5 détecté - cryptographiquement cassé",
-        "recommendation": "Utiliser SHA-256 ou SHA-3"
-    },
-    "WEAK_HASH_SHA1": {
-        "pattern": r"MessageDigest\.getInstance\(['\"]SHA-1['\"]\)",
-        "severity": "MEDIUM",
-        "cwe": "CWE-328",
-        "description": "Algorithme SHA-1 détecté - faible",
-        "recommendation": "Utiliser SHA-256 ou supérieur"
-    },
-    "WEAK_RANDOM": {
-        "pattern": r"java\.util\.Random",
-        "severity": "MEDIUM",
-        "cwe": "CWE-338",
-        "description": "java.util.Random utilisé - non cryptographiquement sécurisé",
-        "recommendation": "Utiliser java.security.SecureRandom"
-    },
-    "DES_ALGORITHM": {
-        "pattern": r"DES/",
-        "severity": "HIGH",
-        "cwe": "CWE-327",
-        "description": "Algorithme DES détecté - obsolète et faible",
-        "recommendation": "Utiliser AES-256"
-    },
-    "NO_PADDING": {
-        "pattern": r"AES/.*/NoPadding",
-        "severity": "LOW",
-        "cwe": "CWE-326",
-        "description": "NoPadding détecté - peut exposer des informations",
-        "recommendation": "Vérifier que le padding est géré manuellement correctement"
-    },
-    "HARDCODED_KEY": {
-        "pattern": r"(SecretKeySpec|IvParameterSpec)\s*\(\s*[\"'][\w+/=]{16,}[\"']",
-        "severity": "CRITICAL",
-        "cwe": "CWE-321",
-        "description": "Clé cryptographique codée en dur détectée",
-        "recommendation": "Utiliser Android Keystore pour stocker les clés"
-    },
-    "SSL_VALIDATION_DISABLED": {
-        "pattern": r"TrustAllCerts|X509TrustManager.*checkServerTrusted.*\{\s*\}",
-        "severity": "CRITICAL",
-        "cwe": "CWE-295",
-        "description": "Validation SSL/TLS désactivée",
-        "recommendation": "Toujours valider les certificats SSL"
-    }
-}
-
-def analyze_crypto_issues(filepath):
-    """Analyse les problèmes cryptographiques dans l'APK"""
-    findings = []
-    
-    try:
-        apk = APK(filepath)
-        
-        # Analyser tous les fichiers DEX
-        for dex_bytes in apk.get_all_dex():
-            try:
-                d = DEX(dex_bytes)
-                dx = Analysis()
-                dx.add(d)
-                dx.create_xref()
-                
-                # Analyser toutes les méthodes
-                for method in d.get_methods():
-                    if method.get_code():
-                        try:
-                            # Récupérer le code source
-                            method_name = f"{method.get_class_name()}.{method.get_name()}"
-                            
-                            # Convertir en texte pour l'analyse
-                            code_text = method.get_source() if hasattr(method, 'get_source') else ""
-                            
-                            # Vérifier chaque pattern
-                            for vuln_name, vuln_data in CRYPTO_PATTERNS.items():
-                                if re.search(vuln_data["pattern"], code_text, re.IGNORECASE):
-                                    findings.append({
-                                        "type": vuln_name,
-                                        "severity": vuln_data["severity"],
-                                        "cwe": vuln_data["cwe"],
-                                        "description": vuln_data["description"],
-                                        "recommendation": vuln_data["recommendation"],
-                                        "location": method_name,
-                                        "class": method.get_class_name()
-                                    })
-                        except Exception as e:
-                            continue
-                
-                # Analyser aussi les strings pour détecter les patterns
-                for string_value in d.get_strings():
-                    for vuln_name, vuln_data in CRYPTO_PATTERNS.items():
-                        if re.search(vuln_data["pattern"], string_value, re.IGNORECASE):
-                            findings.append({
-                                "type": vuln_name,
-                                "severity": vuln_data["severity"],
-                                "cwe": vuln_data["cwe"],
-                                "description": vuln_data["description"],
-                                "recommendation": vuln_data["recommendation"],
-                                "location": "string_constant",
-                                "value": string_value[:100]  # Limiter la taille
-                            })
-            except Exception as e:
-                print(f"Error processing DEX: {e}")
-                continue
-        
-        # Dédupliquer les résultats
-        unique_findings = []
-        seen = set()
-        for f in findings:
-            key = f"{f['type']}:{f.get('location', '')}"
-            if key not in seen:
-                unique_findings.append(f)
-                seen.add(key)
-        
-        # Trier par sévérité
-        severity_order = {"CRITICAL": 0, "HIGH": 1, "MEDIUM": 2, "LOW": 3}
-        unique_findings.sort(key=lambda x: severity_order.get(x["severity"], 4))
-        
-        return unique_findings
-        
-    except Exception as e:
-        print(f"Error analyzing crypto: {e}")
-        traceback.print_exc()
-        return []
-
 @app.route("/health")
 def health():
     return jsonify({"status": "ok", "service": "cryptocheck"})
@@ -158,52 +25,164 @@ def health():
 @app.route("/scan", methods=["POST"])
 def scan():
     save_path = None
+    queued = False
     try:
         if 'file' not in request.files:
             return jsonify({"error": "no file provided"}), 400
         
         f = request.files['file']
         filename = f.filename or f"{uuid.uuid4().hex}.apk"
-        save_path = os.path.join(STORAGE_DIR, filename)
-        f.save(save_path)
-
         job_id = "crypto-" + uuid.uuid4().hex
-        save_scan(job_id, filename, "running", [])
+        save_path = os.path.join(STORAGE_DIR, f"{job_id}.apk")
+        sha256 = save_upload(f, save_path)
+        package_name = read_package_name(save_path)
+
+        # APK identique déjà analysé avec les mêmes patterns : pas de nouvelle analyse
+        pack = current_pack()
+        issues = get_cached_result(sha256, analyzer_version(pack))
+        if issues is not None:
+            save_scan(job_id, filename, "done", issues, package_name, pack_version=pack.id)
+            return jsonify({
+                "job_id": job_id, 
+                "status": "done", 
+                "issues_count": len(issues),
+                "critical_count": sum(1 for x in issues if x["severity"] == "CRITICAL"),
+                "high_count": sum(1 for x in issues if x["severity"] == "HIGH"),
+                "cache_hit": True,
+                "sha256": sha256
+            }), 200
 
-        # Analyse
-        issues = analyze_crypto_issues(save_path)
-        save_scan(job_id, filename, "done", issues)
+        # Analyse asynchrone : le pool de workers (worker.py) traite la file
+        enqueue_scan(job_id, filename, save_path, sha256, package_name)
+        queued = True
 
-        return jsonify({
-            "job_id": job_id, 
-            "status": "done", 
-            "issues_count": len(issues),
-            "critical_count": sum(1 for x in issues if x["severity"] == "CRITICAL"),
-            "high_count": sum(1 for x in issues if x["severity"] == "HIGH")
-        }), 200
+        return jsonify({"job_id": job_id, "status": "queued", "cache_hit": False, "sha256": sha256}), 202
 
     except Exception as e:
         print(f"Error: {e}")
         traceback.print_exc()
         return jsonify({"error": str(e)}), 500
     finally:
-        if save_path and os.path.exists(save_path):
+        # Un job en file garde son fichier : le worker le supprime après analyse
+        if not queued and save_path and os.path.exists(save_path):
             os.remove(save_path)
 
 @app.route("/scan/<job_id>", methods=["GET"])
 def get_result(job_id):
-    res = get_scan_result(job_id)
+    """?view=summary : résumé stocké (nombre de findings) sans décoder les findings."""
+    res = get_scan_result(job_id, summary=request.args.get("view") == "summary")
     if not res:
         return jsonify({"error": "not found"}), 404
     return jsonify(res)
 
+@app.route("/scan/<job_id>/findings", methods=["GET"])
+def list_findings(job_id):
+    """Findings paginés : ?limit=&offset=&cursor=&type=&severity= (type et severity répétables) ;
+    le curseur de la page suivante est aussi renvoyé dans l'en-tête X-Next-Cursor.
+    ?format=ndjson : tous les findings filtrés en flux, un objet JSON par ligne,
+    décodés tranche par tranche (mémoire constante quelle que soit la taille du résultat)."""
+    scan = get_findings_blob(job_id)
+    if not scan:
+        return jsonify({"error": "not found"}), 404
+    types = request.args.getlist("type")
+    severities = request.args.getlist("severity")
+
+    if request.args.get("format") == "ndjson":
+        lines = (json.dumps(f, ensure_ascii=False) + "\n" for f in iter_findings(scan["raw"], types, severities))
+        return Response(lines, mimetype="application/x-ndjson")
+
+    try:
+        findings, next_cursor = findings_page(
+            scan["raw"],
+            offset=request.args.get("offset", 0),
+            cursor=request.args.get("cursor"),
+            limit=request.args.get("limit", PAGE_SIZE),
+            types=types, severities=severities
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    response = jsonify({
+        "id": job_id,
+        "status": scan["status"],
+        "total": (decode_result(scan["raw"], summary=True) or {}).get("count", 0),
+        "findings": findings,
+        "next_cursor": next_cursor
+    })
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return response
+
 @app.route("/scans", methods=["GET"])
 def list_scans():
+    """Listing paginé : ?limit=&cursor=&status=&package=&since=&until= ;
+    le curseur de la page suivante est renvoyé dans l'en-tête X-Next-Cursor."""
     try:
-        scans = get_all_scans()
-        return jsonify(scans)
+        scans, next_cursor = get_all_scans(
+            cursor=request.args.get("cursor"),
+            limit=request.args.get("limit", PAGE_SIZE),
+            status=request.args.get("status"),
+            package=request.args.get("package"),
+            since=request.args.get("since"),
+            until=request.args.get("until")
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
+    response = jsonify(scans)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return response
+
+@app.route("/profile/rules", methods=["GET", "DELETE"])
+def rule_profile():
+    """Coût de chaque pattern du pack actif (RULE_PROFILING=1) : évaluations, temps cumulé,
+    taux de match, pire cas. DELETE : remise à zéro (jeton d'administration requis)."""
+    pack = current_pack()
+    profiler = get_profiler(pack.digest)
+    if profiler is None:
+        return jsonify({"enabled": False})
+    if request.method == "DELETE":
+        if not _admin_authorized():
+            return jsonify({"error": "forbidden"}), 403
+        profiler.reset()
+    return jsonify({"enabled": True, "pack_version": pack.id, "rules": profiler.stats()})
+
+def _admin_authorized():
+    """Jeton attendu dans X-Admin-Token ou Authorization: Bearer <jeton>."""
+    if not ADMIN_TOKEN:
+        return False
+    supplied = request.headers.get("X-Admin-Token") or request.headers.get("Authorization", "").removeprefix("Bearer ").strip()
+    return hmac.compare_digest(supplied.encode("utf-8"), ADMIN_TOKEN.encode("utf-8"))
+
+def _pack_response(pack):
+    return jsonify({**pack.info(), "published": CRYPTO_PACK.is_published()})
+
+@app.route("/admin/packs", methods=["GET", "PUT", "DELETE"])
+def admin_packs():
+    """Pack de règles actif. PUT : publie le pack JSON du corps (validé, appliqué à tous
+    les processus sans redémarrage ; les scans en cours gardent leur pack).
+    DELETE : retour au pack embarqué dans l'image."""
+    if not _admin_authorized():
+        return jsonify({"error": "forbidden"}), 403
+    if request.method == "PUT":
+        try:
+            return _pack_response(CRYPTO_PACK.publish(request.get_data()))
+        except PackError as e:
+            return jsonify({"error": str(e)}), 400
+    if request.method == "DELETE":
+        return _pack_response(CRYPTO_PACK.reset())
+    return _pack_response(current_pack())
+
+@app.route("/admin/packs/reload", methods=["POST"])
+def admin_reload_pack():
+    """Relit immédiatement le pack publié (fichier remplacé directement dans PACK_DIR)."""
+    if not _admin_authorized():
+        return jsonify({"error": "forbidden"}), 403
+    return _pack_response(CRYPTO_PACK.reload())
 
 if __name__ == "__main__":
+    # En développement, le pool de workers tourne à côté du serveur Flask
+    from worker import start_pool
+    start_pool()
     app.run(host="0.0.0.0", port=PORT)
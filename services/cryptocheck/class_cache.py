@@ -0,0 +1,56 @@
+import os, json, datetime
+from sqlalchemy import text
+from storage import create_sqlite_engine
+
+# Cache persistant des verdicts par classe, partagé entre APK : les bibliothèques
+# embarquées (OkHttp, Gson, Firebase...) ne sont analysées qu'une seule fois.
+# Clé : empreinte du bytecode normalisé de la classe + version des règles.
+CLASS_CACHE_PATH = os.environ.get("CLASS_CACHE_PATH", os.environ.get("DB_PATH", "/app/storage.db"))
+QUERY_CHUNK_SIZE = 500
+
+_engine = None
+_engine_pid = None
+
+def _get_engine():
+    # Un moteur par processus : les connexions SQLite ne survivent pas à un fork
+    global _engine, _engine_pid
+    if _engine is None or _engine_pid != os.getpid():
+        _engine = create_sqlite_engine(CLASS_CACHE_PATH)
+        _engine_pid = os.getpid()
+        with _engine.begin() as conn:
+            conn.execute(text("""
+                CREATE TABLE IF NOT EXISTS class_verdicts (
+                    class_hash TEXT,
+                    version TEXT,
+                    created_at TEXT,
+                    findings_json TEXT,
+                    PRIMARY KEY (class_hash, version)
+                )
+            """))
+    return _engine
+
+def get_verdicts(class_hashes, version):
+    """Findings en cache pour ces empreintes : {class_hash: [findings]}."""
+    class_hashes = list(class_hashes)
+    verdicts = {}
+    with _get_engine().connect() as conn:
+        for i in range(0, len(class_hashes), QUERY_CHUNK_SIZE):
+            chunk = class_hashes[i:i + QUERY_CHUNK_SIZE]
+            params = {f"h{j}": h for j, h in enumerate(chunk)}
+            rows = conn.execute(
+                text(f"SELECT class_hash, findings_json FROM class_verdicts WHERE version=:version AND class_hash IN ({','.join(':' + k for k in params)})"),
+                {"version": version, **params}
+            ).fetchall()
+            verdicts.update((r[0], json.loads(r[1])) for r in rows)
+    return verdicts
+
+def store_verdicts(verdicts, version):
+    """Enregistre {class_hash: [findings]} ; les classes sans finding sont aussi mémorisées."""
+    if not verdicts:
+        return
+    created_at = datetime.datetime.utcnow().isoformat()
+    with _get_engine().begin() as conn:
+        conn.execute(
+            text("INSERT OR IGNORE INTO class_verdicts (class_hash, version, created_at, findings_json) VALUES (:hash,:version,:created_at,:findings)"),
+            [{"hash": h, "version": version, "created_at": created_at, "findings": json.dumps(f)} for h, f in verdicts.items()]
+        )
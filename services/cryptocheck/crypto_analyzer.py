@@ -0,0 +1,374 @@
+import os, sys, traceback, hashlib, zipfile
+from array import array
+from androguard.core.dex import DEX
+from androguard.core.dex.dex_types import Operand
+from rulepack import PackSource, PackError, get_pack
+from dexpool import list_dex_entries, map_dex
+from class_cache import get_verdicts, store_verdicts
+from ruleprofile import get_profiler
+
+# Patterns de vulnérabilités cryptographiques : pack de règles "crypto" (cf. rulepack.py),
+# embarqué dans packs/crypto.json et remplaçable à chaud via /admin/packs.
+# "literals" : au moins un doit apparaître (sans casse) pour que le pattern puisse matcher
+CRYPTO_PACK = PackSource("crypto", os.path.join(os.path.dirname(os.path.abspath(__file__)), "packs", "crypto.json"))
+
+def current_pack():
+    """Pack actif ; un scan le récupère une fois au début et le garde jusqu'à la fin."""
+    return CRYPTO_PACK.current()
+
+def pack_for(digest):
+    """Pack d'empreinte donnée (tâche du pool), ou PackError s'il est introuvable."""
+    try:
+        return get_pack(digest)
+    except PackError:
+        # Cache disque des packs indisponible : le pack actif convient s'il est le même
+        pack = current_pack()
+        if pack.digest != digest:
+            raise
+        return pack
+
+def analyzer_version(pack):
+    """Clé de version des caches (résultats, classes) : change avec le code d'analyse ou le pack."""
+    return f"cryptocheck-3:{pack.digest[:16]}"
+
+def analyze_crypto_issues(filepath, progress=None, pack=None):
+    """Analyse les problèmes cryptographiques dans l'APK.
+
+    Chaque classes*.dex est parsé et analysé dans un processus du pool (cf. dexpool.py) ;
+    progress(done, total) est appelé après chaque DEX, si fourni.
+    pack : pack de règles (par défaut, le pack actif) ; les tâches du pool reçoivent son
+    empreinte, tout le scan utilise donc le même même si un autre est publié entre-temps.
+    """
+    pack = pack or current_pack()
+    try:
+        entries = list_dex_entries(filepath)
+        findings = []
+        for dex_findings in map_dex(_analyze_dex_entry, [(filepath, entry, pack.digest) for entry in entries], progress):
+            findings.extend(dex_findings)
+        return _finalize(findings)
+
+    except Exception as e:
+        print(f"Error analyzing crypto: {e}")
+        traceback.print_exc()
+        return []
+
+def analyze_dex_list(dex_list, progress=None, pack=None):
+    """Analyse des DEX déjà parsés (partagés avec l'orchestrateur).
+
+    progress(done, total) est appelé après chaque DEX, si fourni.
+    """
+    pack = pack or current_pack()
+    findings = []
+    for i, d in enumerate(dex_list):
+        findings.extend(_analyze_dex(d, pack))
+        if progress:
+            progress(i + 1, len(dex_list))
+    return _finalize(findings)
+
+def _analyze_dex_entry(filepath, entry, pack_digest):
+    """Parse et analyse une entrée classes*.dex avec le pack d'empreinte donnée ;
+    exécuté dans un processus du pool."""
+    try:
+        pack = pack_for(pack_digest)
+        with zipfile.ZipFile(filepath) as zf:
+            d = DEX(zf.read(entry))
+    except Exception as e:
+        print(f"Error processing DEX {entry}: {e}")
+        return []
+    return _analyze_dex(d, pack)
+
+# Appels d'API crypto repérés dans le bytecode de chaque classe (côté appelant).
+# préfixe de la référence de méthode -> (index du registre de l'argument constant, gabarit de l'extrait)
+# L'extrait reconstruit est soumis aux mêmes patterns que les chaînes du DEX.
+CRYPTO_CALLS = {
+    "Ljavax/crypto/Cipher;->getInstance(": (0, 'Cipher.getInstance("{}")'),
+    "Ljava/security/MessageDigest;->getInstance(": (0, 'MessageDigest.getInstance("{}")'),
+    # <init> : le registre 0 est "this", la clé / l'IV est en registre 1
+    "Ljavax/crypto/spec/SecretKeySpec;-><init>(": (1, 'SecretKeySpec("{}"'),
+    "Ljavax/crypto/spec/IvParameterSpec;-><init>(": (1, 'IvParameterSpec("{}"'),
+    "Ljava/util/Random;-><init>(": (None, "java.util.Random"),
+}
+TRUST_MANAGERS = {"Ljavax/net/ssl/X509TrustManager;", "Ljavax/net/ssl/X509ExtendedTrustManager;"}
+TRUST_ALL_SNIPPET = "X509TrustManager.checkServerTrusted() {}"
+
+# Appels qui transforment une constante sans en changer la nature ("...".getBytes(), Base64.decode("...", 0))
+PASSTHROUGH_CALLS = (
+    "Ljava/lang/String;->getBytes(",
+    "Landroid/util/Base64;->decode(",
+    "Ljava/util/Base64$Decoder;->decode(",
+    "Ljava/lang/String;->toCharArray(",
+)
+
+# Instructions dont le premier registre est lu et non écrit
+NON_WRITING_PREFIXES = (
+    "invoke", "if-", "iput", "sput", "aput", "return", "throw", "monitor",
+    "fill-array-data", "packed-switch", "sparse-switch", "filled-new-array", "check-cast", "goto", "nop",
+)
+
+def _registers(ins):
+    return [op[1] for op in ins.get_operands() if op[0] == Operand.REGISTER]
+
+def _method_ref(ins):
+    return ins.get_operands()[-1][-1]
+
+def _resolve_const_string(instructions, index, register, depth=0):
+    """Remonte le bytecode depuis instructions[index] pour retrouver la chaîne constante
+    chargée dans register. Analyse linéaire : None si la valeur n'est pas une constante."""
+    for i in range(index - 1, -1, -1):
+        ins = instructions[i]
+        name = ins.get_name()
+        regs = _registers(ins)
+        if not regs or regs[0] != register or name.startswith(NON_WRITING_PREFIXES):
+            continue
+        if name.startswith("const-string"):
+            return ins.get_operands()[-1][-1]
+        if name == "move-result-object" and i > 0 and depth < 3:
+            call = instructions[i - 1]
+            if call.get_name().startswith("invoke") and _method_ref(call).startswith(PASSTHROUGH_CALLS):
+                return _resolve_const_string(instructions, i - 1, _registers(call)[0], depth + 1)
+        return None
+    return None
+
+def _snippet(instructions, index, call):
+    """Extrait de code reconstruit pour l'appel instructions[index], ou None."""
+    arg, template = call
+    if arg is None:
+        return template
+    regs = _registers(instructions[index])
+    value = _resolve_const_string(instructions, index, regs[arg]) if arg < len(regs) else None
+    return template.format(value) if value is not None else None
+
+# Format des instructions Dalvik, pour parcourir le bytecode brut sans le désassembler :
+# longueur en unités de 16 bits de chaque opcode (1 pour les opcodes inutilisés)...
+INSN_LENGTHS = [1] * 256
+for _ops, _length in (
+    ((0x02, 0x05, 0x08, 0x13, 0x15, 0x16, 0x19, 0x1a, 0x1c, 0x1f, 0x20, 0x22, 0x23, 0x29,
+      0xfe, 0xff), 2),
+    ((0x03, 0x06, 0x09, 0x14, 0x17, 0x1b, 0x24, 0x25, 0x26, 0x2a, 0x2b, 0x2c, 0xfc, 0xfd), 3),
+    (range(0x2d, 0x3e), 2), (range(0x44, 0x6e), 2), (range(0x6e, 0x73), 3), (range(0x74, 0x79), 3),
+    (range(0x90, 0xb0), 2), (range(0xd0, 0xe3), 2),
+    ((0x18,), 5), ((0xfa, 0xfb), 4),
+):
+    for _op in _ops:
+        INSN_LENGTHS[_op] = _length
+# ... et nature de l'index porté par l'unité 1 (formats 21c, 22c, 31c, 35c, 3rc, 45cc, 4rcc),
+# encodée dans les bits de poids fort de la clé des références résolues
+REF_STRING, REF_TYPE, REF_FIELD, REF_METHOD, REF_PROTO = (kind << 32 for kind in range(1, 6))
+INSN_INDEX_KINDS = [0] * 256
+for _ops, _kind in (
+    ((0x1a, 0x1b), REF_STRING),
+    ((0x1c, 0x1f, 0x20, 0x22, 0x23, 0x24, 0x25), REF_TYPE),
+    (range(0x52, 0x6e), REF_FIELD),
+    ((*range(0x6e, 0x73), *range(0x74, 0x79), 0xfa, 0xfb), REF_METHOD),
+    ((0xff,), REF_PROTO),
+):
+    for _op in _ops:
+        INSN_INDEX_KINDS[_op] = _kind
+CONST_STRING, CONST_STRING_JUMBO = 0x1a, 0x1b
+# Pseudo-instructions de données (opcode nop) : packed-switch, sparse-switch, fill-array-data
+PACKED_SWITCH_PAYLOAD, SPARSE_SWITCH_PAYLOAD, FILL_ARRAY_DATA_PAYLOAD = 0x0100, 0x0200, 0x0300
+# checkServerTrusted() { return; }
+RETURN_VOID_ONLY = b"\x0e\x00"
+
+class _DexRefs:
+    """Références d'un DEX (chaînes, types, champs, méthodes) résolues à la demande et
+    mémorisées : les index sont propres au DEX, pas les noms."""
+
+    def __init__(self, d):
+        self.cm = d.CM
+        # clé (nature | index) -> référence résolue
+        self.resolved = {}
+        # clés des méthodes de CRYPTO_CALLS
+        self.crypto_calls = set()
+
+    def resolve(self, key):
+        kind, idx = key & ~0xffffffff, key & 0xffffffff
+        cm = self.cm
+        if kind == REF_STRING:
+            ref = cm.get_string(idx)
+        elif kind == REF_TYPE:
+            ref = cm.get_type(idx)
+        elif kind == REF_FIELD:
+            cls, ftype, name = cm.get_field(idx)
+            ref = f"{cls}->{name}:{ftype}"
+        elif kind == REF_METHOD:
+            cls, name, proto = cm.get_method(idx)
+            ref = f"{cls}->{name}{''.join(proto)}"
+            if ref[:ref.find("(") + 1] in CRYPTO_CALLS:
+                self.crypto_calls.add(key)
+        else:
+            ref = "".join(cm.get_proto(idx))
+        self.resolved[key] = ref
+        return ref
+
+def _walk_code(insns, refs, references):
+    """Parcourt le bytecode brut d'une méthode : ajoute ses références résolues (dans
+    l'ordre) à references et retourne (bytecode dont les index sont masqués, appelle
+    une API crypto)."""
+    units = array("H", insns)
+    if sys.byteorder != "little":
+        units.byteswap()
+    masked = bytearray(insns)
+    resolved, crypto_calls = refs.resolved, refs.crypto_calls
+    crypto = False
+    pos, size = 0, len(units)
+    while pos < size:
+        unit = units[pos]
+        op = unit & 0xff
+        if op == 0 and unit:
+            if unit == PACKED_SWITCH_PAYLOAD:
+                pos += units[pos + 1] * 2 + 4
+            elif unit == SPARSE_SWITCH_PAYLOAD:
+                pos += units[pos + 1] * 4 + 2
+            elif unit == FILL_ARRAY_DATA_PAYLOAD:
+                pos += (units[pos + 1] * (units[pos + 2] | units[pos + 3] << 16) + 1) // 2 + 4
+            else:
+                pos += 1
+            continue
+        kind = INSN_INDEX_KINDS[op]
+        if kind and pos + 1 < size:
+            key = kind | units[pos + 1]
+            if op == CONST_STRING_JUMBO:
+                # Même chaîne, même empreinte : const-string/jumbo est ramené à const-string
+                key |= units[pos + 2] << 16
+                masked[2 * pos] = CONST_STRING
+                masked[2 * pos + 4:2 * pos + 6] = b"\0\0"
+            masked[2 * pos + 2:2 * pos + 4] = b"\0\0"
+            ref = resolved.get(key)
+            references.append(ref if ref is not None else refs.resolve(key))
+            if key in crypto_calls:
+                crypto = True
+        pos += INSN_LENGTHS[op]
+    return bytes(masked), crypto
+
+def _scan_class(cls, refs):
+    """Empreinte d'une classe et méthodes à examiner si elle n'est pas en cache.
+
+    L'empreinte porte sur le bytecode brut (aucun désassemblage) dont les index propres
+    au DEX sont remplacés par les références résolues : une même classe a la même
+    empreinte d'un APK à l'autre. Retourne (empreinte, [(méthode, appelle une API crypto,
+    checkServerTrusted vide)]) ; seules les méthodes signalées sont utiles en cas d'échec.
+    """
+    interfaces = cls.get_interfaces() or []
+    digest = hashlib.sha256(f"{cls.get_name()}|{cls.get_superclassname()}|{','.join(interfaces)}".encode("utf-8"))
+    trust_manager = bool(TRUST_MANAGERS & set(interfaces)) or cls.get_superclassname() in TRUST_MANAGERS
+    candidates = []
+    for method in cls.get_methods():
+        digest.update(f"\n{method.get_name()}{method.get_descriptor()}\n".encode("utf-8"))
+        code = method.get_code()
+        if code is None:
+            continue
+        insns = code.get_bc().get_insn()
+        references = []
+        masked, crypto = _walk_code(insns, refs, references)
+        digest.update(masked)
+        digest.update("\n".join(references).encode("utf-8"))
+        trust_all = trust_manager and method.get_name() == "checkServerTrusted" and insns == RETURN_VOID_ONLY
+        if crypto or trust_all:
+            candidates.append((method, crypto, trust_all))
+    return digest.hexdigest(), candidates
+
+def _class_snippets(candidates):
+    """Extraits de code des appels d'API crypto : seules les méthodes appelantes sont
+    désassemblées. [(méthode, extrait)]"""
+    snippets = []
+    for method, crypto, trust_all in candidates:
+        if crypto:
+            instructions = list(method.get_instructions())
+            for index, ins in enumerate(instructions):
+                if not ins.get_name().startswith("invoke"):
+                    continue
+                ref = _method_ref(ins)
+                call = CRYPTO_CALLS.get(ref[:ref.find("(") + 1])
+                if call is not None:
+                    snippet = _snippet(instructions, index, call)
+                    if snippet is not None:
+                        snippets.append((method, snippet))
+        if trust_all:
+            snippets.append((method, TRUST_ALL_SNIPPET))
+    return snippets
+
+def _snippet_findings(snippets, pack, profiler=None):
+    findings = []
+    for method, snippet in snippets:
+        class_name = method.get_class_name()
+        for rule in pack.matcher.search(snippet, profiler):
+            vuln_data = rule.data
+            findings.append({
+                "type": rule.name,
+                "severity": vuln_data["severity"],
+                "cwe": vuln_data.get("cwe"),
+                "description": vuln_data.get("description"),
+                "recommendation": vuln_data.get("recommendation"),
+                "location": f"{class_name}.{method.get_name()}",
+                "class": class_name,
+                "value": snippet[:100]
+            })
+    return findings
+
+def _analyze_dex(d, pack):
+    """Findings bruts (non dédupliqués) d'un DEX parsé."""
+    findings = []
+    version = analyzer_version(pack)
+    # Coût de chaque pattern, si RULE_PROFILING=1 (cf. ruleprofile.py)
+    profiler = get_profiler(pack.digest)
+    try:
+        refs = _DexRefs(d)
+        classes = [_scan_class(cls, refs) for cls in d.get_classes()]
+
+        # Les classes déjà analysées (ici ou dans un autre APK) réutilisent leur verdict
+        try:
+            cached = get_verdicts({digest for digest, _ in classes}, version)
+        except Exception as e:
+            print(f"Class cache unavailable: {e}")
+            cached = {}
+        new_verdicts = {}
+        for digest, candidates in classes:
+            if digest in cached:
+                findings.extend(cached[digest])
+            else:
+                new_verdicts[digest] = _snippet_findings(_class_snippets(candidates), pack, profiler)
+                findings.extend(new_verdicts[digest])
+        try:
+            store_verdicts(new_verdicts, version)
+        except Exception as e:
+            print(f"Class cache unavailable: {e}")
+        
+        # Analyser aussi les strings pour détecter les patterns
+        for string_value in d.get_strings():
+            for rule in pack.matcher.search(string_value, profiler):
+                vuln_data = rule.data
+                findings.append({
+                    "type": rule.name,
+                    "severity": vuln_data["severity"],
+                    "cwe": vuln_data.get("cwe"),
+                    "description": vuln_data.get("description"),
+                    "recommendation": vuln_data.get("recommendation"),
+                    "location": "string_constant",
+                    "value": string_value[:100]  # Limiter la taille
+                })
+    except Exception as e:
+        print(f"Error processing DEX: {e}")
+    if profiler is not None:
+        try:
+            profiler.flush()
+        except Exception as e:
+            print(f"Rule profile unavailable: {e}")
+    return findings
+
+def _finalize(findings):
+    """Fusionne les findings de tous les DEX : déduplication puis tri par sévérité."""
+    # Dédupliquer les résultats
+    unique_findings = []
+    seen = set()
+    for f in findings:
+        key = f"{f['type']}:{f.get('location', '')}"
+        if key not in seen:
+            unique_findings.append(f)
+            seen.add(key)
+    
+    # Trier par sévérité
+    severity_order = {"CRITICAL": 0, "HIGH": 1, "MEDIUM": 2, "LOW": 3}
+    unique_findings.sort(key=lambda x: severity_order.get(x["severity"], 4))
+    
+    return unique_findings
@@ -0,0 +1,247 @@
+import os, re, json, time, hashlib, tempfile, threading
+from matcher import Matcher, Rule
+
+# Packs de règles partagés par secrethunter et cryptocheck : les signatures sont des
+# fichiers JSON versionnés, et non du code. Format :
+#   {"name": "secrets", "version": "2024.1", "ignore_case": false,
+#    "rules": [{"name": ..., "pattern": ..., "literals": [...], "severity": ..., ...}]}
+# Les champs supplémentaires d'une règle (cwe, description...) sont conservés tels quels.
+#
+# Un pack est identifié par l'empreinte SHA-256 de son fichier. Sa forme validée et
+# normalisée est mise en cache sur disque (PACK_DIR/compiled/<empreinte>.json) : au
+# démarrage, aucune validation n'est refaite, et un processus du pool peut charger
+# exactement le pack avec lequel un scan a commencé, même si un autre a été publié depuis.
+#
+# Pack actif : PACK_DIR/<nom>.json s'il a été publié (cf. PackSource.publish), sinon le
+# fichier embarqué dans l'image. Chaque processus vérifie le fichier publié au plus toutes
+# les PACK_CHECK_INTERVAL secondes : un nouveau pack est pris en compte sans redémarrage,
+# et un scan en cours garde le pack avec lequel il a commencé.
+PACK_DIR = os.environ.get("PACK_DIR", "/app/storage/packs")
+PACK_CHECK_INTERVAL = float(os.environ.get("PACK_CHECK_INTERVAL", 2.0))
+SEVERITIES = ("CRITICAL", "HIGH", "MEDIUM", "LOW")
+
+class PackError(ValueError):
+    """Pack invalide (JSON, champ manquant, regex incorrecte...)."""
+
+def parse_pack(raw):
+    """Valide un pack (octets JSON) et retourne sa forme normalisée ; PackError sinon."""
+    try:
+        data = json.loads(raw)
+    except ValueError as e:
+        raise PackError(f"invalid JSON: {e}")
+    if not isinstance(data, dict):
+        raise PackError("a pack must be a JSON object")
+    for field in ("name", "version"):
+        if not isinstance(data.get(field), str) or not data[field]:
+            raise PackError(f"missing or invalid '{field}'")
+    rules = data.get("rules")
+    if not isinstance(rules, list) or not rules:
+        raise PackError("'rules' must be a non-empty list")
+
+    ignore_case = bool(data.get("ignore_case", False))
+    names = set()
+    normalized = []
+    for i, rule in enumerate(rules):
+        if not isinstance(rule, dict) or not isinstance(rule.get("name"), str) or not rule["name"]:
+            raise PackError(f"rule {i}: missing or invalid 'name'")
+        name = rule["name"]
+        if name in names:
+            raise PackError(f"rule {name}: duplicate name")
+        names.add(name)
+        if not isinstance(rule.get("pattern"), str):
+            raise PackError(f"rule {name}: missing 'pattern'")
+        literals = rule.get("literals", [])
+        if not isinstance(literals, list) or not all(isinstance(lit, str) and lit for lit in literals):
+            raise PackError(f"rule {name}: 'literals' must be a list of non-empty strings")
+        if rule.get("severity") not in SEVERITIES:
+            raise PackError(f"rule {name}: 'severity' must be one of {', '.join(SEVERITIES)}")
+        rule_ignore_case = bool(rule.get("ignore_case", ignore_case))
+        try:
+            re.compile(f"(?i){rule['pattern']}" if rule_ignore_case else rule["pattern"])
+        except re.error as e:
+            raise PackError(f"rule {name}: invalid pattern: {e}")
+        normalized.append({**rule, "literals": literals, "ignore_case": rule_ignore_case})
+
+    return {"name": data["name"], "version": data["version"], "rules": normalized}
+
+def _rule_version(rule):
+    key = [rule["name"], rule["pattern"], rule["literals"], rule["severity"]]
+    if rule["ignore_case"]:
+        key.append("ignore_case")
+    return hashlib.sha256(json.dumps(key).encode("utf-8")).hexdigest()[:16]
+
+class RulePack:
+    """Pack chargé : règles normalisées et matcher compilé une seule fois."""
+
+    def __init__(self, spec, digest):
+        self.name = spec["name"]
+        self.version = spec["version"]
+        self.digest = digest
+        self.rules = spec["rules"]
+        # Identifiant enregistré avec chaque résultat
+        self.id = f"{self.name}@{self.version}+{digest[:12]}"
+        # Empreinte de chaque règle, sur les seuls champs qui changent ce qu'elle détecte
+        # (mêmes champs que lorsque les signatures étaient du code) : une règle nouvelle ou
+        # modifiée change d'empreinte, un reformatage du fichier ou une description, non
+        self.rule_versions = {rule["name"]: _rule_version(rule) for rule in self.rules}
+        self.matcher = self.build_matcher()
+
+    def build_matcher(self, names=None):
+        """Matcher limité aux règles nommées (toutes si names est None)."""
+        return Matcher(
+            Rule(rule["name"], rule["pattern"], rule["literals"], data=rule, ignore_case=rule["ignore_case"])
+            for rule in self.rules
+            if names is None or rule["name"] in names
+        )
+
+    def info(self):
+        return {"name": self.name, "version": self.version, "digest": self.digest, "id": self.id,
+                "rules": [rule["name"] for rule in self.rules]}
+
+# Packs déjà chargés dans ce processus, par empreinte
+_packs = {}
+_packs_lock = threading.Lock()
+
+def _compiled_path(digest):
+    return os.path.join(PACK_DIR, "compiled", f"{digest}.json")
+
+def _write_compiled(digest, spec):
+    path = _compiled_path(digest)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(spec, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"Rule pack cache unavailable: {e}")
+
+def _valid_spec(spec):
+    """Forme normalisée produite par parse_pack : le cache est sur un volume partagé,
+    un fichier d'une autre forme n'est pas utilisé."""
+    if not isinstance(spec, dict) or set(spec) != {"name", "version", "rules"}:
+        return False
+    if not isinstance(spec["name"], str) or not isinstance(spec["version"], str) \
+            or not isinstance(spec["rules"], list) or not spec["rules"]:
+        return False
+    for rule in spec["rules"]:
+        if not isinstance(rule, dict) or not isinstance(rule.get("name"), str) \
+                or not isinstance(rule.get("pattern"), str) \
+                or not isinstance(rule.get("literals"), list) \
+                or not all(isinstance(lit, str) and lit for lit in rule["literals"]) \
+                or rule.get("severity") not in SEVERITIES \
+                or not isinstance(rule.get("ignore_case"), bool):
+            return False
+    return True
+
+def _read_compiled(digest):
+    """Forme normalisée en cache, ou None (absente, illisible ou invalide : le pack est
+    alors revalidé à partir de son fichier)."""
+    try:
+        with open(_compiled_path(digest), "r", encoding="utf-8") as f:
+            spec = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not _valid_spec(spec):
+        print(f"Rule pack cache {digest[:12]}: invalid content, ignored")
+        return None
+    return spec
+
+def load_pack(raw):
+    """Pack correspondant à ces octets : mémoire du processus, cache disque, ou validation."""
+    digest = hashlib.sha256(raw).hexdigest()
+    with _packs_lock:
+        pack = _packs.get(digest)
+    if pack is not None:
+        return pack
+    spec = _read_compiled(digest)
+    if spec is None:
+        spec = parse_pack(raw)
+        _write_compiled(digest, spec)
+    pack = RulePack(spec, digest)
+    with _packs_lock:
+        return _packs.setdefault(digest, pack)
+
+def get_pack(digest):
+    """Pack par empreinte (processus du pool, balayages) ; PackError s'il est inconnu."""
+    with _packs_lock:
+        pack = _packs.get(digest)
+    if pack is not None:
+        return pack
+    spec = _read_compiled(digest)
+    if spec is None:
+        raise PackError(f"unknown rule pack {digest}")
+    pack = RulePack(spec, digest)
+    with _packs_lock:
+        return _packs.setdefault(digest, pack)
+
+class PackSource:
+    """Pack actif d'un service : fichier publié dans PACK_DIR, sinon fichier embarqué."""
+
+    def __init__(self, name, bundled_path):
+        self.name = name
+        self.bundled_path = bundled_path
+        self.published_path = os.path.join(PACK_DIR, f"{name}.json")
+        self._pack = None
+        self._stamp = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def _source(self):
+        try:
+            st = os.stat(self.published_path)
+            return self.published_path, (st.st_ino, st.st_mtime_ns, st.st_size)
+        except OSError:
+            return self.bundled_path, None
+
+    def is_published(self):
+        return os.path.exists(self.published_path)
+
+    def current(self):
+        """Pack actif ; le fichier publié n'est re-vérifié qu'après PACK_CHECK_INTERVAL."""
+        now = time.monotonic()
+        if self._pack is not None and now - self._checked_at < PACK_CHECK_INTERVAL:
+            return self._pack
+        with self._lock:
+            path, stamp = self._source()
+            if self._pack is None or stamp != self._stamp:
+                with open(path, "rb") as f:
+                    raw = f.read()
+                try:
+                    self._pack = load_pack(raw)
+                except PackError as e:
+                    # Fichier publié à la main et invalide : on garde le pack précédent
+                    if self._pack is None:
+                        raise
+                    print(f"Rule pack {path} rejected: {e}")
+                self._stamp = stamp
+            self._checked_at = now
+            return self._pack
+
+    def reload(self):
+        """Relit immédiatement la source, sans attendre PACK_CHECK_INTERVAL."""
+        with self._lock:
+            self._checked_at = 0.0
+            self._stamp = ()
+        return self.current()
+
+    def publish(self, raw):
+        """Valide puis publie un pack pour tous les processus du service ; PackError si invalide.
+        Le fichier est remplacé atomiquement : un processus lit l'ancien ou le nouveau pack."""
+        pack = load_pack(raw)
+        if pack.name != self.name:
+            raise PackError(f"pack name must be '{self.name}'")
+        os.makedirs(PACK_DIR, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=PACK_DIR)
+        with os.fdopen(fd, "wb") as f:
+            f.write(raw)
+        os.replace(tmp_path, self.published_path)
+        return self.reload()
+
+    def reset(self):
+        """Supprime le pack publié : retour au pack embarqué."""
+        try:
+            os.remove(self.published_path)
+        except FileNotFoundError:
+            pass
+        return self.reload()
@@ -0,0 +1,291 @@
+import os, sys, math, json, time, zlib, threading
+from sqlalchemy import text
+from storage import create_sqlite_engine
+
+# Profil de coût par règle (signatures de secrethunter, patterns de cryptocheck) : nombre
+# d'évaluations de la regex, temps cumulé, taux de match et pire cas (évaluation la plus
+# lente et longueur de l'entrée correspondante). Seules les évaluations réelles comptent :
+# une chaîne écartée par le préfiltre littéral ou dont le verdict vient du cache n'en est pas une.
+# Les compteurs sont tenus en mémoire par processus (chronométrage dans Matcher.findall /
+# Matcher.search), puis ajoutés à une table SQLite partagée à la fin de chaque tâche.
+# Désactivé par défaut : le chronométrage coûte deux appels d'horloge par évaluation.
+#
+# Outil hors ligne, à lancer avant de publier un pack :
+#   python ruleprofile.py replay packs/secrets.json [--corpus /app/storage/corpus] [--strings fichier]
+# rejoue un corpus de chaînes sur chaque règle, soumet chaque règle à des entrées construites
+# pour provoquer du backtracking, et signale les règles pathologiques (code de sortie 1).
+RULE_PROFILING = os.environ.get("RULE_PROFILING", "0") == "1"
+RULE_PROFILE_PATH = os.environ.get("RULE_PROFILE_PATH", os.environ.get("DB_PATH", "/app/storage.db"))
+COUNTERS = ("evaluations", "matches", "total_ns", "max_ns", "max_ns_length", "max_length")
+
+class RuleProfiler:
+    """Compteurs par règle pour une version d'un pack ; path=None : en mémoire uniquement."""
+
+    def __init__(self, version, path=RULE_PROFILE_PATH):
+        self.version = version
+        self._stats = {}
+        self._lock = threading.Lock()
+        self.engine = None
+        if path:
+            self.engine = create_sqlite_engine(path)
+            with self.engine.begin() as conn:
+                conn.execute(text("""
+                    CREATE TABLE IF NOT EXISTS rule_profile (
+                        version TEXT,
+                        rule TEXT,
+                        evaluations INTEGER DEFAULT 0,
+                        matches INTEGER DEFAULT 0,
+                        total_ns INTEGER DEFAULT 0,
+                        max_ns INTEGER DEFAULT 0,
+                        max_ns_length INTEGER DEFAULT 0,
+                        max_length INTEGER DEFAULT 0,
+                        PRIMARY KEY (version, rule)
+                    )
+                """))
+
+    def record(self, rule, length, elapsed_ns, matched):
+        with self._lock:
+            s = self._stats.get(rule)
+            if s is None:
+                s = self._stats[rule] = dict.fromkeys(COUNTERS, 0)
+            s["evaluations"] += 1
+            s["matches"] += matched
+            s["total_ns"] += elapsed_ns
+            if elapsed_ns > s["max_ns"]:
+                s["max_ns"], s["max_ns_length"] = elapsed_ns, length
+            if length > s["max_length"]:
+                s["max_length"] = length
+
+    def snapshot(self):
+        with self._lock:
+            return {rule: dict(s) for rule, s in self._stats.items()}
+
+    def flush(self):
+        """Ajoute les compteurs du processus à ceux de la base (partagés par tous les processus)."""
+        if self.engine is None:
+            return
+        with self._lock:
+            stats, self._stats = self._stats, {}
+        if not stats:
+            return
+        rows = [{"version": self.version, "rule": rule, **s} for rule, s in stats.items()]
+        with self.engine.begin() as conn:
+            conn.execute(text("INSERT OR IGNORE INTO rule_profile (version, rule) VALUES (:version, :rule)"), rows)
+            # Les expressions d'un UPDATE lisent toutes l'ancienne ligne : max_ns_length est
+            # comparé à l'ancien max_ns
+            conn.execute(text("""
+                UPDATE rule_profile SET
+                    evaluations=evaluations+:evaluations, matches=matches+:matches, total_ns=total_ns+:total_ns,
+                    max_ns_length=CASE WHEN :max_ns > max_ns THEN :max_ns_length ELSE max_ns_length END,
+                    max_ns=MAX(max_ns, :max_ns), max_length=MAX(max_length, :max_length)
+                WHERE version=:version AND rule=:rule
+            """), rows)
+
+    def stats(self):
+        """Compteurs cumulés de tous les processus, règles les plus coûteuses en premier."""
+        with self.engine.connect() as conn:
+            rows = conn.execute(
+                text(f"SELECT rule, {', '.join(COUNTERS)} FROM rule_profile WHERE version=:version ORDER BY total_ns DESC"),
+                {"version": self.version}
+            ).fetchall()
+        return summarize({r[0]: dict(zip(COUNTERS, r[1:])) for r in rows})
+
+    def reset(self):
+        with self._lock:
+            self._stats = {}
+        with self.engine.begin() as conn:
+            conn.execute(text("DELETE FROM rule_profile WHERE version=:version"), {"version": self.version})
+
+def summarize(stats):
+    """Lignes du rapport : compteurs bruts plus taux de match, temps moyen et part du temps total."""
+    total = sum(s["total_ns"] for s in stats.values()) or 1
+    rows = []
+    for rule, s in stats.items():
+        evaluations = s["evaluations"] or 1
+        rows.append({
+            "rule": rule,
+            "evaluations": s["evaluations"],
+            "matches": s["matches"],
+            "match_rate": round(s["matches"] / evaluations, 4),
+            "total_ms": round(s["total_ns"] / 1e6, 3),
+            "avg_us": round(s["total_ns"] / evaluations / 1e3, 3),
+            "max_us": round(s["max_ns"] / 1e3, 3),
+            # Longueur de l'entrée de l'évaluation la plus lente, et plus longue entrée évaluée
+            "max_us_length": s["max_ns_length"],
+            "max_length": s["max_length"],
+            "time_share": round(s["total_ns"] / total, 4),
+        })
+    rows.sort(key=lambda r: r["total_ms"], reverse=True)
+    return rows
+
+_profilers = {}
+_profilers_pid = None
+
+def get_profiler(version):
+    """Profileur du processus pour cette version du pack (None si le profilage est désactivé)."""
+    # Un profileur par processus : les connexions SQLite ne survivent pas à un fork
+    global _profilers, _profilers_pid
+    if not RULE_PROFILING:
+        return None
+    if _profilers_pid != os.getpid():
+        _profilers, _profilers_pid = {}, os.getpid()
+    if version not in _profilers:
+        _profilers[version] = RuleProfiler(version)
+    return _profilers[version]
+
+# --- Rejeu hors ligne ---------------------------------------------------------------
+
+# Entrées construites à partir d'un littéral de la règle, de longueur n : littéral répété
+# (seul ou suivi d'un séparateur hors des classes usuelles), puis suivi ou précédé d'un
+# long bourrage. C'est là qu'un ".*" ou un ".+" suivi d'un motif backtrack à chaque position.
+STRESS_INPUTS = {
+    "repeat": lambda lit, n: lit * (n // len(lit)),
+    "repeat+space": lambda lit, n: (lit + " ") * (n // (len(lit) + 1)),
+    "repeat+symbol": lambda lit, n: (lit + "!") * (n // (len(lit) + 1)),
+    "literal+letters": lambda lit, n: lit + "a" * n,
+    "literal+digits": lambda lit, n: lit + "0" * n,
+    "literal+spaces": lambda lit, n: lit + " " * n,
+    "letters+literal": lambda lit, n: "a" * n + lit,
+}
+STRESS_MIN_LENGTH = 1024
+STRESS_REPEATS = 3
+# Exposant de croissance au-delà duquel une règle est signalée (1 : linéaire, 2 : quadratique)
+GROWTH_LIMIT = 1.5
+# En dessous, la mesure est dominée par le bruit : pas d'exposant calculé
+MIN_TIMING_NS = 1_000_000
+
+def _timed(regex, s, repeats=STRESS_REPEATS):
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter_ns()
+        regex.findall(s)
+        elapsed = time.perf_counter_ns() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def _rule_literals(rule):
+    # Littéraux avec leur casse d'origine (ceux du Matcher sont en minuscules)
+    literals = list(rule.data.get("literals") or []) if isinstance(rule.data, dict) else []
+    return literals or list(rule.literals) or ["a"]
+
+def stress_rule(rule, max_length, budget_ns):
+    """Pire exposant de croissance et pire temps (ns, longueur, entrée) sur les entrées construites."""
+    worst_growth, worst = None, (0, 0, None)
+    for lit in _rule_literals(rule):
+        for name, build in STRESS_INPUTS.items():
+            first, n = None, STRESS_MIN_LENGTH
+            while n <= max_length:
+                s = build(lit, n)
+                elapsed = _timed(rule.regex, s)
+                if elapsed > worst[0]:
+                    worst = (elapsed, len(s), f"{name}({lit!r})")
+                # Pente sur toute la plage mesurée : une seule doublure est trop bruitée
+                if first is not None and elapsed >= MIN_TIMING_NS:
+                    growth = math.log2(elapsed / max(first, 1)) / math.log2(n / STRESS_MIN_LENGTH)
+                    worst_growth = growth if worst_growth is None else max(worst_growth, growth)
+                if elapsed > budget_ns:
+                    break
+                if first is None:
+                    first = elapsed
+                n *= 2
+    return worst_growth, worst
+
+def _load_corpus(corpus_dir):
+    # Blobs du corpus de secrethunter (cf. corpus.py) : liste JSON de chaînes compressée zlib
+    for root, _, files in os.walk(corpus_dir):
+        for name in files:
+            try:
+                with open(os.path.join(root, name), "rb") as f:
+                    yield from json.loads(zlib.decompress(f.read()))
+            except (OSError, ValueError, zlib.error) as e:
+                print(f"{name}: skipped ({e})", file=sys.stderr)
+
+def _load_strings(path):
+    with open(path, "r", encoding="utf-8", errors="surrogateescape") as f:
+        if path.endswith(".json"):
+            return json.load(f)
+        return [line.rstrip("\n") for line in f]
+
+def replay(pack, strings, prefilter=True):
+    """Évalue chaque règle du pack sur chaque chaîne (retenue par ses littéraux si prefilter)."""
+    profiler = RuleProfiler(pack.digest, path=None)
+    rules = pack.matcher.rules
+    for s in strings:
+        lowered = s.lower()
+        for rule in rules:
+            if prefilter and rule.literals and not any(lit in lowered for lit in rule.literals):
+                continue
+            start = time.perf_counter_ns()
+            matched = bool(rule.regex.findall(s))
+            profiler.record(rule.name, len(s), time.perf_counter_ns() - start, matched)
+    return profiler.snapshot()
+
+def _main():
+    import argparse, re
+    from rulepack import load_pack, PackError
+
+    parser = argparse.ArgumentParser(description="Profil de coût des règles d'un pack, avant publication")
+    parser.add_argument("command", choices=["replay"], help="replay : rejoue un corpus et des entrées construites sur chaque règle")
+    parser.add_argument("packs", nargs="+", help="fichiers de pack JSON (cf. rulepack.py)")
+    parser.add_argument("--corpus", help="répertoire du corpus de chaînes de secrethunter (CORPUS_DIR)")
+    parser.add_argument("--strings", help="fichier de chaînes : une par ligne, ou liste JSON (.json)")
+    parser.add_argument("--no-prefilter", action="store_true", help="évalue chaque règle sur toutes les chaînes, sans ses littéraux")
+    parser.add_argument("--engine", choices=["auto", "re"], default="auto",
+                        help="re : force le module re standard (comportement sans RE2)")
+    parser.add_argument("--max-length", type=int, default=8192, help="longueur maximale des entrées construites")
+    parser.add_argument("--budget-ms", type=float, default=250, help="temps maximal d'une évaluation")
+    parser.add_argument("--no-fail", action="store_true", help="code de sortie 0 même si des règles sont signalées")
+    args = parser.parse_args()
+
+    strings = []
+    if args.corpus:
+        strings.extend(_load_corpus(args.corpus))
+    if args.strings:
+        strings.extend(_load_strings(args.strings))
+    strings = [s for s in strings if isinstance(s, str) and s]
+    budget_ns = int(args.budget_ms * 1e6)
+
+    flagged = 0
+    for path in args.packs:
+        try:
+            with open(path, "rb") as f:
+                pack = load_pack(f.read())
+        except (OSError, PackError) as e:
+            print(f"{path}: {e}")
+            flagged += 1
+            continue
+        if args.engine == "re":
+            for rule in pack.matcher.rules:
+                rule.regex = re.compile(f"(?i){rule.pattern}" if rule.data.get("ignore_case") else rule.pattern)
+                rule.linear = False
+
+        print(f"{path}: {pack.id}, {len(pack.rules)} rule(s), {len(strings)} string(s)")
+        rows = {row["rule"]: row for row in summarize(replay(pack, strings, prefilter=not args.no_prefilter))}
+        print(f"  {'rule':<32} {'evals':>8} {'match%':>7} {'total ms':>9} {'avg us':>8} {'max us':>9} {'@len':>7} "
+              f"{'stress ms':>9} {'@len':>7} {'growth':>6}  flags")
+        for rule in sorted(pack.matcher.rules, key=lambda r: -rows.get(r.name, {}).get("total_ms", 0)):
+            row = rows.get(rule.name, summarize({rule.name: dict.fromkeys(COUNTERS, 0)})[0])
+            growth, (stress_ns, stress_length, stress_input) = stress_rule(rule, args.max_length, budget_ns)
+            flags = []
+            if not rule.literals:
+                flags.append("no literals: prefilter disabled for the whole pack")
+            if not rule.linear:
+                flags.append("backtracking engine")
+            if growth is not None and growth > GROWTH_LIMIT:
+                flags.append(f"superlinear (n^{growth:.1f}) on {stress_input}")
+            if max(stress_ns, row["max_us"] * 1e3) > budget_ns:
+                flags.append(f"over budget ({args.budget_ms:g} ms)")
+            # Sans RE2 le backtracking est attendu : seul le coût mesuré fait échouer
+            if any(not flag.startswith("backtracking") for flag in flags):
+                flagged += 1
+            print(f"  {rule.name[:32]:<32} {row['evaluations']:>8} {row['match_rate'] * 100:>6.1f}% {row['total_ms']:>9.2f} "
+                  f"{row['avg_us']:>8.2f} {row['max_us']:>9.1f} {row['max_us_length']:>7} "
+                  f"{stress_ns / 1e6:>9.2f} {stress_length:>7} {'-' if growth is None else f'{growth:.2f}':>6}  {'; '.join(flags)}")
+
+    if flagged:
+        print(f"{flagged} pathological rule(s) or invalid pack(s)")
+        if not args.no_fail:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    _main()
@@ -0,0 +1,424 @@
+import os, sys, time, json, zlib, struct, base64, threading
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.pool import QueuePool
+
+# Couche de stockage SQLite commune à tous les services (copiée dans chaque service).
+# WAL : les lectures ne bloquent plus les écritures, et inversement.
+# busy_timeout : un écrivain concurrent attend le verrou au lieu d'échouer ("database is locked").
+BUSY_TIMEOUT_MS = int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", 10000))
+POOL_SIZE = int(os.environ.get("SQLITE_POOL_SIZE", 5))
+STATUS_FLUSH_INTERVAL = float(os.environ.get("STATUS_FLUSH_INTERVAL", 1.0))
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+# Compteurs de findings précalculés à l'écriture, renvoyés tels quels par les listings
+SEVERITIES = ("CRITICAL", "HIGH", "MEDIUM", "LOW")
+COUNT_COLUMNS = {
+    "critical_count": "INTEGER",
+    "high_count": "INTEGER",
+    "medium_count": "INTEGER",
+    "low_count": "INTEGER",
+    "type_counts": "TEXT",
+}
+
+def create_sqlite_engine(path):
+    """Moteur SQLite en WAL avec connexions réutilisées (SQLAlchemy 1.4 ouvre sinon une connexion par requête)."""
+    engine = create_engine(
+        f"sqlite:///{path}",
+        connect_args={"check_same_thread": False, "timeout": BUSY_TIMEOUT_MS / 1000},
+        poolclass=QueuePool,
+        pool_size=POOL_SIZE,
+        max_overflow=POOL_SIZE * 2,
+    )
+
+    @event.listens_for(engine, "connect")
+    def _configure(dbapi_conn, _):
+        cursor = dbapi_conn.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        # Suffisant en WAL : pas de corruption possible, seule la dernière transaction peut être perdue
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+        cursor.close()
+
+    return engine
+
+class StatusWriter:
+    """Écritures de statut différées : les mises à jour d'un même job sont fusionnées
+    en mémoire et écrites par un thread de fond, toutes dans une seule transaction.
+
+    update() est non bloquant (progression) ; finish() écrit immédiatement l'état
+    final et annule ce qui restait en attente pour ce job, qui ne peut plus l'écraser.
+    """
+
+    def __init__(self, engine, table, interval=STATUS_FLUSH_INTERVAL):
+        self.engine = engine
+        self.table = table
+        self.interval = interval
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._thread_pid = None
+
+    def _ensure_thread(self):
+        # Un thread par processus : après un fork, celui du parent n'existe plus
+        if self._thread_pid != os.getpid():
+            self._thread_pid = os.getpid()
+            self._pending = {}
+            threading.Thread(target=self._run, daemon=True).start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Status flush error: {e}")
+
+    def _write(self, conn, row_id, values):
+        assignments = ", ".join(f"{column}=:{column}" for column in values)
+        conn.execute(text(f"UPDATE {self.table} SET {assignments} WHERE id=:id"), {**values, "id": row_id})
+
+    def update(self, row_id, **values):
+        with self._lock:
+            self._ensure_thread()
+            self._pending.setdefault(row_id, {}).update(values)
+
+    def flush(self):
+        with self._write_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            if not pending:
+                return
+            with self.engine.begin() as conn:
+                for row_id, values in pending.items():
+                    self._write(conn, row_id, values)
+
+    def finish(self, row_id, **values):
+        with self._write_lock:
+            with self._lock:
+                values = {**self._pending.pop(row_id, {}), **values}
+            with self.engine.begin() as conn:
+                self._write(conn, row_id, values)
+
+def ensure_list_indexes(conn, table, filter_columns=("status",)):
+    """Index des listings : tri (created_at, id) et filtres usuels suivis du même tri."""
+    conn.execute(text(f"CREATE INDEX IF NOT EXISTS idx_{table}_created ON {table} (created_at DESC, id DESC)"))
+    for column in filter_columns:
+        conn.execute(text(f"CREATE INDEX IF NOT EXISTS idx_{table}_{column}_created ON {table} ({column}, created_at DESC, id DESC)"))
+
+def encode_cursor(created_at, row_id):
+    return base64.urlsafe_b64encode(json.dumps([created_at, row_id]).encode("utf-8")).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor):
+    try:
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return str(created_at), str(row_id)
+    except Exception:
+        raise ValueError("invalid cursor")
+
+def keyset_page(engine, table, columns, filters=None, since=None, until=None, cursor=None, limit=PAGE_SIZE):
+    """Page d'un listing trié par (created_at, id) décroissants, par pagination keyset.
+
+    Chaque page est une recherche dans l'index (pas d'OFFSET) : son coût ne dépend pas
+    de la taille de la table ni de la profondeur de la page.
+    filters : {colonne: valeur} en égalité (None ignoré) ; since inclus, until exclu.
+    Retourne (lignes sous forme de dicts, curseur de la page suivante ou None).
+    """
+    try:
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+    except (TypeError, ValueError):
+        raise ValueError("invalid limit")
+
+    conditions, params = [], {"limit": limit + 1}
+    for column, value in (filters or {}).items():
+        if value is not None:
+            conditions.append(f"{column} = :f_{column}")
+            params[f"f_{column}"] = value
+    if since:
+        conditions.append("created_at >= :since")
+        params["since"] = since
+    if until:
+        conditions.append("created_at < :until")
+        params["until"] = until
+    if cursor:
+        params["cursor_created_at"], params["cursor_id"] = decode_cursor(cursor)
+        conditions.append("(created_at, id) < (:cursor_created_at, :cursor_id)")
+
+    where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+    with engine.connect() as conn:
+        rows = conn.execute(
+            text(f"SELECT {', '.join(columns)} FROM {table}{where} ORDER BY created_at DESC, id DESC LIMIT :limit"),
+            params
+        ).fetchall()
+
+    rows = [dict(r._mapping) for r in rows]
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]["created_at"], rows[-1]["id"])
+    return rows, next_cursor
+
+def count_findings(findings):
+    """Valeurs des colonnes COUNT_COLUMNS pour une liste de findings."""
+    counts = {f"{severity.lower()}_count": 0 for severity in SEVERITIES}
+    types = {}
+    for finding in findings if isinstance(findings, list) else []:
+        if not isinstance(finding, dict):
+            continue
+        column = f"{str(finding.get('severity', '')).lower()}_count"
+        if column in counts:
+            counts[column] += 1
+        types[finding.get("type")] = types.get(finding.get("type"), 0) + 1
+    counts["type_counts"] = json.dumps(types, ensure_ascii=False)
+    return counts
+
+def unpack_counts(row):
+    """Remplace les colonnes de compteurs d'une ligne de listing par severity_counts / type_counts.
+    Les compteurs valent None pour une ligne encore en attente d'analyse."""
+    severity_counts = {severity: row.pop(f"{severity.lower()}_count", None) for severity in SEVERITIES}
+    type_counts = row.pop("type_counts", None)
+    row["severity_counts"] = severity_counts if type_counts is not None else None
+    row["type_counts"] = json.loads(type_counts) if type_counts is not None else None
+    return row
+
+def backfill_counts(engine, table, json_column, to_findings=lambda result: result, batch_size=1000):
+    """Calcule les compteurs des lignes terminées écrites avant leur introduction."""
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(
+                text(f"SELECT id, {json_column} FROM {table} WHERE type_counts IS NULL AND status IN ('done', 'failed') LIMIT :n"),
+                {"n": batch_size}
+            ).fetchall()
+            if not rows:
+                return
+            for row_id, raw in rows:
+                try:
+                    counts = count_findings(to_findings(decode_result(raw) or []))
+                except Exception:
+                    counts = count_findings([])
+                assignments = ", ".join(f"{column}=:{column}" for column in counts)
+                conn.execute(text(f"UPDATE {table} SET {assignments} WHERE id=:id"), {**counts, "id": row_id})
+
+# Résultats stockés compressés, découpés en sections décodables séparément.
+# Format (version 1) : MAGIC, version (1 octet), taille de l'index (4 octets, big endian),
+# index JSON {"kind", "summary", "sections": {nom: [offset, taille]}}, puis les sections
+# compressées (zlib) à la suite. Un dict a une section par clé ; une liste est découpée
+# en tranches de RESULT_CHUNK_SIZE éléments, nommées "0", "1", ...
+# Les anciennes lignes en JSON texte restent lisibles (cf. decode_result).
+RESULT_MAGIC = b"MSR"
+RESULT_FORMAT_VERSION = 1
+RESULT_CHUNK_SIZE = 500
+RESULT_COMPRESSION_LEVEL = int(os.environ.get("RESULT_COMPRESSION_LEVEL", 6))
+_HEADER = struct.Struct(">3sBI")
+
+# Colonnes de résultats de chaque table, réécrites par la migration
+RESULT_COLUMNS = {
+    "scans": "result_json",
+    "secrets_scans": "findings_json",
+    "crypto_scans": "findings_json",
+    "network_scans": "findings_json",
+    "orchestrated_scans": "result_json",
+    "result_cache": "result_json",
+}
+
+def _summarize(result):
+    """Résumé stocké dans l'index : valeurs simples telles quelles, collections réduites à leur taille."""
+    if isinstance(result, list):
+        return {"count": len(result)}
+    summary = {}
+    for key, value in result.items():
+        if isinstance(value, dict) and all(not isinstance(v, (dict, list)) for v in value.values()):
+            summary[key] = value
+        elif isinstance(value, (dict, list)):
+            summary[key] = len(value)
+        else:
+            summary[key] = value
+    return summary
+
+def encode_result(result):
+    """Encode un résultat (dict ou liste) au format compressé par sections ; sinon en JSON texte."""
+    extra = {}
+    if isinstance(result, list):
+        kind = "list"
+        sections = {str(i // RESULT_CHUNK_SIZE): result[i:i + RESULT_CHUNK_SIZE] for i in range(0, len(result), RESULT_CHUNK_SIZE)}
+        extra["chunk_size"] = RESULT_CHUNK_SIZE
+    elif isinstance(result, dict):
+        kind = "dict"
+        sections = {str(key): value for key, value in result.items()}
+    else:
+        return json.dumps(result, ensure_ascii=False)
+
+    index, body, offset = {}, [], 0
+    for name, value in sections.items():
+        data = zlib.compress(json.dumps(value, ensure_ascii=False).encode("utf-8"), RESULT_COMPRESSION_LEVEL)
+        index[name] = [offset, len(data)]
+        body.append(data)
+        offset += len(data)
+    header = json.dumps({"kind": kind, "summary": _summarize(result), "sections": index, **extra}, ensure_ascii=False).encode("utf-8")
+    return _HEADER.pack(RESULT_MAGIC, RESULT_FORMAT_VERSION, len(header)) + header + b"".join(body)
+
+def is_encoded(raw):
+    return isinstance(raw, (bytes, memoryview)) and bytes(raw[:3]) == RESULT_MAGIC
+
+def _read_index(raw):
+    magic, version, header_size = _HEADER.unpack_from(raw)
+    if version != RESULT_FORMAT_VERSION:
+        raise ValueError(f"unsupported result format version {version}")
+    start = _HEADER.size + header_size
+    return json.loads(bytes(raw[_HEADER.size:start])), start
+
+def _read_section(raw, index, start, name):
+    offset, size = index["sections"][name]
+    return json.loads(zlib.decompress(raw[start + offset:start + offset + size]))
+
+def decode_result(raw, section=None, summary=False):
+    """Décode un résultat stocké, en entier ou partiellement.
+
+    summary=True : seul le résumé de l'index (aucune section n'est décompressée).
+    section="flags" : seule cette clé d'un résultat dict (KeyError si absente).
+    Accepte aussi l'ancien format JSON texte.
+    """
+    if raw is None or raw == "" or raw == b"":
+        return None
+    if not is_encoded(raw):
+        result = json.loads(raw)
+        if summary:
+            return _summarize(result) if isinstance(result, (dict, list)) else result
+        if section is not None:
+            if not isinstance(result, dict) or section not in result:
+                raise KeyError(section)
+            return result[section]
+        return result
+
+    raw = memoryview(raw)
+    index, start = _read_index(raw)
+    if summary:
+        return index["summary"]
+    if section is not None:
+        if index["kind"] != "dict" or section not in index["sections"]:
+            raise KeyError(section)
+        return _read_section(raw, index, start, section)
+    if index["kind"] == "list":
+        items = []
+        for name in sorted(index["sections"], key=int):
+            items.extend(_read_section(raw, index, start, name))
+        return items
+    return {name: _read_section(raw, index, start, name) for name in index["sections"]}
+
+def iter_result_items(raw, start=0):
+    """Parcourt un résultat liste à partir de la position start, tranche par tranche :
+    une seule tranche décompressée à la fois. Génère des couples (position, élément)."""
+    if raw is None or raw == "" or raw == b"":
+        return
+    if not is_encoded(raw):
+        items = json.loads(raw)
+        for position in range(start, len(items)):
+            yield position, items[position]
+        return
+    raw = memoryview(raw)
+    index, base = _read_index(raw)
+    if index["kind"] != "list":
+        raise ValueError("not a list result")
+    chunk_size = index.get("chunk_size", RESULT_CHUNK_SIZE)
+    for chunk in range(start // chunk_size, len(index["sections"])):
+        first = chunk * chunk_size
+        items = _read_section(raw, index, base, str(chunk))
+        for i in range(max(start - first, 0), len(items)):
+            yield first + i, items[i]
+
+def _finding_filter(types=None, severities=None):
+    types = set(types) if types else None
+    severities = {s.upper() for s in severities} if severities else None
+    return lambda f: (types is None or f.get("type") in types) and \
+                     (severities is None or str(f.get("severity", "")).upper() in severities)
+
+def iter_findings(raw, types=None, severities=None):
+    """Findings filtrés par type / sévérité, décodés au fil de l'eau."""
+    matches = _finding_filter(types, severities)
+    for _, finding in iter_result_items(raw):
+        if matches(finding):
+            yield finding
+
+def findings_page(raw, offset=0, cursor=None, limit=PAGE_SIZE, types=None, severities=None):
+    """Page de findings filtrés : retourne (findings, curseur de la page suivante ou None).
+
+    Le curseur est la position du prochain finding dans le résultat : une page suivante
+    ne décompresse que les tranches qu'elle lit. offset saute des findings filtrés
+    (après le curseur s'il est fourni).
+    """
+    try:
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+    except (TypeError, ValueError):
+        raise ValueError("invalid limit")
+    try:
+        offset = int(offset or 0)
+        start = int(cursor) if cursor else 0
+    except (TypeError, ValueError):
+        raise ValueError("invalid offset or cursor")
+    if offset < 0 or start < 0:
+        raise ValueError("invalid offset or cursor")
+
+    matches = _finding_filter(types, severities)
+    page = []
+    for position, finding in iter_result_items(raw, start):
+        if not matches(finding):
+            continue
+        if offset:
+            offset -= 1
+            continue
+        if len(page) == limit:
+            return page, str(position)
+        page.append(finding)
+    return page, None
+
+def migrate_results(engine, tables=RESULT_COLUMNS, batch_size=500):
+    """Réécrit au format compressé les résultats encore stockés en JSON texte.
+    Idempotent : les lignes déjà encodées sont ignorées. Retourne {table: lignes réécrites}."""
+    migrated = {}
+    with engine.connect() as conn:
+        existing = {r[0] for r in conn.execute(text("SELECT name FROM sqlite_master WHERE type='table'"))}
+    for table, column in tables.items():
+        if table not in existing:
+            continue
+        migrated[table] = 0
+        last_rowid = 0
+        while True:
+            with engine.begin() as conn:
+                rows = conn.execute(
+                    text(f"SELECT rowid, {column} FROM {table} WHERE rowid > :last AND typeof({column}) = 'text' ORDER BY rowid LIMIT :n"),
+                    {"last": last_rowid, "n": batch_size}
+                ).fetchall()
+                if not rows:
+                    break
+                for rowid, raw in rows:
+                    try:
+                        encoded = encode_result(json.loads(raw))
+                    except ValueError:
+                        continue
+                    conn.execute(text(f"UPDATE {table} SET {column}=:res WHERE rowid=:rowid"), {"res": encoded, "rowid": rowid})
+                    migrated[table] += 1
+                last_rowid = rows[-1][0]
+    return migrated
+
+if __name__ == "__main__":
+    # python storage.py migrate [base.db ...] [--vacuum]
+    import argparse
+    parser = argparse.ArgumentParser(description="Outils de la couche de stockage")
+    parser.add_argument("command", choices=["migrate"], help="migrate : compresse les résultats JSON existants")
+    parser.add_argument("databases", nargs="*", help="bases SQLite (défaut : $APK_DB_PATH ou $DB_PATH)")
+    parser.add_argument("--vacuum", action="store_true", help="récupère ensuite l'espace libéré (VACUUM)")
+    args = parser.parse_args()
+
+    databases = args.databases or [os.environ.get("APK_DB_PATH") or os.environ.get("DB_PATH", "/app/storage.db")]
+    for path in databases:
+        if not os.path.exists(path):
+            sys.exit(f"{path}: not found")
+        engine = create_sqlite_engine(path)
+        before = os.path.getsize(path)
+        for table, count in migrate_results(engine).items():
+            print(f"{path}: {table}: {count} row(s) migrated")
+        if args.vacuum:
+            with engine.connect() as conn:
+                conn.exec_driver_sql("VACUUM")
+            print(f"{path}: {before} -> {os.path.getsize(path)} bytes")
+        engine.dispose()
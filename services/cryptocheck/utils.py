@@ -1,8 +1,15 @@
-import os, datetime, json
-from sqlalchemy import create_engine, text
+import os, datetime, json, hashlib, uuid, zipfile
+from sqlalchemy import text
+from androguard.core.axml import AXMLPrinter
+from storage import (create_sqlite_engine, StatusWriter, ensure_list_indexes, keyset_page, PAGE_SIZE,
+                     COUNT_COLUMNS, count_findings, unpack_counts, backfill_counts,
+                     encode_result, decode_result, findings_page, iter_findings)
 
 DB_PATH = os.environ.get("DB_PATH", "/app/storage.db")
-ENGINE = create_engine(f"sqlite:///{DB_PATH}", connect_args={"check_same_thread": False})
+ENGINE = create_sqlite_engine(DB_PATH)
+# Progression écrite en différé ; l'état final est écrit immédiatement
+STATUS = StatusWriter(ENGINE, "crypto_scans")
+UPLOAD_CHUNK_SIZE = 1024 * 1024
 
 def init_db():
     with ENGINE.begin() as conn:
@@ -10,46 +17,177 @@ def init_db():
             CREATE TABLE IF NOT EXISTS crypto_scans (
                 id TEXT PRIMARY KEY,
                 filename TEXT,
+                package_name TEXT,
                 status TEXT,
                 created_at TEXT,
-                findings_json TEXT
+                findings_json TEXT,
+                upload_path TEXT,
+                sha256 TEXT,
+                progress INTEGER DEFAULT 0,
+                claim_token TEXT
             )
         """))
+        _ensure_columns(conn, "crypto_scans", QUEUE_COLUMNS)
+        _ensure_columns(conn, "crypto_scans", LIST_COLUMNS)
+        ensure_list_indexes(conn, "crypto_scans", ("status", "package_name"))
+        _ensure_columns(conn, "crypto_scans", COUNT_COLUMNS)
+        _ensure_columns(conn, "crypto_scans", PACK_COLUMNS)
+        _ensure_columns(conn, "crypto_scans", ERROR_COLUMNS)
+        conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS result_cache (
+                sha256 TEXT,
+                version TEXT,
+                created_at TEXT,
+                result_json TEXT,
+                PRIMARY KEY (sha256, version)
+            )
+        """))
+    backfill_counts(ENGINE, "crypto_scans", "findings_json")
+
+# Colonnes de la file d'attente, ajoutées aux bases créées avant leur introduction
+QUEUE_COLUMNS = {
+    "upload_path": "TEXT",
+    "sha256": "TEXT",
+    "progress": "INTEGER DEFAULT 0",
+    "claim_token": "TEXT",
+}
+
+# Colonnes des listings (filtre par package)
+LIST_COLUMNS = {
+    "package_name": "TEXT",
+}
+
+# Pack de règles qui a produit le résultat (cf. rulepack.py)
+PACK_COLUMNS = {
+    "pack_version": "TEXT",
+}
 
-def save_scan(scan_id, filename, status, findings):
+# Erreur d'un scan échoué (message et trace), les findings restant une liste vide
+ERROR_COLUMNS = {
+    "error_json": "TEXT",
+}
+
+def _ensure_columns(conn, table, columns):
+    existing = {r[1] for r in conn.execute(text(f"PRAGMA table_info({table})"))}
+    for name, ddl in columns.items():
+        if name not in existing:
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {ddl}"))
+
+def enqueue_scan(scan_id, filename, upload_path, sha256, package_name=None):
+    """Enregistre un job en attente ; il sera traité par le pool de workers."""
     with ENGINE.begin() as conn:
-        res_json = json.dumps(findings, ensure_ascii=False)
         conn.execute(
-            text("INSERT OR REPLACE INTO crypto_scans (id, filename, status, created_at, findings_json) VALUES (:id,:filename,:status,:created_at,:res)"),
-            {"id": scan_id, "filename": filename, "status": status, "created_at": datetime.datetime.utcnow().isoformat(), "res": res_json}
+            text("INSERT INTO crypto_scans (id, filename, package_name, status, created_at, findings_json, upload_path, sha256, progress) VALUES (:id,:filename,:pkg,'queued',:created_at,'[]',:path,:sha,0)"),
+            {"id": scan_id, "filename": filename, "pkg": package_name, "created_at": datetime.datetime.utcnow().isoformat(), "path": upload_path, "sha": sha256}
         )
 
-def get_scan_result(scan_id):
+def claim_next_job():
+    """Passe atomiquement le plus ancien job 'queued' en 'running' et le retourne."""
+    token = uuid.uuid4().hex
+    with ENGINE.begin() as conn:
+        # Une seule instruction UPDATE : atomique même avec plusieurs workers
+        claimed = conn.execute(
+            text("UPDATE crypto_scans SET status='running', claim_token=:token WHERE id = (SELECT id FROM crypto_scans WHERE status='queued' ORDER BY created_at LIMIT 1) AND status='queued'"),
+            {"token": token}
+        ).rowcount
+        if not claimed:
+            return None
+        r = conn.execute(
+            text("SELECT id, filename, upload_path, sha256 FROM crypto_scans WHERE claim_token=:token"),
+            {"token": token}
+        ).fetchone()
+        return {"id": r[0], "filename": r[1], "upload_path": r[2], "sha256": r[3]}
+
+def update_progress(scan_id, progress):
+    STATUS.update(scan_id, progress=int(progress))
+
+def complete_scan(scan_id, status, findings, pack_version=None, error=None):
+    """Enregistre le résultat final d'un job sans toucher à sa date de création ;
+    error : cause d'un échec ({"error": ..., "trace": ...}), renvoyée avec le scan."""
+    STATUS.finish(
+        scan_id, status=status,
+        findings_json=encode_result(findings), progress=100, upload_path=None,
+        pack_version=pack_version, error_json=json.dumps(error) if error else None,
+        **count_findings(findings)
+    )
+
+def requeue_stale_jobs():
+    """Remet en file les jobs interrompus par l'arrêt d'un worker."""
+    with ENGINE.begin() as conn:
+        conn.execute(text("UPDATE crypto_scans SET status='queued', progress=0 WHERE status='running' AND upload_path IS NOT NULL"))
+
+def save_upload(file_storage, save_path):
+    """Écrit l'upload sur disque par blocs et retourne son SHA-256 calculé au passage."""
+    digest = hashlib.sha256()
+    with open(save_path, "wb") as out:
+        while True:
+            chunk = file_storage.stream.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+            out.write(chunk)
+    return digest.hexdigest()
+
+def get_cached_result(sha256, version):
+    """Retourne le résultat déjà calculé pour un APK identique, ou None."""
     with ENGINE.connect() as conn:
-        r = conn.execute(text("SELECT id, filename, status, created_at, findings_json FROM crypto_scans WHERE id=:id"), {"id": scan_id}).fetchone()
+        r = conn.execute(
+            text("SELECT result_json FROM result_cache WHERE sha256=:sha AND version=:version"),
+            {"sha": sha256, "version": version}
+        ).fetchone()
+        return decode_result(r[0]) if r else None
+
+def store_cached_result(sha256, version, result):
+    with ENGINE.begin() as conn:
+        conn.execute(
+            text("INSERT OR REPLACE INTO result_cache (sha256, version, created_at, result_json) VALUES (:sha,:version,:created_at,:res)"),
+            {"sha": sha256, "version": version, "created_at": datetime.datetime.utcnow().isoformat(), "res": encode_result(result)}
+        )
+
+def save_scan(scan_id, filename, status, findings, package_name=None, pack_version=None):
+    with ENGINE.begin() as conn:
+        res_blob = encode_result(findings)
+        conn.execute(
+            text("INSERT OR REPLACE INTO crypto_scans (id, filename, package_name, status, created_at, findings_json, pack_version, critical_count, high_count, medium_count, low_count, type_counts) VALUES (:id,:filename,:pkg,:status,:created_at,:res,:pack_version,:critical_count,:high_count,:medium_count,:low_count,:type_counts)"),
+            {"id": scan_id, "filename": filename, "pkg": package_name, "status": status, "created_at": datetime.datetime.utcnow().isoformat(), "res": res_blob, "pack_version": pack_version, **count_findings(findings)}
+        )
+
+def get_scan_result(scan_id, summary=False):
+    """Détail d'un scan ; summary=True renvoie le résumé stocké au lieu des findings (rien n'est décompressé)."""
+    with ENGINE.connect() as conn:
+        r = conn.execute(text("SELECT id, filename, status, created_at, findings_json, progress, package_name, pack_version, error_json FROM crypto_scans WHERE id=:id"), {"id": scan_id}).fetchone()
         if not r: return None
         return {
             "id": r[0], 
             "filename": r[1], 
             "status": r[2], 
             "created_at": r[3],
-            "findings": json.loads(r[4]) if r[4] else []
+            **({"summary": decode_result(r[4], summary=True)} if summary else {"findings": decode_result(r[4]) or []}),
+            "progress": 100 if r[2] in ("done", "failed") else (r[5] or 0),
+            "package_name": r[6],
+            "pack_version": r[7],
+            **(json.loads(r[8]) if r[8] else {})
         }
 
-def get_all_scans(limit=50):
+def get_findings_blob(scan_id):
+    """Statut et findings encore encodés d'un scan, lus ensuite par pages ou en flux."""
     with ENGINE.connect() as conn:
-        rows = conn.execute(
-            text("SELECT id, filename, status, created_at FROM crypto_scans ORDER BY created_at DESC LIMIT :limit"),
-            {"limit": limit}
-        ).fetchall()
-        
-        return [
-            {
-                "id": r[0],
-                "filename": r[1],
-                "status": r[2],
-                "created_at": r[3]
-            }
-            for r in rows
-        ]
+        r = conn.execute(text("SELECT status, findings_json FROM crypto_scans WHERE id=:id"), {"id": scan_id}).fetchone()
+    return {"status": r[0], "raw": r[1]} if r else None
+
+def get_all_scans(cursor=None, limit=PAGE_SIZE, status=None, package=None, since=None, until=None):
+    """Listing paginé (keyset) : retourne (scans, curseur de la page suivante ou None)."""
+    scans, next_cursor = keyset_page(
+        ENGINE, "crypto_scans", ["id", "filename", "package_name", "status", "created_at", *COUNT_COLUMNS],
+        filters={"status": status, "package_name": package},
+        since=since, until=until, cursor=cursor, limit=limit
+    )
+    return [unpack_counts(scan) for scan in scans], next_cursor
 
+def read_package_name(apk_path):
+    """Nom du package lu dans le manifeste binaire, sans construire d'objet APK."""
+    try:
+        with zipfile.ZipFile(apk_path) as zf:
+            return AXMLPrinter(zf.read("AndroidManifest.xml")).get_xml_obj().get("package")
+    except Exception:
+        return None
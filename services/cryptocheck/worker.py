@@ -0,0 +1,44 @@
+import os, traceback
+from utils import (ENGINE, init_db, claim_next_job, complete_scan, update_progress,
+                   store_cached_result, requeue_stale_jobs)
+from crypto_analyzer import analyze_crypto_issues, analyzer_version, current_pack
+from jobqueue import WorkerPool, run_worker
+
+SCAN_WORKERS = int(os.environ.get("SCAN_WORKERS", 2))
+
+def process_job(job):
+    upload_path = job["upload_path"]
+    job_id = job["id"]
+    try:
+        update_progress(job_id, 5)
+        # Pack fixé pour tout le scan, même si un autre est publié pendant l'analyse
+        pack = current_pack()
+        # 5% au démarrage, puis proportionnel au nombre de DEX traités
+        findings = analyze_crypto_issues(
+            upload_path,
+            progress=lambda done, total: update_progress(job_id, 5 + 90 * done / max(total, 1)),
+            pack=pack
+        )
+        complete_scan(job_id, "done", findings, pack_version=pack.id)
+        store_cached_result(job["sha256"], analyzer_version(pack), findings)
+    except Exception as e:
+        print(f"Analysis failed for {job_id}: {e}")
+        traceback.print_exc()
+        complete_scan(job_id, "failed", [], error={"error": str(e), "trace": traceback.format_exc()})
+    finally:
+        if upload_path and os.path.exists(upload_path):
+            try:
+                os.remove(upload_path)
+            except Exception as e:
+                print(f"Error deleting file {upload_path}: {e}")
+
+def _worker_main():
+    # Les connexions héritées du processus parent ne doivent pas être réutilisées
+    run_worker(claim_next_job, process_job, on_start=ENGINE.dispose)
+
+def start_pool(size=SCAN_WORKERS):
+    init_db()
+    requeue_stale_jobs()
+    # Appelé dans le master Gunicorn : aucune connexion ne doit être héritée par les forks
+    ENGINE.dispose()
+    return WorkerPool(size, _worker_main).start()
@@ -1,64 +1,16 @@
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 import os, uuid, json, datetime
-from utils import init_db, save_scan, get_scan_result, get_all_scans
+from utils import (init_db, save_scan, get_scan_result, get_all_scans,
+                   save_upload, get_cached_result, store_cached_result, PAGE_SIZE)
+from network_analyzer import analyze_network_behavior, ANALYZER_VERSION
 
 app = Flask(__name__)
-CORS(app)  # Enable CORS for all routes
+CORS(app, expose_headers=["X-Next-Cursor"])  # Enable CORS for all routes
 PORT = int(os.environ.get("PORT", 8004))
 
 init_db()
 
-# Simulateur d'analyse réseau (en production, utiliser mitmproxy avec AVD)
-def analyze_network_behavior(apk_info):
-    """
-    Simule l'analyse du comportement réseau.
-    En production, ceci lancerait un émulateur Android avec mitmproxy.
-    """
-    findings = []
-    
-    # Analyse basique basée sur les permissions et manifest
-    network_issues = [
-        {
-            "type": "CLEARTEXT_TRAFFIC",
-            "severity": "HIGH",
-            "cwe": "CWE-319",
-            "description": "Application autorise le trafic HTTP non chiffré",
-            "recommendation": "Désactiver cleartextTrafficPermitted dans network_security_config.xml",
-            "detected": False
-        },
-        {
-            "type": "WEAK_TLS",
-            "severity": "MEDIUM",
-            "cwe": "CWE-326",
-            "description": "Versions TLS faibles potentiellement supportées",
-            "recommendation": "Forcer TLS 1.2+ dans la configuration réseau",
-            "detected": False
-        },
-        {
-            "type": "CERTIFICATE_PINNING_MISSING",
-            "severity": "MEDIUM",
-            "cwe": "CWE-295",
-            "description": "Absence de certificate pinning",
-            "recommendation": "Implémenter le certificate pinning pour les domaines critiques",
-            "detected": True
-        },
-        {
-            "type": "HTTP_ENDPOINTS",
-            "severity": "HIGH",
-            "cwe": "CWE-319",
-            "description": "URLs HTTP détectées dans le code",
-            "recommendation": "Migrer tous les endpoints vers HTTPS",
-            "detected": False,
-            "urls": []
-        }
-    ]
-    
-    # En production, mitmproxy analyserait le trafic réel
-    # Ici on simule avec des heuristiques
-    
-    return [issue for issue in network_issues if issue.get("detected", True)]
-
 @app.route("/health")
 def health():
     return jsonify({"status": "ok", "service": "networkinspector"})
@@ -75,6 +27,9 @@ def scan():
     save_path = None
     try:
         apk_info = {}
+        sha256 = None
+        cached = None
+        job_id = "network-" + uuid.uuid4().hex
         
         # Cas 1: Upload de fichier
         if 'file' in request.files:
@@ -82,18 +37,22 @@ def scan():
             if f.filename == '':
                 return jsonify({"error": "no file selected"}), 400
             
-            # Sauvegarde temporaire pour analyse basique (package name)
-            filename = f.filename or f"{uuid.uuid4().hex}.apk"
-            temp_dir = tempfile.gettempdir()
-            save_path = os.path.join(temp_dir, filename)
-            f.save(save_path)
-            
-            try:
-                a = APK(save_path)
-                apk_info["package"] = a.get_package()
-            except Exception as e:
-                print(f"Error extracting info from APK: {e}")
-                apk_info["package"] = "unknown_parse_error"
+            # Sauvegarde temporaire pour analyse basique (package name) ;
+            # nommée d'après le job, jamais d'après le nom fourni par le client
+            save_path = os.path.join(tempfile.gettempdir(), f"{job_id}.apk")
+            sha256 = save_upload(f, save_path)
+
+            # APK identique déjà analysé : on évite le parsing
+            cached = get_cached_result(sha256, ANALYZER_VERSION)
+            if cached is not None:
+                apk_info["package"] = cached.get("package")
+            else:
+                try:
+                    a = APK(save_path)
+                    apk_info["package"] = a.get_package()
+                except Exception as e:
+                    print(f"Error extracting info from APK: {e}")
+                    apk_info["package"] = "unknown_parse_error"
                 
         # Cas 2: JSON metadata
         elif request.is_json:
@@ -102,12 +61,15 @@ def scan():
         else:
              return jsonify({"error": "Unsupported Media Type. Expected 'multipart/form-data' (file) or 'application/json'"}), 415
 
-        job_id = "network-" + uuid.uuid4().hex
-        
-        save_scan(job_id, apk_info.get("package", "unknown"), "running", [])
-        
-        # Analyse simulée
-        issues = analyze_network_behavior(apk_info)
+        # Analyse synchrone : seule la ligne finale est écrite (le client ne connaît
+        # le job_id qu'à la réponse, un état "running" intermédiaire n'est jamais lu)
+        if cached is not None:
+            issues = cached.get("findings", [])
+        else:
+            # Analyse simulée
+            issues = analyze_network_behavior(apk_info)
+            if sha256:
+                store_cached_result(sha256, ANALYZER_VERSION, {"package": apk_info.get("package"), "findings": issues})
         save_scan(job_id, apk_info.get("package", "unknown"), "done", issues)
         
         return jsonify({
@@ -115,7 +77,9 @@ def scan():
             "status": "done",
             "issues_count": len(issues),
             "note": "Network analysis simulated. Production version requires AVD + mitmproxy",
-            "package_name": apk_info.get("package", "unknown") 
+            "package_name": apk_info.get("package", "unknown"),
+            "cache_hit": cached is not None,
+            "sha256": sha256
         }), 200 # 202 is typical for async, but here we return result directly, or just job_id? Frontend waits for job_id then GETs it.
         # Frontend code: const response = await axios.post(...) then axios.get(...)
         # So returning 200 with job_id is fine.
@@ -132,18 +96,33 @@ def scan():
 
 @app.route("/scan/<job_id>", methods=["GET"])
 def get_result(job_id):
-    res = get_scan_result(job_id)
+    """?view=summary : résumé stocké (nombre de findings) sans décoder les findings."""
+    res = get_scan_result(job_id, summary=request.args.get("view") == "summary")
     if not res:
         return jsonify({"error": "not found"}), 404
     return jsonify(res)
 
 @app.route("/scans", methods=["GET"])
 def list_scans():
+    """Listing paginé : ?limit=&cursor=&status=&package=&since=&until= ;
+    le curseur de la page suivante est renvoyé dans l'en-tête X-Next-Cursor."""
     try:
-        scans = get_all_scans()
-        return jsonify(scans)
+        scans, next_cursor = get_all_scans(
+            cursor=request.args.get("cursor"),
+            limit=request.args.get("limit", PAGE_SIZE),
+            status=request.args.get("status"),
+            package=request.args.get("package"),
+            since=request.args.get("since"),
+            until=request.args.get("until")
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
+    response = jsonify(scans)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return response
 
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=PORT)
@@ -0,0 +1,52 @@
+# Clé de version du cache de résultats (uploads de fichiers uniquement)
+ANALYZER_VERSION = "networkinspector-1"
+
+# Simulateur d'analyse réseau (en production, utiliser mitmproxy avec AVD)
+def analyze_network_behavior(apk_info):
+    """
+    Simule l'analyse du comportement réseau.
+    En production, ceci lancerait un émulateur Android avec mitmproxy.
+    """
+    findings = []
+    
+    # Analyse basique basée sur les permissions et manifest
+    network_issues = [
+        {
+            "type": "CLEARTEXT_TRAFFIC",
+            "severity": "HIGH",
+            "cwe": "CWE-319",
+            "description": "Application autorise le trafic HTTP non chiffré",
+            "recommendation": "Désactiver cleartextTrafficPermitted dans network_security_config.xml",
+            "detected": False
+        },
+        {
+            "type": "WEAK_TLS",
+            "severity": "MEDIUM",
+            "cwe": "CWE-326",
+            "description": "Versions TLS faibles potentiellement supportées",
+            "recommendation": "Forcer TLS 1.2+ dans la configuration réseau",
+            "detected": False
+        },
+        {
+            "type": "CERTIFICATE_PINNING_MISSING",
+            "severity": "MEDIUM",
+            "cwe": "CWE-295",
+            "description": "Absence de certificate pinning",
+            "recommendation": "Implémenter le certificate pinning pour les domaines critiques",
+            "detected": True
+        },
+        {
+            "type": "HTTP_ENDPOINTS",
+            "severity": "HIGH",
+            "cwe": "CWE-319",
+            "description": "URLs HTTP détectées dans le code",
+            "recommendation": "Migrer tous les endpoints vers HTTPS",
+            "detected": False,
+            "urls": []
+        }
+    ]
+    
+    # En production, mitmproxy analyserait le trafic réel
+    # Ici on simule avec des heuristiques
+    
+    return [issue for issue in network_issues if issue.get("detected", True)]
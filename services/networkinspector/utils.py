@@ -1,8 +1,12 @@
-import os, datetime, json
-from sqlalchemy import create_engine, text
+import os, datetime, json, hashlib
+from sqlalchemy import text
+from storage import (create_sqlite_engine, ensure_list_indexes, keyset_page, PAGE_SIZE,
+                     COUNT_COLUMNS, count_findings, unpack_counts, backfill_counts,
+                     encode_result, decode_result)
 
 DB_PATH = os.environ.get("DB_PATH", "/app/storage.db")
-ENGINE = create_engine(f"sqlite:///{DB_PATH}", connect_args={"check_same_thread": False})
+ENGINE = create_sqlite_engine(DB_PATH)
+UPLOAD_CHUNK_SIZE = 1024 * 1024
 
 def init_db():
     with ENGINE.begin() as conn:
@@ -15,16 +19,64 @@ def init_db():
                 findings_json TEXT
             )
         """))
+        ensure_list_indexes(conn, "network_scans", ("status", "package_name"))
+        _ensure_columns(conn, "network_scans", COUNT_COLUMNS)
+        conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS result_cache (
+                sha256 TEXT,
+                version TEXT,
+                created_at TEXT,
+                result_json TEXT,
+                PRIMARY KEY (sha256, version)
+            )
+        """))
+    backfill_counts(ENGINE, "network_scans", "findings_json")
+
+
+def _ensure_columns(conn, table, columns):
+    existing = {r[1] for r in conn.execute(text(f"PRAGMA table_info({table})"))}
+    for name, ddl in columns.items():
+        if name not in existing:
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {ddl}"))
+
+def save_upload(file_storage, save_path):
+    """Écrit l'upload sur disque par blocs et retourne son SHA-256 calculé au passage."""
+    digest = hashlib.sha256()
+    with open(save_path, "wb") as out:
+        while True:
+            chunk = file_storage.stream.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+            out.write(chunk)
+    return digest.hexdigest()
+
+def get_cached_result(sha256, version):
+    """Retourne le résultat déjà calculé pour un APK identique, ou None."""
+    with ENGINE.connect() as conn:
+        r = conn.execute(
+            text("SELECT result_json FROM result_cache WHERE sha256=:sha AND version=:version"),
+            {"sha": sha256, "version": version}
+        ).fetchone()
+        return decode_result(r[0]) if r else None
+
+def store_cached_result(sha256, version, result):
+    with ENGINE.begin() as conn:
+        conn.execute(
+            text("INSERT OR REPLACE INTO result_cache (sha256, version, created_at, result_json) VALUES (:sha,:version,:created_at,:res)"),
+            {"sha": sha256, "version": version, "created_at": datetime.datetime.utcnow().isoformat(), "res": encode_result(result)}
+        )
 
 def save_scan(scan_id, package_name, status, findings):
     with ENGINE.begin() as conn:
-        res_json = json.dumps(findings, ensure_ascii=False)
+        res_blob = encode_result(findings)
         conn.execute(
-            text("INSERT OR REPLACE INTO network_scans (id, package_name, status, created_at, findings_json) VALUES (:id,:pkg,:status,:created_at,:res)"),
-            {"id": scan_id, "pkg": package_name, "status": status, "created_at": datetime.datetime.utcnow().isoformat(), "res": res_json}
+            text("INSERT OR REPLACE INTO network_scans (id, package_name, status, created_at, findings_json, critical_count, high_count, medium_count, low_count, type_counts) VALUES (:id,:pkg,:status,:created_at,:res,:critical_count,:high_count,:medium_count,:low_count,:type_counts)"),
+            {"id": scan_id, "pkg": package_name, "status": status, "created_at": datetime.datetime.utcnow().isoformat(), "res": res_blob, **count_findings(findings)}
         )
 
-def get_scan_result(scan_id):
+def get_scan_result(scan_id, summary=False):
+    """Détail d'un scan ; summary=True renvoie le résumé stocké au lieu des findings (rien n'est décompressé)."""
     with ENGINE.connect() as conn:
         r = conn.execute(text("SELECT id, package_name, status, created_at, findings_json FROM network_scans WHERE id=:id"), {"id": scan_id}).fetchone()
         if not r: return None
@@ -33,23 +85,14 @@ def get_scan_result(scan_id):
             "package_name": r[1],
             "status": r[2],
             "created_at": r[3],
-            "findings": json.loads(r[4]) if r[4] else []
+            **({"summary": decode_result(r[4], summary=True)} if summary else {"findings": decode_result(r[4]) or []})
         }
 
-def get_all_scans(limit=50):
-    with ENGINE.connect() as conn:
-        rows = conn.execute(
-            text("SELECT id, package_name, status, created_at FROM network_scans ORDER BY created_at DESC LIMIT :limit"),
-            {"limit": limit}
-        ).fetchall()
-        
-        return [
-            {
-                "id": r[0],
-                "package_name": r[1],
-                "status": r[2],
-                "created_at": r[3]
-            }
-            for r in rows
-        ]
-
+def get_all_scans(cursor=None, limit=PAGE_SIZE, status=None, package=None, since=None, until=None):
+    """Listing paginé (keyset) : retourne (scans, curseur de la page suivante ou None)."""
+    scans, next_cursor = keyset_page(
+        ENGINE, "network_scans", ["id", "package_name", "status", "created_at", *COUNT_COLUMNS],
+        filters={"status": status, "package_name": package},
+        since=since, until=until, cursor=cursor, limit=limit
+    )
+    return [unpack_counts(scan) for scan in scans], next_cursor
@@ -0,0 +1,151 @@
+from flask import Flask, request, jsonify
+from flask_cors import CORS
+import os, sys, uuid, traceback
+from concurrent.futures import ThreadPoolExecutor
+
+# Dans l'image Docker, les modules d'analyse des autres services sont copiés à côté
+# de ce fichier. En local, on les importe directement depuis les dossiers voisins.
+SERVICES_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for service in ("apkscanner", "secrethunter", "cryptocheck", "networkinspector", "aiscanner"):
+    service_dir = os.path.join(SERVICES_DIR, service)
+    if os.path.isdir(service_dir) and service_dir not in sys.path:
+        sys.path.append(service_dir)
+
+from androguard.core.apk import APK
+from androguard.core.dex import DEX
+from utils import init_db, save_upload, save_job, get_job, get_all_jobs, PAGE_SIZE
+from manifest_analyzer import analyze_manifest
+from secret_analyzer import scan_dex_list
+from crypto_analyzer import analyze_dex_list
+from network_analyzer import analyze_network_behavior
+from permission_model import predict_permissions
+
+app = Flask(__name__)
+CORS(app, expose_headers=["X-Next-Cursor"])  # Enable CORS for all routes
+PORT = int(os.environ.get("PORT", 8008))
+STORAGE_DIR = os.environ.get("APK_STORAGE_DIR", "/app/uploads")
+os.makedirs(STORAGE_DIR, exist_ok=True)
+
+init_db()
+
+class ParsedApk:
+    """APK et fichiers DEX parsés une seule fois, partagés par tous les analyseurs."""
+
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self.apk = APK(filepath)
+        self.dex = []
+        for dex_bytes in self.apk.get_all_dex():
+            try:
+                self.dex.append(DEX(dex_bytes))
+            except Exception as e:
+                print(f"Error processing DEX: {e}")
+        self.package = self.apk.get_package()
+        self.permissions = sorted(self.apk.get_permissions() or [])
+
+# Chaque analyseur reçoit le modèle partagé ; les clés correspondent aux noms des services
+ANALYZERS = {
+    "apkscanner": lambda parsed: analyze_manifest(parsed.apk),
+    "secrethunter": lambda parsed: scan_dex_list(parsed.dex, apk_path=parsed.filepath),
+    "cryptocheck": lambda parsed: analyze_dex_list(parsed.dex),
+    "networkinspector": lambda parsed: analyze_network_behavior({"package": parsed.package}),
+    "aiscanner": lambda parsed: predict_permissions(parsed.permissions),
+}
+
+def run_analyzers(parsed):
+    """Lance tous les analyseurs en parallèle ; l'échec de l'un n'annule pas les autres."""
+    results, errors = {}, {}
+    with ThreadPoolExecutor(max_workers=len(ANALYZERS)) as pool:
+        futures = {name: pool.submit(fn, parsed) for name, fn in ANALYZERS.items()}
+        for name, future in futures.items():
+            try:
+                results[name] = future.result()
+            except Exception as e:
+                print(f"Analyzer {name} failed: {e}")
+                traceback.print_exc()
+                errors[name] = str(e)
+    return results, errors
+
+@app.route("/health")
+def health():
+    return jsonify({"status": "ok", "service": "orchestrator"})
+
+@app.route("/scan", methods=["POST"])
+def scan():
+    """Un seul upload, un seul parsing, tous les analyseurs, un seul job_id."""
+    save_path = None
+    try:
+        if 'file' not in request.files:
+            return jsonify({"error": "no file provided"}), 400
+
+        f = request.files['file']
+        filename = f.filename or f"{uuid.uuid4().hex}.apk"
+        save_path = os.path.join(STORAGE_DIR, f"{uuid.uuid4().hex}.apk")
+        sha256 = save_upload(f, save_path)
+
+        # Traitement synchrone : le job_id n'est connu du client qu'à la réponse,
+        # seule la ligne finale (done/failed) est écrite
+        job_id = "scan-" + uuid.uuid4().hex
+
+        try:
+            parsed = ParsedApk(save_path)
+        except Exception as e:
+            save_job(job_id, filename, None, sha256, "failed", {"error": str(e)})
+            return jsonify({"job_id": job_id, "status": "failed", "error": str(e)}), 500
+
+        results, errors = run_analyzers(parsed)
+        if errors:
+            results["errors"] = errors
+        save_job(job_id, filename, parsed.package, sha256, "done", results)
+
+        return jsonify({
+            "job_id": job_id,
+            "status": "done",
+            "package_name": parsed.package,
+            "sha256": sha256,
+            "analyzers": sorted(name for name in ANALYZERS if name not in errors),
+            "failed_analyzers": sorted(errors)
+        }), 200
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    finally:
+        if save_path and os.path.exists(save_path):
+            os.remove(save_path)
+
+@app.route("/scan/<job_id>", methods=["GET"])
+def get_result(job_id):
+    """?view=summary : résumé stocké ; ?section=<clé> (répétable) : ces seules sections du résultat.
+    Les autres sections ne sont pas décompressées."""
+    try:
+        res = get_job(job_id, sections=request.args.getlist("section"), summary=request.args.get("view") == "summary")
+    except KeyError as e:
+        return jsonify({"error": f"unknown section: {e.args[0]}"}), 400
+    if not res:
+        return jsonify({"error": "not found"}), 404
+    return jsonify(res)
+
+@app.route("/scans", methods=["GET"])
+def list_scans():
+    """Listing paginé : ?limit=&cursor=&status=&package=&since=&until= ;
+    le curseur de la page suivante est renvoyé dans l'en-tête X-Next-Cursor."""
+    try:
+        scans, next_cursor = get_all_jobs(
+            cursor=request.args.get("cursor"),
+            limit=request.args.get("limit", PAGE_SIZE),
+            status=request.args.get("status"),
+            package=request.args.get("package"),
+            since=request.args.get("since"),
+            until=request.args.get("until")
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    response = jsonify(scans)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return response
+
+if __name__ == "__main__":
+    app.run(host="0.0.0.0", port=PORT)
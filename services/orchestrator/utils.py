@@ -0,0 +1,73 @@
+import os, datetime, json, hashlib
+from sqlalchemy import text
+from storage import create_sqlite_engine, ensure_list_indexes, keyset_page, encode_result, decode_result, PAGE_SIZE
+
+DB_PATH = os.environ.get("DB_PATH", "/app/storage.db")
+ENGINE = create_sqlite_engine(DB_PATH)
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+def init_db():
+    with ENGINE.begin() as conn:
+        conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS orchestrated_scans (
+                id TEXT PRIMARY KEY,
+                filename TEXT,
+                package_name TEXT,
+                sha256 TEXT,
+                status TEXT,
+                created_at TEXT,
+                result_json TEXT
+            )
+        """))
+        ensure_list_indexes(conn, "orchestrated_scans", ("status", "package_name"))
+
+def save_upload(file_storage, save_path):
+    """Écrit l'upload sur disque par blocs et retourne son SHA-256 calculé au passage."""
+    digest = hashlib.sha256()
+    with open(save_path, "wb") as out:
+        while True:
+            chunk = file_storage.stream.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+            out.write(chunk)
+    return digest.hexdigest()
+
+def save_job(job_id, filename, package_name, sha256, status, result):
+    with ENGINE.begin() as conn:
+        res_blob = encode_result(result)
+        conn.execute(
+            text("INSERT OR REPLACE INTO orchestrated_scans (id, filename, package_name, sha256, status, created_at, result_json) VALUES (:id,:filename,:pkg,:sha,:status,:created_at,:res)"),
+            {"id": job_id, "filename": filename, "pkg": package_name, "sha": sha256, "status": status, "created_at": datetime.datetime.utcnow().isoformat(), "res": res_blob}
+        )
+
+def get_job(job_id, sections=None, summary=False):
+    """Détail d'un job. Seules les parties demandées des résultats sont décompressées :
+    summary=True renvoie le résumé stocké, sections=["apkscanner", ...] ces seuls analyseurs
+    (KeyError si l'un d'eux est absent)."""
+    with ENGINE.connect() as conn:
+        r = conn.execute(text("SELECT id, filename, package_name, sha256, status, created_at, result_json FROM orchestrated_scans WHERE id=:id"), {"id": job_id}).fetchone()
+        if not r: return None
+        job = {
+            "id": r[0],
+            "filename": r[1],
+            "package_name": r[2],
+            "sha256": r[3],
+            "status": r[4],
+            "created_at": r[5]
+        }
+    if summary:
+        job["summary"] = decode_result(r[6], summary=True) or {}
+    elif sections:
+        job["results"] = {name: decode_result(r[6], section=name) for name in sections}
+    else:
+        job["results"] = decode_result(r[6]) or {}
+    return job
+
+def get_all_jobs(cursor=None, limit=PAGE_SIZE, status=None, package=None, since=None, until=None):
+    """Listing paginé (keyset) : retourne (scans, curseur de la page suivante ou None)."""
+    return keyset_page(
+        ENGINE, "orchestrated_scans", ["id", "filename", "package_name", "status", "created_at"],
+        filters={"status": status, "package_name": package},
+        since=since, until=until, cursor=cursor, limit=limit
+    )
@@ -16,7 +16,8 @@ const SERVICES = {
     apkscanner: process.env.APKSCANNER_URL || 'http://apkscanner:8001',
     secrethunter: process.env.SECRETHUNTER_URL || 'http://secrethunter:8002',
     cryptocheck: process.env.CRYPTOCHECK_URL || 'http://cryptocheck:8003',
-    networkinspector: process.env.NETWORKINSPECTOR_URL || 'http://networkinspector:8004'
+    networkinspector: process.env.NETWORKINSPECTOR_URL || 'http://networkinspector:8004',
+    orchestrator: process.env.ORCHESTRATOR_URL || 'http://orchestrator:8008'
 };
 
 app.get('/health', (req, res) => {
@@ -28,8 +29,8 @@ app.post('/generate', async (req, res) => {
     try {
         const { job_ids } = req.body;
         
-        if (!job_ids || !job_ids.apkscanner) {
-            return res.status(400).json({ error: 'Missing apkscanner job_id' });
+        if (!job_ids || (!job_ids.apkscanner && !job_ids.orchestrator)) {
+            return res.status(400).json({ error: 'Missing apkscanner or orchestrator job_id' });
         }
 
         // Récupération des résultats de chaque service
@@ -40,11 +41,27 @@ app.post('/generate', async (req, res) => {
             network: null
         };
 
-        try {
-            const apkRes = await axios.get(`${SERVICES.apkscanner}/scan/${job_ids.apkscanner}`);
-            results.apk = apkRes.data;
-        } catch (e) {
-            console.error('APKScanner error:', e.message);
+        // Scan orchestré : un seul job contient les résultats de tous les analyseurs
+        if (job_ids.orchestrator) {
+            try {
+                const orchRes = await axios.get(`${SERVICES.orchestrator}/scan/${job_ids.orchestrator}`);
+                const combined = orchRes.data.results || {};
+                results.apk = { filename: orchRes.data.filename, status: orchRes.data.status, result: combined.apkscanner };
+                results.secrets = { findings: combined.secrethunter || [] };
+                results.crypto = { findings: combined.cryptocheck || [] };
+                results.network = { findings: combined.networkinspector || [] };
+            } catch (e) {
+                console.error('Orchestrator error:', e.message);
+            }
+        }
+
+        if (job_ids.apkscanner) {
+            try {
+                const apkRes = await axios.get(`${SERVICES.apkscanner}/scan/${job_ids.apkscanner}`);
+                results.apk = apkRes.data;
+            } catch (e) {
+                console.error('APKScanner error:', e.message);
+            }
         }
 
         if (job_ids.secrethunter) {
@@ -1,53 +1,27 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response
 from flask_cors import CORS
-import os, uuid, re, hashlib, traceback
-from androguard.core.apk import APK
-from androguard.core.dex import DEX
-from utils import init_db, save_result, get_result, get_all_scans
-from signatures import scan_string
+import os, io, csv, json, uuid, re, hmac, hashlib, traceback
+from utils import (init_db, save_result, get_result, get_all_scans,
+                   save_upload, get_cached_result, enqueue_scan, read_package_name, PAGE_SIZE,
+                   get_findings_blob, findings_page, iter_findings, decode_result,
+                   hash_secret, lookup_secret, rotation_report, link_corpus_from_sha,
+                   pending_rules, create_sweep, get_sweep, corpus_stats, register_pack_rules)
+from secret_analyzer import analyzer_version
+from signatures import SECRET_PACK, current_pack
+from rulepack import PackError
+from string_cache import get_cache
+from ruleprofile import get_profiler
 
 app = Flask(__name__)
-CORS(app)  # Enable CORS for all routes
+CORS(app, expose_headers=["X-Next-Cursor"])  # Enable CORS for all routes
 PORT = int(os.environ.get("PORT", 8002)) # Port 8002 pour SecretHunter
 STORAGE_DIR = "/app/uploads"
+# Jeton des routes /admin ; vide : routes désactivées
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN", "")
 os.makedirs(STORAGE_DIR, exist_ok=True)
 
 init_db()
 
-def extract_and_scan(filepath):
-    """Extrait les chaînes du DEX et des ressources XML et les scanne."""
-    findings = []
-    try:
-        a = APK(filepath)
-        
-        # Scan du code (Classes.dex) - C'est là que sont les secrets hardcodés
-        for dex_bytes in a.get_all_dex():
-            try:
-                d = DEX(dex_bytes)
-                # d.get_strings() retourne toutes les constantes string du code
-                for s in d.get_strings():
-                    if s and len(s) > 5: # Ignore les chaines trop courtes
-                        res = scan_string(s)
-                        if res:
-                            findings.extend(res)
-            except Exception as e:
-                print(f"Error processing DEX: {e}")
-                        
-    except Exception as e:
-        print(f"Error extracting APK: {e}")
-        traceback.print_exc()
-        
-    # Déduplication des résultats
-    unique_findings = []
-    seen = set()
-    for f in findings:
-        identifier = f"{f['type']}:{f['value']}"
-        if identifier not in seen:
-            unique_findings.append(f)
-            seen.add(identifier)
-            
-    return unique_findings
-
 @app.route("/health")
 def health():
     return jsonify({"status": "ok", "service": "secrethunter"})
@@ -55,43 +29,237 @@ def health():
 @app.route("/scan", methods=["POST"])
 def scan():
     save_path = None
+    queued = False
     try:
         if 'file' not in request.files:
             return jsonify({"error": "no file provided"}), 400
         f = request.files['file']
         filename = f.filename or f"{uuid.uuid4().hex}.apk"
-        save_path = os.path.join(STORAGE_DIR, filename)
-        f.save(save_path)
-
         job_id = "secret-" + uuid.uuid4().hex
-        save_result(job_id, filename, "running", [])
+        save_path = os.path.join(STORAGE_DIR, f"{job_id}.apk")
+        sha256 = save_upload(f, save_path)
+        package_name = read_package_name(save_path)
 
-        # Analyse synchrone (pour MVP)
-        secrets = extract_and_scan(save_path)
-        save_result(job_id, filename, "done", secrets)
+        # APK identique déjà analysé avec les mêmes signatures
+        pack = current_pack()
+        cached = get_cached_result(sha256, analyzer_version(pack))
+        if cached is not None:
+            save_result(job_id, filename, "done", cached, package_name, sha256, pack_version=pack.id)
+            link_corpus_from_sha(job_id, sha256)
+            return jsonify({"job_id": job_id, "status": "done", "secrets_count": len(cached), "cache_hit": True, "sha256": sha256}), 200
 
-        return jsonify({"job_id": job_id, "status": "done", "secrets_count": len(secrets)}), 200
+        # Analyse asynchrone : le pool de workers (worker.py) traite la file
+        enqueue_scan(job_id, filename, save_path, sha256, package_name)
+        queued = True
+
+        return jsonify({"job_id": job_id, "status": "queued", "cache_hit": False, "sha256": sha256}), 202
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
     finally:
-        if save_path and os.path.exists(save_path):
+        # Un job en file garde son fichier : le worker le supprime après analyse
+        if not queued and save_path and os.path.exists(save_path):
             os.remove(save_path)
 
 @app.route("/scan/<job_id>", methods=["GET"])
 def get_scan(job_id):
-    res = get_result(job_id)
+    """?view=summary : résumé stocké (nombre de findings) sans décoder les findings."""
+    res = get_result(job_id, summary=request.args.get("view") == "summary")
     if not res:
         return jsonify({"error": "not found"}), 404
     return jsonify(res)
 
+@app.route("/scan/<job_id>/findings", methods=["GET"])
+def list_findings(job_id):
+    """Findings paginés : ?limit=&offset=&cursor=&type=&severity= (type et severity répétables) ;
+    le curseur de la page suivante est aussi renvoyé dans l'en-tête X-Next-Cursor.
+    ?format=ndjson : tous les findings filtrés en flux, un objet JSON par ligne,
+    décodés tranche par tranche (mémoire constante quelle que soit la taille du résultat)."""
+    scan = get_findings_blob(job_id)
+    if not scan:
+        return jsonify({"error": "not found"}), 404
+    types = request.args.getlist("type")
+    severities = request.args.getlist("severity")
+
+    if request.args.get("format") == "ndjson":
+        lines = (json.dumps(f, ensure_ascii=False) + "\n" for f in iter_findings(scan["raw"], types, severities))
+        return Response(lines, mimetype="application/x-ndjson")
+
+    try:
+        findings, next_cursor = findings_page(
+            scan["raw"],
+            offset=request.args.get("offset", 0),
+            cursor=request.args.get("cursor"),
+            limit=request.args.get("limit", PAGE_SIZE),
+            types=types, severities=severities
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    response = jsonify({
+        "id": job_id,
+        "status": scan["status"],
+        "total": (decode_result(scan["raw"], summary=True) or {}).get("count", 0),
+        "findings": findings,
+        "next_cursor": next_cursor
+    })
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return response
+
+SECRET_HASH = re.compile(r"^[0-9a-f]{64}$")
+
+def _requested_secret_hash():
+    """Hash demandé : paramètre hash (SHA-256) ou value (haché ici).
+    En POST, le corps JSON évite que la valeur apparaisse dans les journaux d'accès."""
+    params = (request.get_json(silent=True) or {}) if request.method == "POST" else request.args
+    if params.get("value"):
+        return hash_secret(params["value"])
+    value_hash = str(params.get("hash") or "").lower()
+    return value_hash if SECRET_HASH.match(value_hash) else None
+
+@app.route("/secrets/lookup", methods=["GET", "POST"])
+def secret_lookup():
+    """Tous les scans contenant un secret donné (recherche dans l'index, sans décoder les findings)."""
+    value_hash = _requested_secret_hash()
+    if not value_hash:
+        return jsonify({"error": "value or hash (sha256) required"}), 400
+    occurrences = lookup_secret(value_hash)
+    return jsonify({"value_hash": value_hash, "count": len(occurrences), "occurrences": occurrences})
+
+@app.route("/secrets/report", methods=["GET", "POST"])
+def secret_rotation_report():
+    """Rapport de rotation : builds touchés par package, et si le dernier build contient
+    encore le secret. ?format=csv : une ligne par build."""
+    value_hash = _requested_secret_hash()
+    if not value_hash:
+        return jsonify({"error": "value or hash (sha256) required"}), 400
+    report = rotation_report(value_hash)
+    if request.args.get("format") != "csv":
+        return jsonify(report)
+
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(["package_name", "scan_id", "created_at", "types", "still_present"])
+    for package in report["packages"]:
+        for build in package["builds"]:
+            writer.writerow([package["package_name"], build["scan_id"], build["created_at"],
+                             " ".join(package["types"]), package["still_present"]])
+    return Response(out.getvalue(), mimetype="text/csv",
+                    headers={"Content-Disposition": f"attachment; filename=rotation-{value_hash[:12]}.csv"})
+
+@app.route("/sweeps", methods=["POST"])
+def start_sweep():
+    """Balayage du corpus de chaînes des scans passés avec des signatures nouvelles ou modifiées.
+    Corps JSON optionnel {"rules": [noms]} ; par défaut, les signatures pas encore rejouées."""
+    pack = current_pack()
+    rules = (request.get_json(silent=True) or {}).get("rules") or pending_rules(pack)
+    if not isinstance(rules, list):
+        return jsonify({"error": "rules must be a list of signature names"}), 400
+    unknown = sorted(set(rules) - set(pack.rule_versions))
+    if unknown:
+        return jsonify({"error": f"unknown rules: {', '.join(unknown)}"}), 400
+    if not rules:
+        return jsonify({"error": "no pending rules to sweep"}), 400
+    sweep_id = create_sweep(rules, pack.digest)
+    return jsonify({"sweep_id": sweep_id, "status": "queued", "rules": sorted(rules), "pack_version": pack.id}), 202
+
+@app.route("/sweeps/<sweep_id>", methods=["GET"])
+def sweep_status(sweep_id):
+    sweep = get_sweep(sweep_id)
+    if not sweep:
+        return jsonify({"error": "not found"}), 404
+    return jsonify(sweep)
+
+@app.route("/corpus", methods=["GET"])
+def corpus_info():
+    return jsonify({**corpus_stats(), "pending_rules": pending_rules()})
+
+@app.route("/cache/strings", methods=["GET"])
+def string_cache_stats():
+    cache = get_cache(current_pack().digest)
+    if cache is None:
+        return jsonify({"enabled": False})
+    return jsonify({"enabled": True, **cache.stats()})
+
+@app.route("/profile/rules", methods=["GET", "DELETE"])
+def rule_profile():
+    """Coût de chaque signature du pack actif (RULE_PROFILING=1) : évaluations, temps cumulé,
+    taux de match, pire cas. DELETE : remise à zéro (jeton d'administration requis)."""
+    pack = current_pack()
+    profiler = get_profiler(pack.digest)
+    if profiler is None:
+        return jsonify({"enabled": False})
+    if request.method == "DELETE":
+        if not _admin_authorized():
+            return jsonify({"error": "forbidden"}), 403
+        profiler.reset()
+    return jsonify({"enabled": True, "pack_version": pack.id, "rules": profiler.stats()})
+
+def _admin_authorized():
+    """Jeton attendu dans X-Admin-Token ou Authorization: Bearer <jeton>."""
+    if not ADMIN_TOKEN:
+        return False
+    supplied = request.headers.get("X-Admin-Token") or request.headers.get("Authorization", "").removeprefix("Bearer ").strip()
+    return hmac.compare_digest(supplied.encode("utf-8"), ADMIN_TOKEN.encode("utf-8"))
+
+def _pack_response(pack, previous=None):
+    if previous is not None and pack.digest != previous.digest:
+        # Nouvelles signatures : en attente de balayage du corpus ; verdicts en cache périmés
+        register_pack_rules(pack)
+        cache = get_cache(pack.digest)
+        if cache is not None:
+            cache.purge_other_versions()
+    return jsonify({**pack.info(), "published": SECRET_PACK.is_published(), "pending_rules": pending_rules(pack)})
+
+@app.route("/admin/packs", methods=["GET", "PUT", "DELETE"])
+def admin_packs():
+    """Pack de signatures actif. PUT : publie le pack JSON du corps (validé, appliqué à tous
+    les processus sans redémarrage ; les scans en cours gardent leur pack).
+    DELETE : retour au pack embarqué dans l'image."""
+    if not _admin_authorized():
+        return jsonify({"error": "forbidden"}), 403
+    previous = current_pack()
+    if request.method == "PUT":
+        try:
+            return _pack_response(SECRET_PACK.publish(request.get_data()), previous)
+        except PackError as e:
+            return jsonify({"error": str(e)}), 400
+    if request.method == "DELETE":
+        return _pack_response(SECRET_PACK.reset(), previous)
+    return _pack_response(previous)
+
+@app.route("/admin/packs/reload", methods=["POST"])
+def admin_reload_pack():
+    """Relit immédiatement le pack publié (fichier remplacé directement dans PACK_DIR)."""
+    if not _admin_authorized():
+        return jsonify({"error": "forbidden"}), 403
+    previous = current_pack()
+    return _pack_response(SECRET_PACK.reload(), previous)
+
 @app.route("/scans", methods=["GET"])
 def list_scans():
+    """Listing paginé : ?limit=&cursor=&status=&package=&since=&until= ;
+    le curseur de la page suivante est renvoyé dans l'en-tête X-Next-Cursor."""
     try:
-        scans = get_all_scans()
-        return jsonify(scans)
+        scans, next_cursor = get_all_scans(
+            cursor=request.args.get("cursor"),
+            limit=request.args.get("limit", PAGE_SIZE),
+            status=request.args.get("status"),
+            package=request.args.get("package"),
+            since=request.args.get("since"),
+            until=request.args.get("until")
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
+    response = jsonify(scans)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return response
 
 if __name__ == "__main__":
+    # En développement, le pool de workers tourne à côté du serveur Flask
+    from worker import start_pool
+    start_pool()
     app.run(host="0.0.0.0", port=PORT)
\ No newline at end of file
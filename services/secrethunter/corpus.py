@@ -0,0 +1,152 @@
+import os, json, zlib, hashlib, heapq, tempfile
+from collections import OrderedDict
+from signatures import pack_for, scan_string
+from ruleprofile import get_profiler
+
+# Corpus de chaînes : les chaînes extraites de chaque DEX sont conservées après le scan
+# (l'APK, lui, est supprimé), pour rejouer de nouvelles signatures sur les scans passés.
+# Stockage adressé par contenu : un fichier par ensemble de chaînes, nommé par son SHA-256,
+# si bien qu'un DEX identique d'un build à l'autre (bibliothèques...) n'est stocké qu'une fois.
+# CORPUS_DIR vide : corpus désactivé.
+CORPUS_DIR = os.environ.get("CORPUS_DIR", "/app/storage/corpus")
+COMPRESSION_LEVEL = 6
+# Chaînes distinctes gardées en mémoire par écrivain : au-delà, elles sont triées et
+# déversées dans un fichier temporaire (run), fusionné avec les autres à la fermeture
+CORPUS_RUN_SIZE = int(os.environ.get("CORPUS_RUN_SIZE", 100000))
+WRITE_CHUNK_SIZE = 1024 * 1024
+# Matchers des balayages gardés par processus (un par pack et jeu de signatures)
+SWEEP_MATCHERS = int(os.environ.get("SWEEP_MATCHERS", 8))
+
+def corpus_enabled():
+    return bool(CORPUS_DIR)
+
+def _blob_path(blob_hash):
+    return os.path.join(CORPUS_DIR, blob_hash[:2], blob_hash)
+
+class CorpusWriter:
+    """Enregistre un ensemble de chaînes au fil de l'eau, en mémoire bornée.
+
+    Le blob est le tableau JSON des chaînes distinctes triées (compressé), nommé par le
+    SHA-256 du JSON : chaque chaîne ajoutée est dédupliquée dans un tampon de
+    CORPUS_RUN_SIZE chaînes, déversé trié dans un fichier temporaire quand il est plein ;
+    close() fusionne les runs et écrit le JSON en flux, sans jamais tout charger.
+    """
+
+    def __init__(self, run_size=CORPUS_RUN_SIZE):
+        self.run_size = run_size
+        self._buffer = set()
+        self._runs = []
+
+    def add(self, s):
+        self._buffer.add(s)
+        if len(self._buffer) >= self.run_size:
+            self._spill()
+
+    def _spill(self):
+        os.makedirs(CORPUS_DIR, exist_ok=True)
+        run = tempfile.TemporaryFile(mode="w+", encoding="utf-8", dir=CORPUS_DIR)
+        # Une chaîne JSON par ligne : les retours à la ligne des chaînes sont échappés
+        run.writelines(json.dumps(s) + "\n" for s in sorted(self._buffer))
+        run.seek(0)
+        self._runs.append(run)
+        self._buffer = set()
+
+    def _sorted_strings(self):
+        runs = [(json.loads(line) for line in run) for run in self._runs]
+        previous = None
+        for s in heapq.merge(sorted(self._buffer), *runs):
+            if s != previous:
+                yield s
+                previous = s
+
+    def close(self):
+        """Écrit le blob (atomiquement : fichier temporaire puis renommage) et retourne
+        son empreinte, ou None si aucune chaîne n'a été ajoutée. Deux écrivains
+        concurrents du même contenu produisent le même fichier."""
+        try:
+            if not self._buffer and not self._runs:
+                return None
+            os.makedirs(CORPUS_DIR, exist_ok=True)
+            digest = hashlib.sha256()
+            compressor = zlib.compressobj(COMPRESSION_LEVEL)
+            fd, tmp_path = tempfile.mkstemp(dir=CORPUS_DIR)
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    # Mêmes octets que json.dumps(liste, ensure_ascii=False)
+                    pending = [b"["]
+                    size = 1
+                    for i, s in enumerate(self._sorted_strings()):
+                        data = (", " if i else "").encode("utf-8") + json.dumps(s, ensure_ascii=False).encode("utf-8")
+                        pending.append(data)
+                        size += len(data)
+                        if size >= WRITE_CHUNK_SIZE:
+                            chunk = b"".join(pending)
+                            digest.update(chunk)
+                            f.write(compressor.compress(chunk))
+                            pending, size = [], 0
+                    pending.append(b"]")
+                    chunk = b"".join(pending)
+                    digest.update(chunk)
+                    f.write(compressor.compress(chunk))
+                    f.write(compressor.flush())
+                blob_hash = digest.hexdigest()
+                path = _blob_path(blob_hash)
+                if os.path.exists(path):
+                    os.remove(tmp_path)
+                else:
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    os.replace(tmp_path, path)
+                return blob_hash
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+        finally:
+            self.discard()
+
+    def discard(self):
+        for run in self._runs:
+            run.close()
+        self._runs = []
+        self._buffer = set()
+
+def load_strings(blob_hash):
+    with open(_blob_path(blob_hash), "rb") as f:
+        return json.loads(zlib.decompress(f.read()))
+
+# (empreinte du pack, signatures) -> matcher compilé, du moins au plus récemment utilisé
+_matchers = OrderedDict()
+
+def _sweep_matcher(pack_digest, rule_names):
+    key = (pack_digest, tuple(sorted(rule_names)))
+    matcher = _matchers.get(key)
+    if matcher is None:
+        matcher = _matchers[key] = pack_for(pack_digest).build_matcher(set(rule_names))
+        while len(_matchers) > SWEEP_MATCHERS:
+            _matchers.popitem(last=False)
+    else:
+        _matchers.move_to_end(key)
+    return matcher
+
+def sweep_blobs(blob_hashes, rule_names, pack_digest):
+    """Rejoue les signatures nommées d'un pack sur des ensembles de chaînes du corpus ;
+    exécuté dans un processus du pool. Retourne {blob_hash: [findings]} (blobs avec findings)."""
+    matcher = _sweep_matcher(pack_digest, rule_names)
+    profiler = get_profiler(pack_digest)
+
+    results = {}
+    for blob_hash in blob_hashes:
+        try:
+            strings = load_strings(blob_hash)
+        except Exception as e:
+            print(f"Corpus blob {blob_hash} unreadable: {e}")
+            continue
+        findings = []
+        # Préfiltre en une passe sur tout le blob, regex uniquement sur les chaînes retenues
+        for s in matcher.select(strings):
+            findings.extend(scan_string(s, matcher, profiler))
+        if findings:
+            results[blob_hash] = findings
+    if profiler is not None:
+        profiler.flush()
+    return results
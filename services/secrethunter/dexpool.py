@@ -0,0 +1,49 @@
+import os, re, zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+# Analyse parallèle des classes*.dex d'un même APK, dans un pool de processus borné.
+# Le pool est créé à la première utilisation puis réutilisé d'un scan à l'autre.
+DEX_ENTRY = re.compile(r"^classes\d*\.dex$")
+DEX_WORKERS = int(os.environ.get("DEX_WORKERS", os.cpu_count() or 1))
+
+_pool = None
+
+def list_dex_entries(apk_path):
+    with zipfile.ZipFile(apk_path) as zf:
+        return [info.filename for info in zf.infolist() if DEX_ENTRY.match(info.filename)]
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=DEX_WORKERS)
+    return _pool
+
+def map_dex(fn, tasks, progress=None):
+    """Exécute fn(*task) pour chaque DEX et retourne les résultats dans l'ordre des tâches.
+
+    fn doit être une fonction de module (sérialisable) qui gère ses propres erreurs.
+    progress(done, total) est appelé à chaque DEX terminé, si fourni.
+    """
+    global _pool
+    results = [None] * len(tasks)
+
+    # Un seul DEX (ou pool désactivé) : pas de coût de sérialisation inutile
+    if DEX_WORKERS <= 1 or len(tasks) <= 1:
+        for i, task in enumerate(tasks):
+            results[i] = fn(*task)
+            if progress:
+                progress(i + 1, len(tasks))
+        return results
+
+    try:
+        futures = {_get_pool().submit(fn, *task): i for i, task in enumerate(tasks)}
+        for done, future in enumerate(as_completed(futures), 1):
+            results[futures[future]] = future.result()
+            if progress:
+                progress(done, len(tasks))
+    except BrokenProcessPool:
+        # Un processus du pool est mort (OOM...) : il sera recréé au prochain scan
+        _pool = None
+        raise
+    return results
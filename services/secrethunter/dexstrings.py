@@ -0,0 +1,70 @@
+import mmap, shutil, struct, tempfile, zipfile
+from contextlib import contextmanager
+
+# Lecture directe de la table des chaînes d'un DEX, sans construire d'objet DEX :
+# seuls le header, la section string_ids et les string_data_item sont lus.
+DEX_MAGIC = b"dex\n"
+STRING_IDS_HEADER = 0x38  # string_ids_size (uint32) puis string_ids_off (uint32)
+ZIP_LOCAL_HEADER_SIZE = 30
+COPY_BUFFER_SIZE = 1024 * 1024
+
+def _decode_mutf8(raw):
+    """Décode du MUTF-8 (NUL sur deux octets, caractères hors BMP en paires de surrogates)."""
+    try:
+        # Cas très majoritaire : ASCII / UTF-8 standard
+        return raw.decode("utf-8")
+    except UnicodeDecodeError:
+        pass
+    try:
+        text = raw.replace(b"\xc0\x80", b"\x00").decode("utf-8", "surrogatepass")
+        # Recompose les paires de surrogates en caractères Unicode réels
+        return text.encode("utf-16", "surrogatepass").decode("utf-16")
+    except UnicodeError:
+        return raw.decode("utf-8", "replace")
+
+def iter_dex_strings(buf, base=0):
+    """Génère les chaînes d'un DEX contenu dans buf (bytes ou mmap) à partir de l'offset base."""
+    if buf[base:base + 4] != DEX_MAGIC:
+        raise ValueError("not a DEX file")
+    size, ids_off = struct.unpack_from("<II", buf, base + STRING_IDS_HEADER)
+    offsets = struct.unpack_from(f"<{size}I", buf, base + ids_off)
+    for data_off in offsets:
+        pos = base + data_off
+        # utf16_size en uleb128 : inutile ici, on le saute
+        while buf[pos] & 0x80:
+            pos += 1
+        pos += 1
+        end = buf.find(b"\x00", pos)
+        yield _decode_mutf8(buf[pos:end])
+
+@contextmanager
+def map_apk_entry(apk_path, entry_name):
+    """Contenu d'une entrée de l'APK sous forme de mmap, sans le charger dans le tas Python.
+
+    Donne (buffer, offset de début). Une entrée stockée sans compression est lue
+    directement dans le mmap de l'APK ; une entrée compressée est décompressée en flux
+    dans un fichier temporaire mappé. La mémoire utilisée reste celle du cache de pages.
+    """
+    with zipfile.ZipFile(apk_path) as zf:
+        info = zf.getinfo(entry_name)
+        if info.compress_type == zipfile.ZIP_STORED:
+            with open(apk_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                name_len, extra_len = struct.unpack_from("<HH", mm, info.header_offset + 26)
+                yield mm, info.header_offset + ZIP_LOCAL_HEADER_SIZE + name_len + extra_len
+            return
+
+        with tempfile.TemporaryFile() as tmp:
+            with zf.open(info) as src:
+                shutil.copyfileobj(src, tmp, COPY_BUFFER_SIZE)
+            tmp.flush()
+            if tmp.tell() == 0:
+                # mmap refuse un fichier vide
+                yield b"", 0
+                return
+            with mmap.mmap(tmp.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                yield mm, 0
+
+def iter_apk_dex_strings(apk_path, entry_name):
+    """Chaînes d'une entrée classes*.dex de l'APK, via mmap (cf. map_apk_entry)."""
+    with map_apk_entry(apk_path, entry_name) as (buf, base):
+        yield from iter_dex_strings(buf, base)
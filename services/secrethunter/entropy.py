@@ -0,0 +1,151 @@
+import os, re, json, math, hashlib
+import numpy as np
+
+# Détecteur de chaînes à forte entropie : complète les signatures pour les jetons aléatoires
+# sans format connu (clés d'API internes, secrets partagés...).
+# Les jetons candidats sont extraits d'un lot de chaînes en une seule passe regex, puis
+# notés ensemble avec NumPy (entropie de Shannon et classes de caractères), sans boucle
+# Python par chaîne. Seuls les rares jetons retenus passent par la liste de suppression.
+ENTROPY_ENABLED = os.environ.get("ENTROPY_ENABLED", "1") == "1"
+MIN_LENGTH = int(os.environ.get("ENTROPY_MIN_LENGTH", 20))
+MAX_LENGTH = int(os.environ.get("ENTROPY_MAX_LENGTH", 128))
+# Seuils sur l'entropie normalisée : entropie / entropie moyenne d'une chaîne aléatoire
+# de même longueur sur le même alphabet (1.0 = aussi désordonné qu'un jeton aléatoire)
+THRESHOLD = float(os.environ.get("ENTROPY_THRESHOLD", 0.95))
+HEX_THRESHOLD = float(os.environ.get("ENTROPY_HEX_THRESHOLD", 0.95))
+# Classes parmi minuscules, majuscules, chiffres, symboles (+/=_-), chiffres obligatoires :
+# un jeton aléatoire de 20 caractères en contient avec une probabilité de 97 %, un nom de
+# ressource ou de méthode rarement. Un jeton hexadécimal doit seulement mêler chiffres et lettres
+MIN_CHAR_CLASSES = int(os.environ.get("ENTROPY_MIN_CHAR_CLASSES", 3))
+# Part minimale des paires de caractères voisins de classes différentes : un identifiant
+# (getSubjectX500Principal, TRANSACTION_setRadio) alterne peu, un jeton aléatoire souvent
+MIN_CLASS_CHANGES = float(os.environ.get("ENTROPY_MIN_CLASS_CHANGES", 0.35))
+# Chaînes notées par appel : borne la mémoire de la matrice des comptes (jetons x 65)
+BATCH_SIZE = int(os.environ.get("ENTROPY_BATCH_SIZE", 4096))
+# Suppressions supplémentaires : une regex par ligne (lignes vides et # ignorées)
+SUPPRESS_FILE = os.environ.get("ENTROPY_SUPPRESS_FILE", "")
+
+FINDING_TYPE = "High Entropy String"
+FINDING_SEVERITY = "MEDIUM"
+
+TOKEN = re.compile(r"[A-Za-z0-9+/_\-]{%d,}={0,2}" % MIN_LENGTH)
+# Données encodées en ligne : retirées avant l'extraction des jetons
+DATA_URI = re.compile(r"data:[\w.+/-]+;base64,[A-Za-z0-9+/=]+")
+
+# Chaînes écartées avant l'extraction des jetons (nom, regex sur la chaîne d'origine) :
+# descripteurs de type et noms synthétiques des lambdas D8 (-$$Lambda$, lambda$...),
+# dont le suffixe est un hachage présent dans presque toute application
+SOURCE_SUPPRESSIONS = [
+    ("type descriptor", r"^\[*L[^;]+;$"),
+    ("lambda", r"\$\$Lambda\$|lambda\$"),
+]
+SOURCE_SUPPRESS = re.compile("|".join(f"(?:{pattern})" for _, pattern in SOURCE_SUPPRESSIONS))
+
+# Données à forte entropie connues pour ne pas être des secrets : (nom, regex sur le jeton)
+SUPPRESSIONS = [
+    ("hash", r"^(?:[0-9a-fA-F]{32}|[0-9a-fA-F]{40}|[0-9a-fA-F]{64}|[0-9a-fA-F]{128})$"),
+    ("uuid", r"^[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}$"),
+    ("base64 image", r"^(?:iVBORw0KGgo|/9j/|R0lGOD|UklGR|Qk0)"),
+    ("base64 certificate", r"^MII[A-Za-z0-9+/]"),
+    ("sha256 pin", r"^sha(?:1|256)/"),
+    ("type descriptor", r"^L?[a-z][a-z0-9_]*(?:/[a-z][a-z0-9_]*)*/[A-Za-z_][\w$]*$"),
+]
+
+def _load_suppressions():
+    suppressions = list(SUPPRESSIONS)
+    if SUPPRESS_FILE:
+        with open(SUPPRESS_FILE, "r") as f:
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith("#"):
+                    suppressions.append(("custom", line))
+    return suppressions
+
+_SUPPRESSIONS = _load_suppressions()
+SUPPRESS = re.compile("|".join(f"(?:{pattern})" for _, pattern in _SUPPRESSIONS))
+
+# Empreinte de la configuration : toute modification invalide le cache de résultats
+ENTROPY_VERSION = hashlib.sha256(json.dumps([
+    ENTROPY_ENABLED, MIN_LENGTH, MAX_LENGTH, THRESHOLD, HEX_THRESHOLD, MIN_CHAR_CLASSES, MIN_CLASS_CHANGES,
+    SOURCE_SUPPRESSIONS, _SUPPRESSIONS
+]).encode("utf-8")).hexdigest()[:16]
+
+# c * log2(c) pour chaque nombre d'occurrences possible d'un caractère dans un jeton
+_C_LOG_C = np.zeros(MAX_LENGTH + 1)
+_C_LOG_C[1:] = np.arange(1, MAX_LENGTH + 1) * np.log2(np.arange(1, MAX_LENGTH + 1))
+
+def _expected_entropy(alphabet):
+    """Entropie moyenne d'une chaîne aléatoire uniforme sur l'alphabet, pour chaque longueur :
+    chaque caractère apparaît c ~ Binomiale(n, 1/alphabet) fois, donc
+    E[H] = log2(n) - alphabet * E[c.log2(c)] / n."""
+    expected = np.ones(MAX_LENGTH + 1)
+    p = 1 / alphabet
+    for n in range(2, MAX_LENGTH + 1):
+        mean_c_log_c = sum(math.comb(n, c) * p ** c * (1 - p) ** (n - c) * _C_LOG_C[c] for c in range(2, n + 1))
+        expected[n] = math.log2(n) - alphabet * mean_c_log_c / n
+    return expected
+
+_EXPECTED_HEX = _expected_entropy(16)
+_EXPECTED_BASE64 = _expected_entropy(64)
+
+# Alphabet des jetons (cf. TOKEN) : les comptes sont tenus sur ces 65 caractères
+# plutôt que sur 256 octets
+TOKEN_ALPHABET = b"abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789+/=_-"
+_INDEX = np.zeros(256, dtype=np.int64)
+_INDEX[list(TOKEN_ALPHABET)] = np.arange(len(TOKEN_ALPHABET))
+_HEX = np.array([c in b"0123456789abcdefABCDEF" for c in TOKEN_ALPHABET])
+# Classe de chaque caractère : minuscule, majuscule, chiffre, symbole
+_CLASS_OF = np.repeat(np.arange(4), [26, 26, 10, 5])
+_CLASSES = [_CLASS_OF == i for i in range(4)]
+
+def score_tokens(tokens):
+    """Entropie normalisée de chaque jeton (ASCII) et masque des jetons retenus.
+
+    Les jetons sont concaténés dans un seul tableau d'octets ; les comptes par
+    (jeton, caractère) sont obtenus par un unique np.bincount, d'où l'entropie
+    H = log2(n) - somme(c.log2(c)) / n, les classes de caractères présentes et
+    la part des changements de classe entre caractères voisins."""
+    lengths = np.fromiter(map(len, tokens), dtype=np.int64, count=len(tokens))
+    data = _INDEX[np.frombuffer("".join(tokens).encode("ascii"), dtype=np.uint8)]
+    rows = np.repeat(np.arange(len(tokens)), lengths)
+    size = len(TOKEN_ALPHABET)
+    counts = np.bincount(rows * size + data, minlength=len(tokens) * size).reshape(len(tokens), size)
+
+    entropy = np.log2(lengths) - _C_LOG_C[counts].sum(axis=1) / lengths
+    present = counts > 0
+    is_hex = ~(present & ~_HEX).any(axis=1)
+    has_class = [present[:, mask].any(axis=1) for mask in _CLASSES]
+    classes = sum(has.astype(np.int64) for has in has_class)
+    char_class = _CLASS_OF[data]
+    changes = (char_class[1:] != char_class[:-1]) & (rows[1:] == rows[:-1])
+    change_rate = np.bincount(rows[1:], weights=changes, minlength=len(tokens)) / (lengths - 1)
+    score = entropy / np.where(is_hex, _EXPECTED_HEX[lengths], _EXPECTED_BASE64[lengths])
+
+    keep = np.where(
+        is_hex, (score >= HEX_THRESHOLD) & (classes >= 2),
+        (score >= THRESHOLD) & (classes >= MIN_CHAR_CLASSES) & has_class[2] & (change_rate >= MIN_CLASS_CHANGES)
+    )
+    return score, keep
+
+def scan_batch(strings):
+    """Findings à forte entropie d'un lot de chaînes (cf. BATCH_SIZE)."""
+    if not ENTROPY_ENABLED or not strings:
+        return []
+    # Les suppressions qui portent sur la chaîne entière s'appliquent avant la
+    # concaténation : un jeton ne sait plus de quelle chaîne il vient
+    text = DATA_URI.sub(" ", "\n".join(s for s in strings if not SOURCE_SUPPRESS.search(s)))
+    # Dédupliqués dans l'ordre d'apparition : les findings d'un même APK sont reproductibles
+    tokens = [t for t in dict.fromkeys(TOKEN.findall(text)) if len(t) <= MAX_LENGTH]
+    if not tokens:
+        return []
+    score, keep = score_tokens(tokens)
+    findings = []
+    for i in np.flatnonzero(keep):
+        if not SUPPRESS.search(tokens[i]):
+            findings.append({
+                "type": FINDING_TYPE,
+                "severity": FINDING_SEVERITY,
+                "value": tokens[i],
+                "entropy": round(float(score[i]), 3)
+            })
+    return findings
@@ -0,0 +1,11 @@
+# Le master Gunicorn démarre aussi le pool de workers d'analyse (une seule fois,
+# indépendamment du nombre de workers HTTP).
+
+def when_ready(server):
+    from worker import start_pool
+    server.scan_pool = start_pool()
+
+def on_exit(server):
+    pool = getattr(server, "scan_pool", None)
+    if pool:
+        pool.stop()
@@ -0,0 +1,60 @@
+import os, time, threading, traceback, multiprocessing
+
+# File d'attente des scans : les jobs sont stockés en base (statut "queued") et
+# consommés par un pool de processus indépendant des workers Gunicorn.
+POLL_INTERVAL = float(os.environ.get("QUEUE_POLL_INTERVAL", 0.5))
+SUPERVISE_INTERVAL = 5
+
+def run_worker(claim, process, on_start=None):
+    """Boucle d'un worker : réclame le prochain job, le traite, recommence."""
+    if on_start:
+        on_start()
+    while True:
+        try:
+            job = claim()
+        except Exception as e:
+            print(f"Queue error: {e}")
+            job = None
+        if job is None:
+            time.sleep(POLL_INTERVAL)
+            continue
+        try:
+            process(job)
+        except Exception:
+            # process() gère ses propres erreurs ; on ne laisse jamais mourir le worker
+            traceback.print_exc()
+
+class WorkerPool:
+    """Pool de processus d'analyse, relancés automatiquement s'ils meurent."""
+
+    def __init__(self, size, target):
+        self.size = max(1, size)
+        self.target = target
+        self.processes = []
+        self._stopping = threading.Event()
+
+    def _spawn(self):
+        # Processus non-daemon : ils doivent pouvoir créer leurs propres sous-processus
+        p = multiprocessing.Process(target=self.target, name="scan-worker")
+        p.start()
+        return p
+
+    def _supervise(self):
+        while not self._stopping.wait(SUPERVISE_INTERVAL):
+            for i, p in enumerate(self.processes):
+                if not p.is_alive():
+                    print(f"Scan worker {p.pid} exited ({p.exitcode}), restarting")
+                    self.processes[i] = self._spawn()
+
+    def start(self):
+        self.processes = [self._spawn() for _ in range(self.size)]
+        threading.Thread(target=self._supervise, daemon=True).start()
+        print(f"Started {self.size} scan worker(s)")
+        return self
+
+    def stop(self):
+        self._stopping.set()
+        for p in self.processes:
+            p.terminate()
+        for p in self.processes:
+            p.join(timeout=10)
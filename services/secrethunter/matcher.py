@@ -0,0 +1,115 @@
+import re, time, bisect
+
+# Moteur de correspondance multi-règles partagé par secrethunter et cryptocheck.
+# RE2 (automates finis) garantit un temps linéaire sans backtracking ; sans lui,
+# on retombe sur le module re standard avec exactement la même sémantique.
+try:
+    import re2
+except ImportError:
+    re2 = None
+
+def _compile(pattern):
+    if re2 is not None:
+        try:
+            return re2.compile(pattern), True
+        except Exception:
+            # Syntaxe non supportée par RE2 (backreferences, lookaround...)
+            pass
+    return re.compile(pattern), False
+
+class Rule:
+    """Une règle compilée : nom, regex, littéraux requis et données associées."""
+
+    __slots__ = ("name", "pattern", "literals", "regex", "linear", "data")
+
+    def __init__(self, name, pattern, literals=(), data=None, ignore_case=False):
+        self.name = name
+        self.pattern = pattern
+        # Au moins un de ces littéraux doit apparaître (sans casse) pour que la règle puisse matcher
+        self.literals = tuple(lit.lower() for lit in literals)
+        self.regex, self.linear = _compile(f"(?i){pattern}" if ignore_case else pattern)
+        self.data = data
+
+class Matcher:
+    """Compile toutes les règles une seule fois et les évalue avec un préfiltre littéral.
+
+    Le préfiltre est une alternation unique de tous les littéraux, appliquée au texte
+    en minuscules : une chaîne qui n'en contient aucun est écartée en une seule passe,
+    sans évaluer aucune regex. Une alternation de littéraux ne backtrack pas, et le
+    moteur re la traite ici plus vite que RE2 (pas de conversion UTF-8 par appel).
+    """
+
+    def __init__(self, rules):
+        self.rules = list(rules)
+        literals = sorted({lit for rule in self.rules for lit in rule.literals}, key=len, reverse=True)
+        # Une règle sans littéral doit toujours être évaluée : le préfiltre ne peut plus rien écarter
+        self.always = [rule for rule in self.rules if not rule.literals]
+        self.prefilter = None
+        if literals and not self.always:
+            self.prefilter = re.compile("|".join(re.escape(lit) for lit in literals))
+
+    def candidates(self, text):
+        """Règles dont les littéraux requis apparaissent dans le texte."""
+        lowered = text.lower()
+        if self.prefilter is not None and not self.prefilter.search(lowered):
+            return []
+        return [
+            rule for rule in self.rules
+            if not rule.literals or any(lit in lowered for lit in rule.literals)
+        ]
+
+    def findall(self, text, profiler=None):
+        """Liste de (règle, match) pour toutes les occurrences (sémantique de re.findall).
+        profiler : si fourni, chaque évaluation de regex y est chronométrée (cf. ruleprofile.py)."""
+        results = []
+        for rule in self.candidates(text):
+            if profiler is None:
+                matches = rule.regex.findall(text)
+            else:
+                start = time.perf_counter_ns()
+                matches = rule.regex.findall(text)
+                profiler.record(rule.name, len(text), time.perf_counter_ns() - start, bool(matches))
+            for match in matches:
+                results.append((rule, match))
+        return results
+
+    def search(self, text, profiler=None):
+        """Règles qui matchent au moins une fois dans le texte."""
+        if profiler is None:
+            return [rule for rule in self.candidates(text) if rule.regex.search(text)]
+        matched = []
+        for rule in self.candidates(text):
+            start = time.perf_counter_ns()
+            found = rule.regex.search(text) is not None
+            profiler.record(rule.name, len(text), time.perf_counter_ns() - start, found)
+            if found:
+                matched.append(rule)
+        return matched
+
+    def select(self, strings):
+        """Chaînes d'une liste dont les littéraux requis apparaissent, pour un grand volume :
+        le préfiltre parcourt une seule fois la concaténation des chaînes au lieu d'être
+        appelé chaîne par chaîne. Le résultat est à passer ensuite à findall()."""
+        if self.prefilter is None:
+            return list(strings)
+        starts, position = [], 0
+        for s in strings:
+            starts.append(position)
+            position += len(s) + 1
+        text = "\n".join(strings)
+        lowered = text.lower()
+        if len(lowered) == len(text):
+            prefilter = self.prefilter
+        else:
+            # Certains caractères changent de longueur en minuscules : les positions ne
+            # correspondraient plus, on cherche alors sans casse dans le texte d'origine
+            prefilter, lowered = re.compile(self.prefilter.pattern, re.IGNORECASE), text
+        selected, end = [], -1
+        for match in prefilter.finditer(lowered):
+            if match.start() < end:
+                continue
+            i = bisect.bisect_right(starts, match.start()) - 1
+            selected.append(strings[i])
+            # Une chaîne retenue n'est plus examinée : on reprend après elle
+            end = starts[i] + len(strings[i]) + 1
+        return selected
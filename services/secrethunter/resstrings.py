@@ -0,0 +1,154 @@
+import os, re, struct, zipfile
+from dexstrings import map_apk_entry
+
+# Chaînes des entrées de l'APK autres que le code : ressources compilées (resources.arsc,
+# XML binaires), bibliothèques natives (.rodata des ELF) et fichiers texte embarqués.
+# Chaque entrée est lue seule, via mmap ou par blocs bornés : ni l'APK ni un gros
+# membre ne sont chargés en mémoire.
+RES_STRING_POOL_TYPE = 0x0001
+RES_TABLE_TYPE = 0x0002
+RES_XML_TYPE = 0x0003
+UTF8_FLAG = 0x100
+
+ELF_MAGIC = b"\x7fELF"
+ELF_STRING_SECTIONS = (".rodata",)
+# Suites de caractères imprimables, comme strings(1)
+PRINTABLE_RUN = re.compile(rb"[\x20-\x7e]{6,}")
+
+TEXT_EXTENSIONS = (
+    ".json", ".xml", ".properties", ".txt", ".js", ".html", ".htm", ".yaml", ".yml",
+    ".ini", ".cfg", ".conf", ".env", ".pem", ".plist", ".csv",
+)
+TEXT_READ_SIZE = 64 * 1024
+# Ligne plus longue (JSON minifié...) : découpée, avec un recouvrement pour ne pas couper un secret
+MAX_LINE_LENGTH = 64 * 1024
+LINE_OVERLAP = 256
+
+def iter_string_pool(buf, offset):
+    """Chaînes d'un ResStringPool (UTF-8 ou UTF-16) situé à offset dans buf."""
+    chunk_type, header_size, size, count, _, flags, strings_start, _ = struct.unpack_from("<HHIIIIII", buf, offset)
+    if chunk_type != RES_STRING_POOL_TYPE:
+        raise ValueError("not a string pool")
+    offsets = struct.unpack_from(f"<{count}I", buf, offset + header_size)
+    base, end = offset + strings_start, offset + size
+    utf8 = flags & UTF8_FLAG
+    for string_off in offsets:
+        pos = base + string_off
+        if pos >= end:
+            continue
+        if utf8:
+            # Longueur en caractères puis en octets, chacune sur 1 ou 2 octets
+            pos += 2 if buf[pos] & 0x80 else 1
+            length = buf[pos]
+            if length & 0x80:
+                length = ((length & 0x7F) << 8) | buf[pos + 1]
+                pos += 1
+            pos += 1
+            yield buf[pos:pos + length].decode("utf-8", "replace")
+        else:
+            length = struct.unpack_from("<H", buf, pos)[0]
+            pos += 2
+            if length & 0x8000:
+                length = ((length & 0x7FFF) << 16) | struct.unpack_from("<H", buf, pos)[0]
+                pos += 2
+            yield buf[pos:pos + 2 * length].decode("utf-16-le", "replace")
+
+def iter_res_strings(buf, base=0):
+    """Chaînes du pool global de resources.arsc ou d'un XML binaire (AXML).
+    Pour resources.arsc, le pool global contient les valeurs (res/values/strings.xml...)."""
+    chunk_type, header_size = struct.unpack_from("<HH", buf, base)
+    if chunk_type not in (RES_TABLE_TYPE, RES_XML_TYPE):
+        raise ValueError("not a compiled resource")
+    yield from iter_string_pool(buf, base + header_size)
+
+def iter_elf_strings(buf, base=0):
+    """Suites imprimables des sections .rodata d'une bibliothèque ELF (32/64 bits)."""
+    if buf[base:base + 4] != ELF_MAGIC:
+        raise ValueError("not an ELF file")
+    is64 = buf[base + 4] == 2
+    endian = "<" if buf[base + 5] == 1 else ">"
+    if is64:
+        shoff = struct.unpack_from(endian + "Q", buf, base + 0x28)[0]
+        shentsize, shnum, shstrndx = struct.unpack_from(endian + "HHH", buf, base + 0x3A)
+        section = struct.Struct(endian + "IIQQQQ")
+    else:
+        shoff = struct.unpack_from(endian + "I", buf, base + 0x20)[0]
+        shentsize, shnum, shstrndx = struct.unpack_from(endian + "HHH", buf, base + 0x2E)
+        section = struct.Struct(endian + "IIIIII")
+
+    # (nom, type, flags, adresse, offset, taille) de chaque section
+    sections = [section.unpack_from(buf, base + shoff + i * shentsize) for i in range(shnum)]
+    if not sections or shstrndx >= len(sections):
+        return
+    names_off = base + sections[shstrndx][4]
+    for name_off, _, _, _, offset, size in sections:
+        end = buf.find(b"\x00", names_off + name_off)
+        name = buf[names_off + name_off:end].decode("ascii", "replace")
+        if name in ELF_STRING_SECTIONS:
+            for match in PRINTABLE_RUN.finditer(buf, base + offset, base + offset + size):
+                yield match.group().decode("ascii")
+
+def iter_text_lines(zf, info):
+    """Lignes d'un fichier texte de l'APK, lues par blocs bornés."""
+    with zf.open(info) as f:
+        pending = b""
+        while True:
+            chunk = f.read(TEXT_READ_SIZE)
+            if not chunk:
+                break
+            pending += chunk
+            *lines, pending = pending.split(b"\n")
+            for line in lines:
+                yield line.decode("utf-8", "replace")
+            while len(pending) > MAX_LINE_LENGTH:
+                yield pending[:MAX_LINE_LENGTH].decode("utf-8", "replace")
+                pending = pending[MAX_LINE_LENGTH - LINE_OVERLAP:]
+        if pending:
+            yield pending.decode("utf-8", "replace")
+
+def classify_entry(name):
+    """Type d'extraction d'une entrée de l'APK : "res", "elf", "text" ou None (ignorée)."""
+    if name == "resources.arsc" or name == "AndroidManifest.xml":
+        return "res"
+    if name.startswith("res/") and name.endswith(".xml") and not name.startswith("res/raw/"):
+        return "res"
+    if name.startswith("lib/") and name.endswith(".so"):
+        return "elf"
+    if name.startswith(("assets/", "res/raw/")) or os.path.basename(name) == "google-services.json":
+        if name.lower().endswith(TEXT_EXTENSIONS):
+            return "text"
+    return None
+
+def list_resource_entries(apk_path):
+    """Entrées hors code à scanner : [(nom, type)]."""
+    with zipfile.ZipFile(apk_path) as zf:
+        entries = []
+        for info in zf.infolist():
+            kind = classify_entry(info.filename)
+            if kind and not info.is_dir():
+                entries.append((info.filename, kind))
+        return entries
+
+def iter_apk_entry_strings(apk_path, entry_name, kind):
+    """Chaînes d'une entrée de l'APK selon son type (cf. classify_entry)."""
+    if kind == "text":
+        with zipfile.ZipFile(apk_path) as zf:
+            yield from iter_text_lines(zf, zf.getinfo(entry_name))
+        return
+    with map_apk_entry(apk_path, entry_name) as (buf, base):
+        if kind == "elf":
+            yield from iter_elf_strings(buf, base)
+            return
+        try:
+            strings = iter_res_strings(buf, base)
+            first = next(strings, None)
+        except (ValueError, struct.error):
+            strings, first = None, None
+        if first is not None:
+            yield first
+            yield from strings
+            return
+    # XML non compilé (res/raw, certains APK) : lu comme du texte
+    if strings is None:
+        with zipfile.ZipFile(apk_path) as zf:
+            yield from iter_text_lines(zf, zf.getinfo(entry_name))
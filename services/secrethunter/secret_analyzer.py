@@ -0,0 +1,226 @@
+import traceback
+from signatures import scan_string, current_pack, pack_for
+from dexstrings import iter_apk_dex_strings
+from dexpool import list_dex_entries, map_dex
+from resstrings import list_resource_entries, iter_apk_entry_strings
+from corpus import corpus_enabled, CorpusWriter, sweep_blobs
+from string_cache import get_cache
+from ruleprofile import get_profiler
+import entropy
+
+# Blobs du corpus traités par tâche lors d'un balayage (limite les allers-retours avec le pool)
+SWEEP_BATCH_SIZE = 50
+
+def analyzer_version(pack):
+    """Clé de version du cache : change avec le code d'extraction, le pack de signatures
+    ou la configuration du détecteur d'entropie."""
+    return f"secrethunter-2:{pack.digest[:16]}:{entropy.ENTROPY_VERSION}"
+
+# Chaînes traitées par lot : préfiltre en une passe, cache des verdicts, entropie
+SCAN_BATCH_SIZE = entropy.BATCH_SIZE
+
+def _signature_findings(strings, pack):
+    """Findings des signatures pour un lot : le préfiltre littéral écarte en une passe
+    les chaînes sans aucun littéral requis ; pour les autres, le verdict vient du cache
+    (cf. string_cache.py) ou de l'évaluation des regex, puis est mis en cache."""
+    candidates = pack.matcher.select(strings)
+    profiler = get_profiler(pack.digest)
+    cache = get_cache(pack.digest)
+    if cache is None:
+        return [f for c in candidates for f in scan_string(c, pack.matcher, profiler)]
+    cache.count("prefiltered", len(strings) - len(candidates))
+    verdicts = cache.lookup(candidates)
+    computed = {c: scan_string(c, pack.matcher, profiler) for c in candidates if c not in verdicts}
+    cache.store(computed)
+    verdicts.update(computed)
+    return [f for c in candidates for f in verdicts[c]]
+
+def _scan_strings(strings, findings, pack, writer=None):
+    """Scanne des chaînes en un seul passage ; writer : si fourni (cf. corpus.CorpusWriter),
+    chaque chaîne scannée y est aussi ajoutée."""
+    # Dédupliqué au fil de l'eau : un même secret répété (lignes d'un asset...) ne s'accumule pas
+    seen = {f"{f['type']}:{f['value']}" for f in findings}
+    # Valeurs des findings des signatures, tenues à jour au fil des ajouts
+    matched = [f["value"] for f in findings if f["type"] != entropy.FINDING_TYPE]
+
+    def add(f):
+        identifier = f"{f['type']}:{f['value']}"
+        if identifier not in seen:
+            seen.add(identifier)
+            findings.append(f)
+            if f["type"] != entropy.FINDING_TYPE:
+                matched.append(f["value"])
+
+    def flush(batch):
+        for f in _signature_findings(batch, pack):
+            add(f)
+        # Un jeton déjà couvert par une signature (clé Google, AWS...) n'est pas signalé deux fois
+        for f in entropy.scan_batch([s for s in batch if len(s) >= entropy.MIN_LENGTH]):
+            if not any(f["value"] in value for value in matched):
+                add(f)
+
+    batch = []
+    for s in strings:
+        if s and len(s) > 5: # Ignore les chaines trop courtes
+            batch.append(s)
+            if writer is not None:
+                writer.add(s)
+            if len(batch) >= SCAN_BATCH_SIZE:
+                flush(batch)
+                batch = []
+    if batch:
+        flush(batch)
+    cache = get_cache(pack.digest)
+    if cache is not None:
+        cache.flush_stats()
+    profiler = get_profiler(pack.digest)
+    if profiler is not None:
+        profiler.flush()
+
+def _deduplicate(findings):
+    # Déduplication des résultats
+    unique_findings = []
+    seen = set()
+    for f in findings:
+        identifier = f"{f['type']}:{f['value']}"
+        if identifier not in seen:
+            unique_findings.append(f)
+            seen.add(identifier)
+    return unique_findings
+
+def _scan_dex_entry(filepath, entry, keep_strings, pack_digest):
+    """Scanne une entrée classes*.dex avec le pack d'empreinte donnée ; exécuté dans un
+    processus du pool. Retourne (findings, empreinte des chaînes enregistrées dans le corpus ou None)."""
+    findings = []
+    blob_hash = None
+    try:
+        pack = pack_for(pack_digest)
+        writer = CorpusWriter() if keep_strings else None
+        try:
+            # Les chaînes sont lues en flux (mmap) : matcher et corpus sont alimentés au même passage
+            _scan_strings(iter_apk_dex_strings(filepath, entry), findings, pack, writer)
+            if writer is not None:
+                blob_hash = writer.close()
+        finally:
+            if writer is not None:
+                writer.discard()
+    except Exception as e:
+        print(f"Error processing DEX {entry}: {e}")
+    return findings, blob_hash
+
+def _scan_resource_entries(filepath, entries, keep_strings, pack_digest):
+    """Scanne des entrées hors code [(nom, type)] ; exécuté dans un processus du pool.
+    Retourne (findings, empreinte des chaînes enregistrées dans le corpus ou None)."""
+    findings = []
+    try:
+        pack = pack_for(pack_digest)
+    except Exception as e:
+        print(f"Error loading rule pack: {e}")
+        return findings, None
+    # Un seul passage sur les chaînes de chaque entrée (lues en flux, cf. resstrings.py) :
+    # matcher et corpus sont alimentés ensemble, une grosse bibliothèque native n'est
+    # jamais chargée en mémoire
+    writer = CorpusWriter() if keep_strings else None
+    blob_hash = None
+    try:
+        for entry, kind in entries:
+            try:
+                _scan_strings(iter_apk_entry_strings(filepath, entry, kind), findings, pack, writer)
+            except Exception as e:
+                print(f"Error processing {entry}: {e}")
+        if writer is not None:
+            try:
+                blob_hash = writer.close()
+            except Exception as e:
+                print(f"Error storing strings: {e}")
+    finally:
+        if writer is not None:
+            writer.discard()
+    return findings, blob_hash
+
+def _scan_tasks(filepath, keep_strings, pack):
+    """Tâches du pool : une par DEX, une par bibliothèque native, une pour le reste
+    (resources.arsc, XML binaires, fichiers texte), plus léger.
+    Les tâches reçoivent l'empreinte du pack : tout le scan utilise le même, même si un
+    autre est publié entre-temps."""
+    tasks = [(_scan_dex_entry, (filepath, entry, keep_strings, pack.digest)) for entry in list_dex_entries(filepath)]
+    resources = list_resource_entries(filepath)
+    tasks += [(_scan_resource_entries, (filepath, [(entry, kind)], keep_strings, pack.digest)) for entry, kind in resources if kind == "elf"]
+    others = [(entry, kind) for entry, kind in resources if kind != "elf"]
+    if others:
+        tasks.append((_scan_resource_entries, (filepath, others, keep_strings, pack.digest)))
+    return tasks
+
+def _run_task(fn, args):
+    return fn(*args)
+
+def extract_and_scan(filepath, progress=None, corpus_blobs=None, pack=None):
+    """Extrait les chaînes de l'APK et les scanne.
+
+    Code : la table des chaînes de chaque classes*.dex est lue via mmap (cf. dexstrings.py)
+    et transmise en flux au matcher, sans parser le DEX complet.
+    Ressources (cf. resstrings.py) : pools de chaînes de resources.arsc et des XML binaires,
+    sections .rodata des bibliothèques natives, fichiers texte des assets.
+    Les entrées sont lues une à une et réparties sur le pool de processus (cf. dexpool.py).
+    progress(done, total) est appelé après chaque tâche, si fourni.
+    Si corpus_blobs est une liste (et le corpus activé), les chaînes extraites sont
+    conservées dans le corpus et leurs empreintes y sont ajoutées.
+    pack : pack de signatures (par défaut, le pack actif).
+    """
+    pack = pack or current_pack()
+    keep_strings = corpus_blobs is not None and corpus_enabled()
+    try:
+        tasks = _scan_tasks(filepath, keep_strings, pack)
+    except Exception as e:
+        print(f"Error extracting APK: {e}")
+        traceback.print_exc()
+        return []
+
+    findings = []
+    for task_findings, blob_hash in map_dex(_run_task, tasks, progress):
+        findings.extend(task_findings)
+        if blob_hash:
+            corpus_blobs.append(blob_hash)
+
+    return _deduplicate(findings)
+
+def scan_apk_resources(filepath, pack=None):
+    """Scan des entrées hors code seules (l'orchestrateur scanne les DEX déjà parsés)."""
+    pack = pack or current_pack()
+    try:
+        entries = list_resource_entries(filepath)
+    except Exception as e:
+        print(f"Error extracting APK: {e}")
+        return []
+    return _deduplicate(_scan_resource_entries(filepath, entries, False, pack.digest)[0])
+
+def scan_dex_list(dex_list, progress=None, apk_path=None, pack=None):
+    """Scanne des DEX déjà parsés (partagés avec l'orchestrateur).
+
+    progress(done, total) est appelé après chaque DEX, si fourni.
+    apk_path : si fourni, les entrées hors code de l'APK sont aussi scannées.
+    """
+    pack = pack or current_pack()
+    findings = scan_apk_resources(apk_path, pack) if apk_path else []
+    for i, d in enumerate(dex_list):
+        try:
+            # d.get_strings() retourne toutes les constantes string du code
+            _scan_strings(d.get_strings(), findings, pack)
+        except Exception as e:
+            print(f"Error processing DEX: {e}")
+        if progress:
+            progress(i + 1, len(dex_list))
+
+    return _deduplicate(findings)
+
+def sweep_corpus(blob_hashes, rule_names, pack_digest, progress=None):
+    """Rejoue des signatures d'un pack sur des blobs du corpus, par lots répartis sur le pool de processus.
+    Retourne {blob_hash: [findings dédupliqués]} pour les blobs qui ont au moins un finding.
+    progress(done, total) est appelé après chaque lot, si fourni."""
+    blob_hashes = list(blob_hashes)
+    tasks = [(blob_hashes[i:i + SWEEP_BATCH_SIZE], list(rule_names), pack_digest) for i in range(0, len(blob_hashes), SWEEP_BATCH_SIZE)]
+    results = {}
+    for batch in map_dex(sweep_blobs, tasks, progress):
+        for blob_hash, findings in batch.items():
+            results[blob_hash] = _deduplicate(findings)
+    return results
@@ -1,33 +1,41 @@
-import re
+import os
+from rulepack import PackSource, PackError, get_pack
 
-# Liste de regex pour détecter les secrets communs
-# Format: (Nom du secret, Regex pattern)
-SIGNATURES = [
-    ("Google API Key", r"AIza[0-9A-Za-z\\-_]{35}"),
-    ("AWS Access Key ID", r"AKIA[0-9A-Z]{16}"),
-    ("AWS Secret Access Key", r"(?i)aws.+[a-z0-9/+]{40}"),
-    ("Generic API Key", r"(?i)(api_key|apikey|access_token|auth_token)[\s]*[:=]+[\s]*['\"]?[0-9a-zA-Z\-_]{16,64}['\"]?"),
-    ("Firebase URL", r".*firebaseio\.com"),
-    ("Slack Token", r"(xox[p|b|o|a]-[0-9]{12}-[0-9]{12}-[0-9]{12}-[a-z0-9]{32})"),
-    ("Facebook Access Token", r"EAACEdEose0cBA[0-9A-Za-z]+"),
-    ("Private Key (RSA/DSA)", r"-----BEGIN (RSA|DSA|EC|PGP) PRIVATE KEY-----"),
-    ("Hardcoded Password", r"(?i)(password|passwd|pwd)[\s]*[:=]+[\s]*['\"]?[a-zA-Z0-9@#$%^&*]{4,32}['\"]?"),
-    ("Email Address", r"[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}")
-]
+# Signatures de secrets : pack de règles "secrets" (cf. rulepack.py), embarqué dans
+# packs/secrets.json et remplaçable à chaud via /admin/packs.
+# Chaque règle : nom du secret, regex, littéraux dont au moins un est requis, sévérité.
+# Les littéraux alimentent le préfiltre du matcher : une chaîne qui n'en contient
+# aucun n'est jamais soumise à la regex.
+SECRET_PACK = PackSource("secrets", os.path.join(os.path.dirname(os.path.abspath(__file__)), "packs", "secrets.json"))
 
-def scan_string(content):
-    """Retourne une liste de secrets trouvés dans une chaîne."""
+def current_pack():
+    """Pack actif ; un scan le récupère une fois au début et le garde jusqu'à la fin."""
+    return SECRET_PACK.current()
+
+def pack_for(digest):
+    """Pack d'empreinte donnée (tâche du pool, balayage), ou PackError s'il est introuvable."""
+    try:
+        return get_pack(digest)
+    except PackError:
+        # Cache disque des packs indisponible : le pack actif convient s'il est le même
+        pack = current_pack()
+        if pack.digest != digest:
+            raise
+        return pack
+
+def scan_string(content, matcher, profiler=None):
+    """Retourne une liste de secrets trouvés dans une chaîne.
+    profiler : si fourni, le coût de chaque signature y est enregistré (cf. ruleprofile.py)."""
     findings = []
     if not content:
         return findings
-        
-    for name, pattern in SIGNATURES:
-        matches = re.findall(pattern, content)
-        for match in matches:
-            # On évite les faux positifs trop courts ou vides
-            if len(match) > 5:
-                findings.append({
-                    "type": name,
-                    "value": match  # Attention: en prod, on obfusque souvent ça (ex: AKIA***)
-                })
-    return findings
\ No newline at end of file
+
+    for rule, match in matcher.findall(content, profiler):
+        # On évite les faux positifs trop courts ou vides
+        if len(match) > 5:
+            findings.append({
+                "type": rule.name,
+                "severity": rule.data["severity"],
+                "value": match  # Attention: en prod, on obfusque souvent ça (ex: AKIA***)
+            })
+    return findings
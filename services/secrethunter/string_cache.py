@@ -0,0 +1,191 @@
+import os, json, hashlib, threading
+from collections import OrderedDict
+from sqlalchemy import text
+from storage import create_sqlite_engine
+
+# Cache des verdicts par chaîne, partagé entre scans : les chaînes des SDK courants
+# (messages de log, descripteurs, URLs) reviennent d'un APK à l'autre.
+# Seules les chaînes retenues par le préfiltre littéral du matcher y passent : les autres
+# sont écartées en une passe sur tout le lot (cf. Matcher.select), plus vite qu'une
+# consultation du cache. Le cache évite donc l'évaluation des regex, la partie coûteuse.
+# Deux niveaux :
+# - LRU en mémoire, propre à chaque processus (les processus du pool DEX sont réutilisés
+#   d'un scan à l'autre) ;
+# - table SQLite partagée par tous les processus et conservée après un redémarrage,
+#   bornée (les plus anciennes entrées sont évincées en premier).
+# Clé : empreinte de la chaîne + version du pack de signatures ; les entrées d'une autre
+# version ne sont plus jamais lues, elles sont supprimées à la publication d'un pack
+# (purge_other_versions) ou évincées avec les plus anciennes.
+STRING_CACHE_ENABLED = os.environ.get("STRING_CACHE_ENABLED", "1") == "1"
+STRING_CACHE_PATH = os.environ.get("STRING_CACHE_PATH", os.environ.get("DB_PATH", "/app/storage.db"))
+MEMORY_SIZE = int(os.environ.get("STRING_CACHE_MEMORY_SIZE", 100000))
+MAX_ROWS = int(os.environ.get("STRING_CACHE_MAX_ROWS", 1000000))
+QUERY_CHUNK_SIZE = 500
+STAT_COUNTERS = ("prefiltered", "memory_hits", "disk_hits", "misses", "memory_evictions", "disk_evictions")
+
+def string_hash(s):
+    return hashlib.blake2b(s.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+
+class StringVerdictCache:
+    """Verdicts (findings des signatures) par chaîne, pour une version des signatures."""
+
+    def __init__(self, version, path=STRING_CACHE_PATH, memory_size=MEMORY_SIZE, max_rows=MAX_ROWS):
+        self.version = version
+        self.memory_size = memory_size
+        self.max_rows = max_rows
+        self.engine = create_sqlite_engine(path)
+        self._memory = OrderedDict()
+        self._stats = dict.fromkeys(STAT_COUNTERS, 0)
+        self._lock = threading.Lock()
+        with self.engine.begin() as conn:
+            conn.execute(text("""
+                CREATE TABLE IF NOT EXISTS string_verdicts (
+                    id INTEGER PRIMARY KEY,
+                    string_hash BLOB NOT NULL,
+                    version TEXT NOT NULL,
+                    findings_json TEXT,
+                    UNIQUE (string_hash, version)
+                )
+            """))
+            conn.execute(text("""
+                CREATE TABLE IF NOT EXISTS string_cache_stats (
+                    version TEXT PRIMARY KEY,
+                    prefiltered INTEGER DEFAULT 0,
+                    memory_hits INTEGER DEFAULT 0,
+                    disk_hits INTEGER DEFAULT 0,
+                    misses INTEGER DEFAULT 0,
+                    memory_evictions INTEGER DEFAULT 0,
+                    disk_evictions INTEGER DEFAULT 0
+                )
+            """))
+            conn.execute(text("INSERT OR IGNORE INTO string_cache_stats (version) VALUES (:version)"), {"version": version})
+
+    def purge_other_versions(self):
+        """Signatures modifiées : les verdicts et compteurs des autres versions ne valent plus."""
+        with self.engine.begin() as conn:
+            conn.execute(text("DELETE FROM string_verdicts WHERE version != :version"), {"version": self.version})
+            conn.execute(text("DELETE FROM string_cache_stats WHERE version != :version"), {"version": self.version})
+
+    def count(self, counter, n=1):
+        with self._lock:
+            self._stats[counter] += n
+
+    def _remember(self, key, findings):
+        # Appelé sous self._lock
+        self._memory[key] = findings
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+            self._stats["memory_evictions"] += 1
+
+    def lookup(self, strings):
+        """Verdicts en cache : {chaîne: [findings]} ; les chaînes absentes n'y figurent pas."""
+        verdicts, missing = {}, {}
+        with self._lock:
+            for s in strings:
+                if s in verdicts or s in missing:
+                    continue
+                key = string_hash(s)
+                findings = self._memory.get(key)
+                if findings is None:
+                    missing[s] = key
+                else:
+                    self._memory.move_to_end(key)
+                    verdicts[s] = findings
+            self._stats["memory_hits"] += len(verdicts)
+
+        if missing:
+            by_key = {key: s for s, key in missing.items()}
+            keys = list(by_key)
+            found = {}
+            with self.engine.connect() as conn:
+                for i in range(0, len(keys), QUERY_CHUNK_SIZE):
+                    chunk = keys[i:i + QUERY_CHUNK_SIZE]
+                    params = {f"h{j}": h for j, h in enumerate(chunk)}
+                    rows = conn.execute(
+                        text(f"SELECT string_hash, findings_json FROM string_verdicts WHERE version=:version AND string_hash IN ({','.join(':' + k for k in params)})"),
+                        {"version": self.version, **params}
+                    ).fetchall()
+                    found.update((bytes(r[0]), json.loads(r[1])) for r in rows)
+            with self._lock:
+                for key, findings in found.items():
+                    self._remember(key, findings)
+                    verdicts[by_key[key]] = findings
+                self._stats["disk_hits"] += len(found)
+                self._stats["misses"] += len(missing) - len(found)
+        return {s: [dict(f) for f in findings] for s, findings in verdicts.items()}
+
+    def store(self, verdicts):
+        """Enregistre {chaîne: [findings]} ; les chaînes sans finding sont aussi mémorisées."""
+        if not verdicts:
+            return
+        rows = []
+        with self._lock:
+            for s, findings in verdicts.items():
+                key = string_hash(s)
+                self._remember(key, findings)
+                rows.append({"hash": key, "version": self.version, "findings": json.dumps(findings)})
+        with self.engine.begin() as conn:
+            conn.execute(
+                text("INSERT OR IGNORE INTO string_verdicts (string_hash, version, findings_json) VALUES (:hash,:version,:findings)"),
+                rows
+            )
+            # Éviction par ancienneté : les id croissent à chaque insertion
+            last_id = conn.execute(text("SELECT MAX(id) FROM string_verdicts")).scalar() or 0
+            evicted = conn.execute(
+                text("DELETE FROM string_verdicts WHERE id <= :limit"), {"limit": last_id - self.max_rows}
+            ).rowcount
+        if evicted:
+            self.count("disk_evictions", evicted)
+
+    def flush_stats(self):
+        """Ajoute les compteurs du processus à ceux de la base (partagés par tous les processus)."""
+        with self._lock:
+            stats, self._stats = self._stats, dict.fromkeys(STAT_COUNTERS, 0)
+        if not any(stats.values()):
+            return
+        with self.engine.begin() as conn:
+            conn.execute(
+                text(f"UPDATE string_cache_stats SET {', '.join(f'{c}={c}+:{c}' for c in STAT_COUNTERS)} WHERE version=:version"),
+                {"version": self.version, **stats}
+            )
+
+    def stats(self):
+        """Compteurs cumulés de tous les processus depuis le dernier changement de signatures."""
+        with self.engine.connect() as conn:
+            r = conn.execute(
+                text(f"SELECT {', '.join(STAT_COUNTERS)} FROM string_cache_stats WHERE version=:version"),
+                {"version": self.version}
+            ).fetchone()
+            entries = conn.execute(
+                text("SELECT COUNT(*) FROM string_verdicts WHERE version=:version"), {"version": self.version}
+            ).scalar()
+        stats = dict(zip(STAT_COUNTERS, r)) if r else dict.fromkeys(STAT_COUNTERS, 0)
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        evaluated = stats["prefiltered"] + lookups
+        return {
+            "version": self.version,
+            "entries": entries,
+            "max_entries": self.max_rows,
+            "memory_size": self.memory_size,
+            **stats,
+            # Part des chaînes retenues par le préfiltre dont le verdict vient du cache
+            "hit_rate": round((lookups - stats["misses"]) / lookups, 4) if lookups else None,
+            # Part de toutes les chaînes scannées sans évaluer aucune regex
+            "regex_avoided_rate": round((evaluated - stats["misses"]) / evaluated, 4) if evaluated else None,
+        }
+
+_caches = {}
+_caches_pid = None
+
+def get_cache(version):
+    """Cache du processus pour cette version des signatures (None si désactivé)."""
+    # Un cache par processus : les connexions SQLite ne survivent pas à un fork
+    global _caches, _caches_pid
+    if not STRING_CACHE_ENABLED:
+        return None
+    if _caches_pid != os.getpid():
+        _caches, _caches_pid = {}, os.getpid()
+    if version not in _caches:
+        _caches[version] = StringVerdictCache(version)
+    return _caches[version]
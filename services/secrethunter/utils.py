@@ -1,9 +1,18 @@
-import os, datetime, json
-from sqlalchemy import create_engine, text
+import os, datetime, json, hashlib, uuid, zipfile
+from sqlalchemy import text
+from androguard.core.axml import AXMLPrinter
+from signatures import current_pack
+from storage import (create_sqlite_engine, StatusWriter, ensure_list_indexes, keyset_page, PAGE_SIZE,
+                     COUNT_COLUMNS, count_findings, unpack_counts, backfill_counts,
+                     encode_result, decode_result, findings_page, iter_findings)
 
 DB_PATH = os.environ.get("DB_PATH", "/app/storage.db")
 # On utilise SQLite pour ce MVP
-ENGINE = create_engine(f"sqlite:///{DB_PATH}", connect_args={"check_same_thread": False})
+ENGINE = create_sqlite_engine(DB_PATH)
+# Progression écrite en différé ; l'état final est écrit immédiatement
+STATUS = StatusWriter(ENGINE, "secrets_scans")
+SWEEP_STATUS = StatusWriter(ENGINE, "sweeps")
+UPLOAD_CHUNK_SIZE = 1024 * 1024
 
 def init_db():
     with ENGINE.begin() as conn:
@@ -11,42 +20,449 @@ def init_db():
             CREATE TABLE IF NOT EXISTS secrets_scans (
                 id TEXT PRIMARY KEY,
                 filename TEXT,
+                package_name TEXT,
                 status TEXT,
                 created_at TEXT,
-                findings_json TEXT
+                findings_json TEXT,
+                upload_path TEXT,
+                sha256 TEXT,
+                progress INTEGER DEFAULT 0,
+                claim_token TEXT
             )
         """))
+        _ensure_columns(conn, "secrets_scans", QUEUE_COLUMNS)
+        _ensure_columns(conn, "secrets_scans", LIST_COLUMNS)
+        ensure_list_indexes(conn, "secrets_scans", ("status", "package_name"))
+        _ensure_columns(conn, "secrets_scans", COUNT_COLUMNS)
+        conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS result_cache (
+                sha256 TEXT,
+                version TEXT,
+                created_at TEXT,
+                result_json TEXT,
+                PRIMARY KEY (sha256, version)
+            )
+        """))
+        _ensure_columns(conn, "secrets_scans", INDEX_COLUMNS)
+        _ensure_columns(conn, "secrets_scans", PACK_COLUMNS)
+        _ensure_columns(conn, "secrets_scans", ERROR_COLUMNS)
+        conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS secret_index (
+                value_hash TEXT,
+                type TEXT,
+                scan_id TEXT,
+                package_name TEXT,
+                created_at TEXT,
+                PRIMARY KEY (value_hash, scan_id, type)
+            ) WITHOUT ROWID
+        """))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS idx_secret_index_scan ON secret_index (scan_id)"))
+        # Corpus de chaînes : blobs (cf. corpus.py) de chaque scan
+        conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS scan_corpus (
+                scan_id TEXT,
+                blob_hash TEXT,
+                PRIMARY KEY (scan_id, blob_hash)
+            ) WITHOUT ROWID
+        """))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS idx_scan_corpus_blob ON scan_corpus (blob_hash)"))
+        # Versions de signatures connues ; swept=0 : pas encore rejouée sur le corpus
+        conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS known_rules (
+                rule_hash TEXT PRIMARY KEY,
+                name TEXT,
+                swept INTEGER,
+                created_at TEXT
+            )
+        """))
+        conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS sweeps (
+                id TEXT PRIMARY KEY,
+                status TEXT,
+                created_at TEXT,
+                rules_json TEXT,
+                progress INTEGER DEFAULT 0,
+                claim_token TEXT,
+                result_json TEXT
+            )
+        """))
+        _ensure_columns(conn, "sweeps", SWEEP_COLUMNS)
+        _register_rules(conn, current_pack())
+    backfill_counts(ENGINE, "secrets_scans", "findings_json")
+    backfill_secret_index()
+
+# Colonnes de la file d'attente, ajoutées aux bases créées avant leur introduction
+QUEUE_COLUMNS = {
+    "upload_path": "TEXT",
+    "sha256": "TEXT",
+    "progress": "INTEGER DEFAULT 0",
+    "claim_token": "TEXT",
+}
+
+# Colonnes des listings (filtre par package)
+LIST_COLUMNS = {
+    "package_name": "TEXT",
+}
+
+# Scans déjà reportés dans l'index des secrets
+INDEX_COLUMNS = {
+    "secrets_indexed": "INTEGER",
+}
+
+# Version de l'index des secrets enregistrée dans secrets_indexed ; l'incrémenter fait
+# réindexer tous les scans au démarrage (2 : valeurs réduites au mot-clé écartées)
+SECRET_INDEX_VERSION = 2
+
+# Pack de signatures qui a produit le résultat (cf. rulepack.py)
+PACK_COLUMNS = {
+    "pack_version": "TEXT",
+}
+
+# Erreur d'un scan échoué (message et trace), les findings restant une liste vide
+ERROR_COLUMNS = {
+    "error_json": "TEXT",
+}
+
+# Empreinte du pack dont un balayage rejoue les signatures
+SWEEP_COLUMNS = {
+    "pack_digest": "TEXT",
+}
+
+def _ensure_columns(conn, table, columns):
+    existing = {r[1] for r in conn.execute(text(f"PRAGMA table_info({table})"))}
+    for name, ddl in columns.items():
+        if name not in existing:
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {ddl}"))
+
+def enqueue_scan(scan_id, filename, upload_path, sha256, package_name=None):
+    """Enregistre un job en attente ; il sera traité par le pool de workers."""
+    with ENGINE.begin() as conn:
+        conn.execute(
+            text("INSERT INTO secrets_scans (id, filename, package_name, status, created_at, findings_json, upload_path, sha256, progress) VALUES (:id,:filename,:pkg,'queued',:created_at,'[]',:path,:sha,0)"),
+            {"id": scan_id, "filename": filename, "pkg": package_name, "created_at": datetime.datetime.utcnow().isoformat(), "path": upload_path, "sha": sha256}
+        )
+
+def claim_next_job():
+    """Passe atomiquement le plus ancien job 'queued' en 'running' et le retourne."""
+    token = uuid.uuid4().hex
+    with ENGINE.begin() as conn:
+        # Une seule instruction UPDATE : atomique même avec plusieurs workers
+        claimed = conn.execute(
+            text("UPDATE secrets_scans SET status='running', claim_token=:token WHERE id = (SELECT id FROM secrets_scans WHERE status='queued' ORDER BY created_at LIMIT 1) AND status='queued'"),
+            {"token": token}
+        ).rowcount
+        if not claimed:
+            return None
+        r = conn.execute(
+            text("SELECT id, filename, upload_path, sha256 FROM secrets_scans WHERE claim_token=:token"),
+            {"token": token}
+        ).fetchone()
+        return {"id": r[0], "filename": r[1], "upload_path": r[2], "sha256": r[3]}
+
+def update_progress(scan_id, progress):
+    STATUS.update(scan_id, progress=int(progress))
+
+def complete_scan(scan_id, status, findings, pack_version=None, error=None):
+    """Enregistre le résultat final d'un job sans toucher à sa date de création ;
+    error : cause d'un échec ({"error": ..., "trace": ...}), renvoyée avec le scan."""
+    STATUS.finish(
+        scan_id, status=status,
+        findings_json=encode_result(findings), progress=100, upload_path=None,
+        pack_version=pack_version, error_json=json.dumps(error) if error else None,
+        **count_findings(findings)
+    )
+    with ENGINE.begin() as conn:
+        _index_secrets(conn, scan_id, findings)
+
+def requeue_stale_jobs():
+    """Remet en file les jobs interrompus par l'arrêt d'un worker."""
+    with ENGINE.begin() as conn:
+        conn.execute(text("UPDATE secrets_scans SET status='queued', progress=0 WHERE status='running' AND upload_path IS NOT NULL"))
+        conn.execute(text("UPDATE sweeps SET status='queued', progress=0 WHERE status='running'"))
+
+def save_upload(file_storage, save_path):
+    """Écrit l'upload sur disque par blocs et retourne son SHA-256 calculé au passage."""
+    digest = hashlib.sha256()
+    with open(save_path, "wb") as out:
+        while True:
+            chunk = file_storage.stream.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+            out.write(chunk)
+    return digest.hexdigest()
+
+def get_cached_result(sha256, version):
+    """Retourne le résultat déjà calculé pour un APK identique, ou None."""
+    with ENGINE.connect() as conn:
+        r = conn.execute(
+            text("SELECT result_json FROM result_cache WHERE sha256=:sha AND version=:version"),
+            {"sha": sha256, "version": version}
+        ).fetchone()
+        return decode_result(r[0]) if r else None
+
+def store_cached_result(sha256, version, result):
+    with ENGINE.begin() as conn:
+        conn.execute(
+            text("INSERT OR REPLACE INTO result_cache (sha256, version, created_at, result_json) VALUES (:sha,:version,:created_at,:res)"),
+            {"sha": sha256, "version": version, "created_at": datetime.datetime.utcnow().isoformat(), "res": encode_result(result)}
+        )
 
-def save_result(scan_id, filename, status, findings):
+def save_result(scan_id, filename, status, findings, package_name=None, sha256=None, pack_version=None):
     with ENGINE.begin() as conn:
-        res_json = json.dumps(findings, ensure_ascii=False)
+        res_blob = encode_result(findings)
         conn.execute(
-            text("INSERT OR REPLACE INTO secrets_scans (id, filename, status, created_at, findings_json) VALUES (:id,:filename,:status,:created_at,:res)"),
-            {"id": scan_id, "filename": filename, "status": status, "created_at": datetime.datetime.utcnow().isoformat(), "res": res_json}
+            text("INSERT OR REPLACE INTO secrets_scans (id, filename, package_name, sha256, status, created_at, findings_json, pack_version, critical_count, high_count, medium_count, low_count, type_counts) VALUES (:id,:filename,:pkg,:sha,:status,:created_at,:res,:pack_version,:critical_count,:high_count,:medium_count,:low_count,:type_counts)"),
+            {"id": scan_id, "filename": filename, "pkg": package_name, "sha": sha256, "status": status, "created_at": datetime.datetime.utcnow().isoformat(), "res": res_blob, "pack_version": pack_version, **count_findings(findings)}
         )
+        _index_secrets(conn, scan_id, findings)
 
-def get_result(scan_id):
+def get_result(scan_id, summary=False):
+    """Détail d'un scan ; summary=True renvoie le résumé stocké au lieu des findings (rien n'est décompressé)."""
     with ENGINE.connect() as conn:
-        r = conn.execute(text("SELECT id, filename, status, created_at, findings_json FROM secrets_scans WHERE id=:id"), {"id": scan_id}).fetchone()
+        r = conn.execute(text("SELECT id, filename, status, created_at, findings_json, progress, package_name, pack_version, error_json FROM secrets_scans WHERE id=:id"), {"id": scan_id}).fetchone()
         if not r: return None
         return {
             "id": r[0], "filename": r[1], "status": r[2], "created_at": r[3],
-            "findings": json.loads(r[4]) if r[4] else []
+            **({"summary": decode_result(r[4], summary=True)} if summary else {"findings": decode_result(r[4]) or []}),
+            "progress": 100 if r[2] in ("done", "failed") else (r[5] or 0),
+            "package_name": r[6],
+            "pack_version": r[7],
+            **(json.loads(r[8]) if r[8] else {})
         }
 
-def get_all_scans(limit=50):
+def hash_secret(value):
+    """Clé de l'index des secrets : SHA-256 de la valeur, qui n'est pas stockée en clair."""
+    return hashlib.sha256(str(value).strip().encode("utf-8")).hexdigest()
+
+def _indexable(finding, rules):
+    """Un finding identifie un secret si sa valeur est un match complet de sa signature :
+    les scans faits avant le pack secrets 1.1.0 ne gardaient que le groupe capturé de
+    certaines règles (le mot-clé "password", "api_key"...), commun à tous les builds."""
+    if not isinstance(finding, dict) or not finding.get("value"):
+        return False
+    rule = rules.get(finding.get("type"))
+    return rule is None or rule.regex.fullmatch(str(finding["value"])) is not None
+
+def _index_secrets(conn, scan_id, findings):
+    """(Ré)indexe les findings d'un scan : une ligne par (valeur, type), avec le package
+    et la date du scan recopiés pour répondre aux recherches sans jointure."""
+    rules = {rule.name: rule for rule in current_pack().matcher.rules}
+    rows = {
+        (hash_secret(f["value"]), f.get("type"))
+        for f in findings if _indexable(f, rules)
+    }
+    conn.execute(text("DELETE FROM secret_index WHERE scan_id=:id"), {"id": scan_id})
+    if rows:
+        conn.execute(
+            text("INSERT OR IGNORE INTO secret_index (value_hash, type, scan_id, package_name, created_at) SELECT :hash, :type, id, package_name, created_at FROM secrets_scans WHERE id=:id"),
+            [{"hash": h, "type": t, "id": scan_id} for h, t in rows]
+        )
+    conn.execute(text("UPDATE secrets_scans SET secrets_indexed=:v WHERE id=:id"), {"v": SECRET_INDEX_VERSION, "id": scan_id})
+
+def backfill_secret_index(batch_size=200):
+    """Indexe les scans terminés avant l'introduction de l'index des secrets, ou indexés
+    par une version précédente (secrets_indexed < SECRET_INDEX_VERSION)."""
+    while True:
+        with ENGINE.begin() as conn:
+            rows = conn.execute(
+                text("SELECT id, findings_json FROM secrets_scans WHERE status='done' AND (secrets_indexed IS NULL OR secrets_indexed < :v) LIMIT :n"),
+                {"v": SECRET_INDEX_VERSION, "n": batch_size}
+            ).fetchall()
+            if not rows:
+                return
+            for scan_id, raw in rows:
+                try:
+                    findings = decode_result(raw) or []
+                except ValueError:
+                    findings = []
+                _index_secrets(conn, scan_id, findings)
+
+def lookup_secret(value_hash):
+    """Occurrences d'un secret dans tous les scans, de la plus récente à la plus ancienne."""
     with ENGINE.connect() as conn:
         rows = conn.execute(
-            text("SELECT id, filename, status, created_at FROM secrets_scans ORDER BY created_at DESC LIMIT :limit"),
-            {"limit": limit}
+            text("SELECT scan_id, package_name, type, created_at FROM secret_index WHERE value_hash=:hash ORDER BY created_at DESC, scan_id DESC"),
+            {"hash": value_hash}
         ).fetchall()
-        
-        return [
-            {
-                "id": r[0],
-                "filename": r[1],
-                "status": r[2],
-                "created_at": r[3]
-            }
-            for r in rows
-        ]
\ No newline at end of file
+    return [{"scan_id": r[0], "package_name": r[1], "type": r[2], "created_at": r[3]} for r in rows]
+
+def rotation_report(value_hash):
+    """Builds touchés par un secret, regroupés par package. Pour chaque package, indique
+    si le dernier scan terminé contient encore le secret (rotation non effectuée)."""
+    occurrences = lookup_secret(value_hash)
+    packages = {}
+    for o in occurrences:
+        entry = packages.setdefault(o["package_name"], {"package_name": o["package_name"], "types": set(), "builds": []})
+        entry["types"].add(o["type"])
+        if not entry["builds"] or entry["builds"][-1]["scan_id"] != o["scan_id"]:
+            entry["builds"].append({"scan_id": o["scan_id"], "created_at": o["created_at"]})
+
+    with ENGINE.connect() as conn:
+        for entry in packages.values():
+            latest = conn.execute(
+                text("SELECT id, created_at FROM secrets_scans WHERE package_name IS :pkg AND status='done' ORDER BY created_at DESC, id DESC LIMIT 1"),
+                {"pkg": entry["package_name"]}
+            ).fetchone()
+            entry["types"] = sorted(t for t in entry["types"] if t)
+            entry["first_seen"] = entry["builds"][-1]["created_at"]
+            entry["last_seen"] = entry["builds"][0]["created_at"]
+            entry["latest_scan"] = {"scan_id": latest[0], "created_at": latest[1]} if latest else None
+            entry["still_present"] = bool(latest) and any(b["scan_id"] == latest[0] for b in entry["builds"])
+
+    return {
+        "value_hash": value_hash,
+        "affected_builds": len({o["scan_id"] for o in occurrences}),
+        "affected_packages": len(packages),
+        "packages": sorted(packages.values(), key=lambda p: (not p["still_present"], p["package_name"] or ""))
+    }
+
+def _register_rules(conn, pack):
+    """Enregistre les versions des signatures d'un pack. Sur une base neuve, elles sont
+    considérées comme déjà appliquées (les scans existants ont été faits avec)."""
+    now = datetime.datetime.utcnow().isoformat()
+    first_run = conn.execute(text("SELECT COUNT(*) FROM known_rules")).scalar() == 0
+    conn.execute(
+        text("INSERT OR IGNORE INTO known_rules (rule_hash, name, swept, created_at) VALUES (:hash,:name,:swept,:created_at)"),
+        [{"hash": h, "name": name, "swept": 1 if first_run else 0, "created_at": now} for name, h in pack.rule_versions.items()]
+    )
+
+def register_pack_rules(pack):
+    """Pack publié : ses signatures nouvelles ou modifiées sont en attente de balayage."""
+    with ENGINE.begin() as conn:
+        _register_rules(conn, pack)
+
+def pending_rules(pack=None):
+    """Signatures du pack (actif par défaut) pas encore rejouées sur le corpus (nouvelles ou modifiées)."""
+    pack = pack or current_pack()
+    with ENGINE.connect() as conn:
+        swept = {r[0] for r in conn.execute(text("SELECT rule_hash FROM known_rules WHERE swept=1"))}
+    return [name for name, h in pack.rule_versions.items() if h not in swept]
+
+def link_corpus(scan_id, blob_hashes):
+    with ENGINE.begin() as conn:
+        if blob_hashes:
+            conn.execute(
+                text("INSERT OR IGNORE INTO scan_corpus (scan_id, blob_hash) VALUES (:id,:blob)"),
+                [{"id": scan_id, "blob": h} for h in set(blob_hashes)]
+            )
+
+def link_corpus_from_sha(scan_id, sha256):
+    """Scan servi depuis le cache : reprend le corpus d'un scan précédent du même APK."""
+    with ENGINE.begin() as conn:
+        conn.execute(
+            text("INSERT OR IGNORE INTO scan_corpus (scan_id, blob_hash) SELECT :id, blob_hash FROM scan_corpus WHERE scan_id = (SELECT s.id FROM secrets_scans s WHERE s.sha256=:sha AND s.id != :id AND EXISTS (SELECT 1 FROM scan_corpus c WHERE c.scan_id = s.id) LIMIT 1)"),
+            {"id": scan_id, "sha": sha256}
+        )
+
+def list_corpus_blobs():
+    with ENGINE.connect() as conn:
+        return [r[0] for r in conn.execute(text("SELECT DISTINCT blob_hash FROM scan_corpus"))]
+
+def corpus_stats():
+    with ENGINE.connect() as conn:
+        scans, blobs, links = conn.execute(text("SELECT COUNT(DISTINCT scan_id), COUNT(DISTINCT blob_hash), COUNT(*) FROM scan_corpus")).fetchone()
+    return {"scans": scans, "blobs": blobs, "links": links}
+
+def create_sweep(rule_names, pack_digest):
+    sweep_id = "sweep-" + uuid.uuid4().hex
+    with ENGINE.begin() as conn:
+        conn.execute(
+            text("INSERT INTO sweeps (id, status, created_at, rules_json, progress, pack_digest) VALUES (:id,'queued',:created_at,:rules,0,:pack)"),
+            {"id": sweep_id, "created_at": datetime.datetime.utcnow().isoformat(), "rules": json.dumps(sorted(rule_names)), "pack": pack_digest}
+        )
+    return sweep_id
+
+def claim_next_sweep():
+    """Comme claim_next_job, pour les balayages du corpus."""
+    token = uuid.uuid4().hex
+    with ENGINE.begin() as conn:
+        claimed = conn.execute(
+            text("UPDATE sweeps SET status='running', claim_token=:token WHERE id = (SELECT id FROM sweeps WHERE status='queued' ORDER BY created_at LIMIT 1) AND status='queued'"),
+            {"token": token}
+        ).rowcount
+        if not claimed:
+            return None
+        r = conn.execute(text("SELECT id, rules_json, pack_digest FROM sweeps WHERE claim_token=:token"), {"token": token}).fetchone()
+        return {"kind": "sweep", "id": r[0], "rules": json.loads(r[1]), "pack_digest": r[2]}
+
+def update_sweep_progress(sweep_id, progress):
+    SWEEP_STATUS.update(sweep_id, progress=int(progress))
+
+def complete_sweep(sweep_id, status, rule_names, result, pack):
+    """État final d'un balayage ; s'il a abouti, les signatures rejouées (versions du pack
+    utilisé) ne sont plus en attente."""
+    SWEEP_STATUS.finish(sweep_id, status=status, progress=100, result_json=encode_result(result))
+    if status == "done":
+        rules = [{"hash": pack.rule_versions[name], "name": name, "created_at": datetime.datetime.utcnow().isoformat()}
+                 for name in rule_names if name in pack.rule_versions]
+        if rules:
+            with ENGINE.begin() as conn:
+                # Le pack a pu être publié sans passer par register_pack_rules (fichier modifié à la main)
+                conn.execute(text("INSERT OR IGNORE INTO known_rules (rule_hash, name, swept, created_at) VALUES (:hash,:name,1,:created_at)"), rules)
+                conn.execute(text("UPDATE known_rules SET swept=1 WHERE rule_hash=:hash"), rules)
+
+def get_sweep(sweep_id):
+    with ENGINE.connect() as conn:
+        r = conn.execute(text("SELECT id, status, created_at, rules_json, progress, result_json, pack_digest FROM sweeps WHERE id=:id"), {"id": sweep_id}).fetchone()
+    if not r:
+        return None
+    return {
+        "id": r[0], "status": r[1], "created_at": r[2], "rules": json.loads(r[3]), "pack_digest": r[6],
+        "progress": 100 if r[1] in ("done", "failed") else (r[4] or 0),
+        "result": decode_result(r[5])
+    }
+
+def new_matches_by_scan(blob_findings):
+    """Regroupe par scan les findings d'un balayage, sans ceux que le scan avait déjà.
+    Retourne la liste des scans nouvellement touchés, du plus récent au plus ancien."""
+    scans = {}
+    blobs = list(blob_findings)
+    with ENGINE.connect() as conn:
+        for i in range(0, len(blobs), 500):
+            chunk = blobs[i:i + 500]
+            params = {f"b{j}": h for j, h in enumerate(chunk)}
+            rows = conn.execute(
+                text(f"SELECT c.scan_id, c.blob_hash, s.package_name, s.created_at, s.findings_json FROM scan_corpus c JOIN secrets_scans s ON s.id = c.scan_id WHERE c.blob_hash IN ({','.join(':' + k for k in params)})"),
+                params
+            ).fetchall()
+            for scan_id, blob_hash, package_name, created_at, raw in rows:
+                if scan_id not in scans:
+                    known = {f"{f.get('type')}:{f.get('value')}" for f in decode_result(raw) or [] if isinstance(f, dict)}
+                    scans[scan_id] = {"scan_id": scan_id, "package_name": package_name, "created_at": created_at,
+                                      "known": known, "new_findings": []}
+                scan = scans[scan_id]
+                for f in blob_findings[blob_hash]:
+                    identifier = f"{f['type']}:{f['value']}"
+                    if identifier not in scan["known"]:
+                        scan["known"].add(identifier)
+                        scan["new_findings"].append(f)
+    matched = []
+    for scan in scans.values():
+        del scan["known"]
+        if scan["new_findings"]:
+            matched.append(scan)
+    return sorted(matched, key=lambda s: s["created_at"] or "", reverse=True)
+
+def get_findings_blob(scan_id):
+    """Statut et findings encore encodés d'un scan, lus ensuite par pages ou en flux."""
+    with ENGINE.connect() as conn:
+        r = conn.execute(text("SELECT status, findings_json FROM secrets_scans WHERE id=:id"), {"id": scan_id}).fetchone()
+    return {"status": r[0], "raw": r[1]} if r else None
+
+def get_all_scans(cursor=None, limit=PAGE_SIZE, status=None, package=None, since=None, until=None):
+    """Listing paginé (keyset) : retourne (scans, curseur de la page suivante ou None)."""
+    scans, next_cursor = keyset_page(
+        ENGINE, "secrets_scans", ["id", "filename", "package_name", "status", "created_at", *COUNT_COLUMNS],
+        filters={"status": status, "package_name": package},
+        since=since, until=until, cursor=cursor, limit=limit
+    )
+    return [unpack_counts(scan) for scan in scans], next_cursor
+
+def read_package_name(apk_path):
+    """Nom du package lu dans le manifeste binaire, sans construire d'objet APK."""
+    try:
+        with zipfile.ZipFile(apk_path) as zf:
+            return AXMLPrinter(zf.read("AndroidManifest.xml")).get_xml_obj().get("package")
+    except Exception:
+        return None
@@ -0,0 +1,84 @@
+import os, traceback
+from utils import (ENGINE, init_db, claim_next_job, complete_scan, update_progress,
+                   store_cached_result, requeue_stale_jobs, link_corpus,
+                   claim_next_sweep, update_sweep_progress, complete_sweep,
+                   list_corpus_blobs, new_matches_by_scan)
+from secret_analyzer import extract_and_scan, sweep_corpus, analyzer_version
+from signatures import current_pack, pack_for
+from jobqueue import WorkerPool, run_worker
+
+SCAN_WORKERS = int(os.environ.get("SCAN_WORKERS", 2))
+
+def process_job(job):
+    upload_path = job["upload_path"]
+    job_id = job["id"]
+    try:
+        update_progress(job_id, 5)
+        # Le pack est fixé pour tout le scan, même si un autre est publié entre-temps
+        pack = current_pack()
+        # 5% au démarrage, puis proportionnel au nombre de DEX traités
+        corpus_blobs = []
+        findings = extract_and_scan(
+            upload_path,
+            progress=lambda done, total: update_progress(job_id, 5 + 90 * done / max(total, 1)),
+            corpus_blobs=corpus_blobs,
+            pack=pack
+        )
+        link_corpus(job_id, corpus_blobs)
+        complete_scan(job_id, "done", findings, pack_version=pack.id)
+        store_cached_result(job["sha256"], analyzer_version(pack), findings)
+    except Exception as e:
+        print(f"Analysis failed for {job_id}: {e}")
+        traceback.print_exc()
+        complete_scan(job_id, "failed", [], error={"error": str(e), "trace": traceback.format_exc()})
+    finally:
+        if upload_path and os.path.exists(upload_path):
+            try:
+                os.remove(upload_path)
+            except Exception as e:
+                print(f"Error deleting file {upload_path}: {e}")
+
+def process_sweep(sweep):
+    """Rejoue des signatures sur tout le corpus et rapporte les scans nouvellement touchés."""
+    sweep_id = sweep["id"]
+    pack = None
+    try:
+        # Balayage créé avant les packs : pack actif
+        pack = pack_for(sweep["pack_digest"]) if sweep.get("pack_digest") else current_pack()
+        blobs = list_corpus_blobs()
+        matches = sweep_corpus(
+            blobs, sweep["rules"], pack.digest,
+            progress=lambda done, total: update_sweep_progress(sweep_id, 95 * done / max(total, 1))
+        )
+        scans = new_matches_by_scan(matches)
+        complete_sweep(sweep_id, "done", sweep["rules"], {
+            "blobs_scanned": len(blobs),
+            "blobs_matched": len(matches),
+            "scans_matched": len(scans),
+            "scans": scans
+        }, pack)
+    except Exception as e:
+        print(f"Sweep failed for {sweep_id}: {e}")
+        traceback.print_exc()
+        complete_sweep(sweep_id, "failed", sweep["rules"], {"error": str(e)}, pack)
+
+def claim_next():
+    # Les scans passent avant les balayages du corpus
+    return claim_next_job() or claim_next_sweep()
+
+def process(job):
+    if job.get("kind") == "sweep":
+        process_sweep(job)
+    else:
+        process_job(job)
+
+def _worker_main():
+    # Les connexions héritées du processus parent ne doivent pas être réutilisées
+    run_worker(claim_next, process, on_start=ENGINE.dispose)
+
+def start_pool(size=SCAN_WORKERS):
+    init_db()
+    requeue_stale_jobs()
+    # Appelé dans le master Gunicorn : aucune connexion ne doit être héritée par les forks
+    ENGINE.dispose()
+    return WorkerPool(size, _worker_main).start()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Benchmark de la couche de stockage SQLite (services/*/storage.py).
+
+Compare, avec plusieurs processus concurrents (comme les workers Gunicorn + le pool
+d'analyse), le débit soutenu d'écritures et de lectures :
+  - "default" : moteur SQLAlchemy d'origine (journal DELETE, une connexion par requête)
+  - "tuned"   : create_sqlite_engine() (WAL, busy_timeout, connexions réutilisées)
+  - "tuned+writer" : idem, la progression passant par le StatusWriter différé
+
+Usage : python tests/bench_storage.py [--workers 4] [--seconds 5]
+"""
+import argparse, multiprocessing, os, sys, tempfile, time, uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "services", "secrethunter"))
+
+from sqlalchemy import create_engine, text
+from storage import create_sqlite_engine, StatusWriter
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS scans (
+        id TEXT PRIMARY KEY,
+        status TEXT,
+        created_at TEXT,
+        progress INTEGER DEFAULT 0,
+        result_json TEXT
+    )
+"""
+PROGRESS_STEPS = 10
+
+def make_engine(mode, path):
+    if mode == "default":
+        return create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    return create_sqlite_engine(path)
+
+def writer(mode, path, seconds, counts):
+    """Cycle de vie d'un job : insertion, progression, résultat final."""
+    engine = make_engine(mode, path)
+    status = StatusWriter(engine, "scans", interval=0.2) if mode == "tuned+writer" else None
+    jobs = errors = 0
+    deadline = time.time() + seconds
+    while time.time() < deadline:
+        job_id = uuid.uuid4().hex
+        try:
+            with engine.begin() as conn:
+                conn.execute(text("INSERT INTO scans (id, status, created_at, result_json) VALUES (:id, 'queued', :t, '[]')"),
+                             {"id": job_id, "t": time.time()})
+            for step in range(PROGRESS_STEPS):
+                if status:
+                    status.update(job_id, progress=step * 10)
+                else:
+                    with engine.begin() as conn:
+                        conn.execute(text("UPDATE scans SET progress=:p WHERE id=:id"), {"p": step * 10, "id": job_id})
+            if status:
+                status.finish(job_id, status="done", progress=100, result_json='[{"type": "x"}]')
+            else:
+                with engine.begin() as conn:
+                    conn.execute(text("UPDATE scans SET status='done', progress=100, result_json=:r WHERE id=:id"),
+                                 {"r": '[{"type": "x"}]', "id": job_id})
+            jobs += 1
+        except Exception:
+            errors += 1
+    counts.put(("write", jobs, errors))
+
+def reader(mode, path, seconds, counts):
+    """Lectures façon API : liste des derniers scans et détail d'un scan."""
+    engine = make_engine(mode, path)
+    reads = errors = 0
+    deadline = time.time() + seconds
+    while time.time() < deadline:
+        try:
+            with engine.connect() as conn:
+                rows = conn.execute(text("SELECT id, status, created_at FROM scans ORDER BY created_at DESC LIMIT 50")).fetchall()
+                if rows:
+                    conn.execute(text("SELECT * FROM scans WHERE id=:id"), {"id": rows[0][0]}).fetchone()
+            reads += 1
+        except Exception:
+            errors += 1
+    counts.put(("read", reads, errors))
+
+def run(mode, workers, seconds):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        engine = make_engine(mode, path)
+        with engine.begin() as conn:
+            conn.execute(text(SCHEMA))
+        engine.dispose()
+
+        counts = multiprocessing.Queue()
+        procs = [multiprocessing.Process(target=writer, args=(mode, path, seconds, counts)) for _ in range(workers)]
+        procs += [multiprocessing.Process(target=reader, args=(mode, path, seconds, counts)) for _ in range(workers)]
+        for p in procs:
+            p.start()
+        totals = {"write": [0, 0], "read": [0, 0]}
+        for _ in procs:
+            kind, ok, errors = counts.get()
+            totals[kind][0] += ok
+            totals[kind][1] += errors
+        for p in procs:
+            p.join()
+
+    jobs, write_errors = totals["write"]
+    reads, read_errors = totals["read"]
+    print(f"{mode:>13} | {jobs / seconds:9.1f} jobs/s | {reads / seconds:9.1f} reads/s | "
+          f"{write_errors + read_errors:6d} errors")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workers", type=int, default=4, help="processus écrivains (et autant de lecteurs)")
+    parser.add_argument("--seconds", type=float, default=5)
+    args = parser.parse_args()
+
+    print(f"{args.workers} writer(s) + {args.workers} reader(s), {args.seconds}s per mode, "
+          f"{PROGRESS_STEPS} progress updates per job")
+    for mode in ("default", "tuned", "tuned+writer"):
+        run(mode, args.workers, args.seconds)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Vérifications du parseur AXML d'apkscanner (services/apkscanner/axml.py).
+
+  - sur les AndroidManifest.xml de examples/apks, parse_axml rend le même arbre que
+    androguard (AXMLPrinter) : mêmes éléments dans le même ordre, mêmes attributs android:*
+    et mêmes valeurs texte ;
+  - analyze_manifest_axml et l'analyse androguard (analyze_manifest_legacy) donnent le même
+    résultat ;
+  - un document invalide lève une exception, pour que l'appelant se rabatte sur androguard.
+
+Usage : python tests/check_axml.py
+"""
+import os, sys, zipfile
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "services", "apkscanner"))
+
+import logging
+logging.disable(logging.CRITICAL)
+try:
+    from loguru import logger
+    logger.remove()
+except ImportError:
+    pass
+
+from androguard.core.apk import APK
+from androguard.core.axml import AXMLPrinter
+from axml import ANDROID_NS, parse_axml
+from manifest_analyzer import analyze_manifest_axml, analyze_manifest_legacy
+
+APKS_DIR = os.path.join(ROOT, "examples", "apks")
+
+def _apks():
+    apks = [os.path.join(APKS_DIR, name) for name in sorted(os.listdir(APKS_DIR)) if name.endswith(".apk")]
+    assert apks, f"aucun APK dans {APKS_DIR}"
+    return apks
+
+def _manifest(apk):
+    with zipfile.ZipFile(apk) as zf:
+        return zf.read("AndroidManifest.xml")
+
+def _walk(elem):
+    yield elem
+    for child in elem.children:
+        yield from _walk(child)
+
+def _expected_attrs(elem):
+    """Attributs androguard indexés comme dans axml.Element : android:* prioritaires, nom local."""
+    attrs = {}
+    for key, value in elem.attrib.items():
+        if key.startswith(f"{{{ANDROID_NS}}}"):
+            attrs[key.split("}", 1)[1]] = value
+    for key, value in elem.attrib.items():
+        if not key.startswith("{"):
+            attrs.setdefault(key, value)
+    return attrs
+
+def check_tree_matches_androguard():
+    for apk in _apks():
+        data = _manifest(apk)
+        ours = list(_walk(parse_axml(data)))
+        theirs = [e for e in AXMLPrinter(data).get_xml_obj().iter() if isinstance(e.tag, str)]
+        label = os.path.basename(apk)
+        assert [e.tag for e in ours] == [e.tag for e in theirs], f"{label}: éléments différents"
+        for mine, ref in zip(ours, theirs):
+            assert mine.attrs == _expected_attrs(ref), f"{label} <{mine.tag}>: {mine.attrs} != {_expected_attrs(ref)}"
+
+def check_analysis_matches_legacy():
+    for apk in _apks():
+        fast = analyze_manifest_axml(_manifest(apk))
+        legacy = analyze_manifest_legacy(APK(apk))
+        assert fast == legacy, f"{os.path.basename(apk)}: {fast} != {legacy}"
+
+def check_invalid_document():
+    for data in (b"", b"PK\x03\x04" + b"\x00" * 32, b"\x03\x00\x08\x00\x08\x00\x00\x00"):
+        try:
+            parse_axml(data)
+        except Exception:
+            continue
+        raise AssertionError(f"document invalide accepté : {data!r}")
+
+def main():
+    for check in (check_invalid_document, check_tree_matches_androguard, check_analysis_matches_legacy):
+        check()
+        print(f"ok  {check.__name__}")
+
+if __name__ == "__main__":
+    main()
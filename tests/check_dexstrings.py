@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Vérifications du lecteur de table de chaînes DEX de secrethunter (services/secrethunter/dexstrings.py).
+
+  - sur les classes*.dex de examples/apks, iter_dex_strings rend exactement les chaînes
+    (et dans le même ordre) que androguard ;
+  - le MUTF-8 est décodé : NUL sur deux octets, caractères hors BMP en paires de surrogates ;
+  - une entrée stockée sans compression et une entrée compressée donnent les mêmes chaînes
+    (les deux chemins de map_apk_entry).
+
+Usage : python tests/check_dexstrings.py
+"""
+import os, struct, sys, tempfile, zipfile
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "services", "secrethunter"))
+
+from dexstrings import DEX_MAGIC, STRING_IDS_HEADER, iter_dex_strings, iter_apk_dex_strings
+
+APKS_DIR = os.path.join(ROOT, "examples", "apks")
+DEX_HEADER_SIZE = 0x70
+
+# Chaîne Python -> encodage MUTF-8 attendu dans un string_data_item
+MUTF8_SAMPLES = [
+    ("Landroid/app/Activity;", b"Landroid/app/Activity;"),
+    ("nul\x00inside", b"nul\xc0\x80inside"),
+    ("clé", "clé".encode("utf-8")),
+    ("emoji \U0001F511", b"emoji \xed\xa0\xbd\xed\xb4\x91"),
+]
+
+def _uleb128(value):
+    out = bytearray()
+    while True:
+        byte, value = value & 0x7F, value >> 7
+        out.append(byte | (0x80 if value else 0))
+        if not value:
+            return bytes(out)
+
+def build_dex(samples):
+    """DEX minimal : header, string_ids puis string_data_item (utf16_size en uleb128, données, NUL)."""
+    ids_off = DEX_HEADER_SIZE
+    data_off = ids_off + 4 * len(samples)
+    ids, data = bytearray(), bytearray()
+    for text, encoded in samples:
+        ids += struct.pack("<I", data_off + len(data))
+        data += _uleb128(len(text.encode("utf-16-le")) // 2) + encoded + b"\x00"
+    header = bytearray(DEX_HEADER_SIZE)
+    header[:8] = DEX_MAGIC + b"035\x00"
+    struct.pack_into("<II", header, STRING_IDS_HEADER, len(samples), ids_off)
+    return bytes(header + ids + data)
+
+def _apk_dex_entries():
+    for name in sorted(os.listdir(APKS_DIR)):
+        if not name.endswith(".apk"):
+            continue
+        with zipfile.ZipFile(os.path.join(APKS_DIR, name)) as zf:
+            for entry in zf.namelist():
+                if entry.startswith("classes") and entry.endswith(".dex"):
+                    yield f"{name}:{entry}", zf.read(entry)
+
+def check_matches_androguard():
+    import logging
+    logging.disable(logging.CRITICAL)
+    try:
+        from loguru import logger
+        logger.remove()
+    except ImportError:
+        pass
+    from androguard.core.dex import DEX
+
+    checked = 0
+    for label, data in _apk_dex_entries():
+        ours = list(iter_dex_strings(data))
+        theirs = [str(s) for s in DEX(data).get_strings()]
+        assert ours == theirs, f"{label}: {len(ours)} chaînes contre {len(theirs)} pour androguard"
+        checked += 1
+    assert checked, f"aucun classes*.dex dans {APKS_DIR}"
+
+def check_mutf8():
+    dex = build_dex(MUTF8_SAMPLES)
+    assert list(iter_dex_strings(dex)) == [text for text, _ in MUTF8_SAMPLES]
+    # Même DEX lu à un offset non nul, comme dans le mmap d'un APK
+    assert list(iter_dex_strings(b"\xff" * 13 + dex, base=13)) == [text for text, _ in MUTF8_SAMPLES]
+
+def check_stored_and_deflated():
+    dex = build_dex(MUTF8_SAMPLES)
+    with tempfile.TemporaryDirectory() as tmp:
+        apk = os.path.join(tmp, "sample.apk")
+        with zipfile.ZipFile(apk, "w") as zf:
+            zf.writestr("AndroidManifest.xml", b"\x00" * 7)
+            zf.writestr(zipfile.ZipInfo("classes.dex"), dex, compress_type=zipfile.ZIP_STORED)
+            zf.writestr(zipfile.ZipInfo("classes2.dex"), dex, compress_type=zipfile.ZIP_DEFLATED)
+        stored = list(iter_apk_dex_strings(apk, "classes.dex"))
+        deflated = list(iter_apk_dex_strings(apk, "classes2.dex"))
+    assert stored == deflated == [text for text, _ in MUTF8_SAMPLES], (stored, deflated)
+
+def main():
+    for check in (check_mutf8, check_stored_and_deflated, check_matches_androguard):
+        check()
+        print(f"ok  {check.__name__}")
+
+if __name__ == "__main__":
+    main()
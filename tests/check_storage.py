@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Vérifications du format de résultat compressé par sections (storage.py, commun aux services).
+
+  - encode_result / decode_result font l'aller-retour d'un résultat dict et d'un résultat
+    liste découpé en plusieurs tranches ;
+  - lecture partielle : section d'un dict, résumé seul, KeyError sur une section absente ;
+  - iter_result_items et findings_page parcourent les tranches depuis une position donnée ;
+  - l'ancien format JSON texte reste lisible de la même façon ;
+  - les copies de storage.py des services sont identiques.
+
+Usage : python tests/check_storage.py
+"""
+import filecmp, glob, json, os, sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "services", "secrethunter"))
+
+from storage import (RESULT_CHUNK_SIZE, decode_result, encode_result, findings_page,
+                     is_encoded, iter_findings, iter_result_items)
+
+DICT_RESULT = {
+    "package": "com.example.app",
+    "permissions": ["android.permission.INTERNET", "android.permission.READ_SMS"],
+    "flags": {"debuggable": False, "allowBackup": True, "usesCleartextTraffic": None},
+    "exported_components": [{"name": "com.example.app.Main", "type": "activity", "exported": True}],
+    "note": "clé é \U0001F511",
+}
+SEVERITIES = ["CRITICAL", "HIGH", "MEDIUM", "LOW"]
+LIST_RESULT = [
+    {"type": f"Rule {i % 7}", "severity": SEVERITIES[i % 4], "value": f"value-{i}"}
+    for i in range(2 * RESULT_CHUNK_SIZE + 17)
+]
+
+def _raises_key_error(raw, section):
+    try:
+        decode_result(raw, section=section)
+    except KeyError:
+        return True
+    return False
+
+def check_dict_round_trip():
+    raw = encode_result(DICT_RESULT)
+    assert is_encoded(raw)
+    assert decode_result(raw) == DICT_RESULT
+    for key, value in DICT_RESULT.items():
+        assert decode_result(raw, section=key) == value, key
+    assert decode_result(raw, summary=True) == {
+        "package": "com.example.app", "permissions": 2, "flags": DICT_RESULT["flags"],
+        "exported_components": 1, "note": DICT_RESULT["note"],
+    }
+    assert _raises_key_error(raw, "missing")
+
+def check_list_round_trip():
+    raw = encode_result(LIST_RESULT)
+    assert decode_result(raw) == LIST_RESULT
+    assert decode_result(raw, summary=True) == {"count": len(LIST_RESULT)}
+    # Pas de section nommée pour un résultat liste
+    assert _raises_key_error(raw, "0")
+
+    start = RESULT_CHUNK_SIZE - 3
+    assert list(iter_result_items(raw, start)) == list(enumerate(LIST_RESULT))[start:]
+
+    expected = [f for f in LIST_RESULT if f["severity"] == "HIGH" and f["type"] in ("Rule 1", "Rule 5")]
+    assert list(iter_findings(raw, types=["Rule 1", "Rule 5"], severities=["high"])) == expected
+    pages, cursor = [], None
+    while True:
+        page, cursor = findings_page(raw, cursor=cursor, limit=20, types=["Rule 1", "Rule 5"], severities=["HIGH"])
+        pages.extend(page)
+        if cursor is None:
+            break
+    assert pages == expected
+    assert findings_page(raw, offset=5, limit=3)[0] == LIST_RESULT[5:8]
+
+def check_legacy_json():
+    for result in (DICT_RESULT, LIST_RESULT):
+        raw = json.dumps(result)
+        assert not is_encoded(raw)
+        assert decode_result(raw) == result
+        assert decode_result(raw, summary=True) == decode_result(encode_result(result), summary=True)
+    assert decode_result(json.dumps(DICT_RESULT), section="flags") == DICT_RESULT["flags"]
+    assert list(iter_result_items(json.dumps(LIST_RESULT), 3))[:2] == [(3, LIST_RESULT[3]), (4, LIST_RESULT[4])]
+    assert decode_result(None) is None and decode_result(b"") is None
+
+def check_copies_identical():
+    copies = sorted(glob.glob(os.path.join(ROOT, "services", "*", "storage.py")))
+    assert len(copies) > 1, copies
+    differing = [path for path in copies[1:] if not filecmp.cmp(copies[0], path, shallow=False)]
+    assert not differing, f"storage.py diverge de {copies[0]} : {differing}"
+
+def main():
+    for check in (check_dict_round_trip, check_list_round_trip, check_legacy_json, check_copies_identical):
+        check()
+        print(f"ok  {check.__name__}")
+
+if __name__ == "__main__":
+    main()